@@ -1,5 +1,6 @@
 from agents.summarizer import SummarizerAgent
 from agents.reviewer import ReviewerAgent
 from agents.title_writer import TitleCopywriterAgent
+from agents.prompt_version import get_prompt_version
 
-__all__ = ['SummarizerAgent', 'ReviewerAgent', 'TitleCopywriterAgent']
\ No newline at end of file
+__all__ = ['SummarizerAgent', 'ReviewerAgent', 'TitleCopywriterAgent', 'get_prompt_version']
\ No newline at end of file
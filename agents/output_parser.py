@@ -0,0 +1,49 @@
+import json
+from typing import Dict, Any
+
+
+def parse_json_output(output: str) -> Dict[str, Any]:
+    """
+    モデル出力をJSONオブジェクトとして解釈
+
+    JSONモードでもコードブロックや前後の説明文が付くことがあるため、
+    直接パースできない場合はJSON部分だけを取り出して再度パースする。
+
+    Args:
+        output: モデルの出力テキスト
+
+    Returns:
+        Dict[str, Any]: パースしたJSONオブジェクト
+
+    Raises:
+        ValueError: JSONオブジェクトとして解釈できない場合
+    """
+    # 直接JSONとしてパースを試みる
+    try:
+        result = json.loads(output)
+    except json.JSONDecodeError as e:
+        # JSONパースに失敗した場合、テキストから抽出を試みる
+        print(f"JSONパースエラー: {e}")
+        print(f"パースに失敗した出力: {output}")
+
+        # コードブロックがある場合は除去
+        if "```json" in output:
+            output = output.split("```json")[1].split("```")[0].strip()
+        elif "```" in output:
+            output = output.split("```")[1].split("```")[0].strip()
+
+        # 余分な説明文がある場合、JSON部分だけを取り出す
+        if "{" in output and "}" in output:
+            start_idx = output.find("{")
+            end_idx = output.rfind("}") + 1
+            output = output[start_idx:end_idx]
+
+        # 再度JSONパース
+        try:
+            result = json.loads(output)
+        except json.JSONDecodeError as e2:
+            raise ValueError(f"JSONとして解釈できません: {e2}") from e2
+
+    if not isinstance(result, dict):
+        raise ValueError(f"JSONオブジェクトではありません: {type(result).__name__}")
+    return result
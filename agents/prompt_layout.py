@@ -0,0 +1,45 @@
+"""
+要約・批評・改訂・タイトル生成で共通のメッセージ構成
+
+Deepseek はプロンプトの先頭が過去のリクエストと一致する部分（接頭辞）をキャッシュし、
+その分のトークンを安く・速く処理する。1回のワークフロー内のすべての呼び出しで
+「共通のシステムプロンプト」と「原文」を同じバイト列として先頭に置き、
+エージェントごとの指示と改訂のたびに変わる内容（要約・フィードバック）は末尾に置く。
+"""
+from typing import Dict, List
+
+# 全エージェントで共通のシステムプロンプト（役割ごとの指示は含めない）
+SHARED_SYSTEM_PROMPT = (
+    "あなたは文章の要約・批評・タイトル作成を分担して行うチームの一員です。\n"
+    "ユーザーのメッセージの冒頭に対象となる文章を【入力文章】として示し、"
+    "その後の【依頼】であなたの役割と作業内容を示します。\n"
+    "【依頼】の指示に従って出力してください。"
+)
+
+# 原文の書式（改訂のたびに同じ文字列になるよう、ここ以外で原文を整形しない）
+DOCUMENT_TEMPLATE = "【入力文章】\n{input_text}\n\n"
+
+# 役割ごとの指示と、呼び出しごとに変わる内容
+TASK_TEMPLATE = "【依頼】\n{instructions}"
+
+
+def build_messages(input_text: str, instructions: str, content: str = "") -> List[Dict[str, str]]:
+    """
+    共通の接頭辞（システムプロンプト＋原文）の後に指示と内容を続けたメッセージを作成
+
+    Args:
+        input_text: 原文（空の場合は原文を含めない）
+        instructions: 役割ごとの指示
+        content: 呼び出しごとに変わる内容（要約・フィードバックなど）
+
+    Returns:
+        List[Dict[str, str]]: APIに送るメッセージ
+    """
+    document = DOCUMENT_TEMPLATE.format(input_text=input_text) if input_text else ""
+    task = TASK_TEMPLATE.format(instructions=instructions)
+    if content:
+        task += "\n\n" + content
+    return [
+        {"role": "system", "content": SHARED_SYSTEM_PROMPT},
+        {"role": "user", "content": document + task}
+    ]
@@ -0,0 +1,28 @@
+import hashlib
+from agents.summarizer import SummarizerAgent
+from agents.reviewer import ReviewerAgent
+from agents.title_writer import TitleCopywriterAgent
+from agents import prompt_layout
+
+
+def get_prompt_version() -> str:
+    """
+    エージェントのプロンプトテンプレートから版数を表すハッシュを作成
+
+    プロンプトを変更すると値が変わるため、ワークフロー結果のキャッシュキーに含めることで
+    古いプロンプトで生成された結果が再利用されるのを防ぐ。
+
+    Returns:
+        str: プロンプトテンプレートのハッシュ（先頭16文字）
+    """
+    digest = hashlib.sha256()
+    # 全エージェントで共通の接頭辞（システムプロンプト・原文の書式）
+    for name in ("SHARED_SYSTEM_PROMPT", "DOCUMENT_TEMPLATE", "TASK_TEMPLATE"):
+        digest.update(name.encode("utf-8"))
+        digest.update(getattr(prompt_layout, name).encode("utf-8"))
+    for agent in (SummarizerAgent(None), ReviewerAgent(None), TitleCopywriterAgent(None)):
+        for name, value in sorted(vars(agent).items()):
+            if name.endswith("template"):
+                digest.update(name.encode("utf-8"))
+                digest.update(value.encode("utf-8"))
+    return digest.hexdigest()[:16]
@@ -1,24 +1,30 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Iterator, Optional
 from utils.api_client import DeepseekAPI
+from agents.output_parser import parse_json_output
+from agents.prompt_layout import build_messages
+
+# 構造化レビューの判定値
+VERDICT_APPROVED = "approved"
+VERDICT_NEEDS_REVISION = "needs_revision"
 
 class ReviewerAgent:
     """要約の品質を評価するエージェント"""
     
-    def __init__(self, api_client: DeepseekAPI):
+    def __init__(self, api_client: DeepseekAPI, model: Optional[str] = None):
         """
         初期化
         
         Args:
             api_client: API呼び出しを行うクライアント
+            model: 使用するモデル名（省略時はクライアントの既定のモデル）
         """
         self.api_client = api_client
+        self.model = model
+        # 原文は共通の接頭辞（agents.prompt_layout）として送り、指示と要約・フィードバックはその後に続ける
         self.prompt_template = (
-            "あなたは批評家です。（一回目の批評ではない場合には）前回の要約とそれに対するフィードバック、そして今回の要約を示します。\n"
+            "あなたは批評家です。入力文章の要約について、（一回目の批評ではない場合には）前回の要約とそれに対するフィードバック、そして今回の要約を以下に示します。\n"
             "前回の要約に対して行った指摘が、今回の要約でどのように修正されているかを確認し、"
             "要約文のクオリティを評価して、必要な修正がまだ残っているかどうか評価してください。\n\n"
-            "【前回の要約】\n{previous_summary}\n"
-            "【前回のフィードバック】\n{previous_feedback}\n"
-            "【今回の要約】\n{current_summary}\n\n"
             "前回の要約および前回のフィードバックがない場合、この批評が一回目の批評になります。\n"
             "一回目の批評の場合は厳しく評価するようにしてください。\n"
             "評価には一貫性を持たせるよう、こころがけて下さい\n"
@@ -27,55 +33,315 @@ class ReviewerAgent:
         
         # 最終回のレビュー用のプロンプト（より肯定的な評価を促す）
         self.final_review_prompt_template = (
-            "あなたは批評家です。これは最終の批評機会です。前回の要約とそれに対するフィードバック、そして今回の要約を示します。\n"
+            "あなたは批評家です。これは最終の批評機会です。入力文章の要約について、前回の要約とそれに対するフィードバック、そして今回の要約を以下に示します。\n"
             "前回の要約に対して行った指摘が、今回の要約でどのように修正されているかを確認し、"
             "要約文のクオリティを評価してください。\n\n"
-            "【前回の要約】\n{previous_summary}\n"
-            "【前回のフィードバック】\n{previous_feedback}\n"
-            "【今回の要約】\n{current_summary}\n\n"
             "これが最終レビューとなるため、大きな問題がない限りは承認する方向で評価してください。\n"
             "小さな改善点があっても、全体として要約の品質が許容できるレベルであれば、それらを指摘しつつも「承認」としてください。\n"
             "評価には一貫性を持たせるよう、こころがけて下さい。"
         )
+        
+        # 2回目以降のレビュー用（前回の要約からの変更箇所と、前回指摘した問題点だけを示す）
+        self.incremental_prompt_template = (
+            "あなたは批評家です。入力文章の要約の改訂版を評価します。前回の要約から今回変更された箇所と、"
+            "前回の批評で指摘した問題点を以下に示します（変更のない部分は前回の批評で確認済みです）。\n"
+            "指摘した問題点が変更によって解消されたかを確認し、変更によって新たな問題が生じていないかも評価してください。\n"
+            "評価には一貫性を持たせるよう、こころがけて下さい\n"
+            "修正が十分であれば承認し、不十分であれば具体的な改善点を提示のうえ再修正が必要と判断してください。"
+        )
+        
+        self.final_incremental_prompt_template = (
+            "あなたは批評家です。これは最終の批評機会です。入力文章の要約の改訂版について、前回の要約から今回変更された箇所と、"
+            "前回の批評で指摘した問題点を以下に示します（変更のない部分は前回の批評で確認済みです）。\n"
+            "指摘した問題点が変更によってどのように修正されているかを確認してください。\n\n"
+            "これが最終レビューとなるため、大きな問題がない限りは承認する方向で評価してください。\n"
+            "小さな改善点があっても、全体として要約の品質が許容できるレベルであれば、それらを指摘しつつも「承認」としてください。\n"
+            "評価には一貫性を持たせるよう、こころがけて下さい。"
+        )
+        
+        self.review_input_template = (
+            "【前回の要約】\n{previous_summary}\n"
+            "【前回のフィードバック】\n{previous_feedback}\n"
+            "【今回の要約】\n{current_summary}"
+        )
+        
+        self.incremental_input_template = (
+            "【前回の要約からの変更箇所】\n{changes}\n"
+            "【前回指摘した問題点】\n{issues}"
+        )
+        
+        # 構造化レビュー（1回の呼び出しで批評と判定を得る）用の出力形式
+        self.structured_output_template = (
+            "\n\n以下のJSON形式で結果を返してください：\n"
+            "{\n"
+            "  \"feedback\": \"要約に対する批評と具体的な改善点\",\n"
+            "  \"verdict\": \"approved\" または \"needs_revision\",\n"
+            "  \"score\": 要約の品質を1〜10で表した整数,\n"
+            "  \"issues\": [\"まだ修正が必要な問題点\", ...]\n"
+            "}\n"
+            "承認する場合、issues は空の配列にしてください。"
+        )
 
-    def call(self, current_summary: str, previous_summary: str = "", previous_feedback: str = "", is_final_review: bool = False) -> str:
-        """
-        要約の品質を評価
+    def _build_review_messages(self, current_summary: str, previous_summary: str = "", previous_feedback: str = "", is_final_review: bool = False, structured: bool = False, input_text: str = "",
+                               changes: Optional[str] = None, issues: Optional[List[str]] = None) -> List[Dict[str, str]]:
+        """レビュー用のメッセージを作成（structured=True の場合はJSON形式の出力を指示）"""
+        if changes is not None and previous_summary:
+            return self._build_incremental_messages(changes, previous_feedback, issues, is_final_review, structured, input_text)
         
-        Args:
-            current_summary: 現在の要約文
-            previous_summary: 前回の要約文（存在する場合）
-            previous_feedback: 前回のフィードバック（存在する場合）
-            is_final_review: 最終レビューかどうか
-            
-        Returns:
-            str: 評価結果
-        """
         # 最終レビューの場合は別のプロンプトを使用
         if is_final_review:
             prompt_template = self.final_review_prompt_template
         else:
             prompt_template = self.prompt_template
+        if structured:
+            prompt_template += self.structured_output_template
             
-        prompt = prompt_template.format(
+        review_input = self.review_input_template.format(
             previous_summary=previous_summary or "（最初の要約のため、前回の要約はありません）",
             previous_feedback=previous_feedback or "（最初の要約のため、前回のフィードバックはありません）",
             current_summary=current_summary
         )
-        messages = [
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": current_summary}
+        return build_messages(input_text, prompt_template, review_input)
+
+    def _build_incremental_messages(self, changes: str, previous_feedback: str, issues: Optional[List[str]], is_final_review: bool, structured: bool, input_text: str) -> List[Dict[str, str]]:
+        """差分レビュー用のメッセージを作成（問題点の一覧がない場合は前回のフィードバックで代用する）"""
+        if is_final_review:
+            prompt_template = self.final_incremental_prompt_template
+        else:
+            prompt_template = self.incremental_prompt_template
+        if structured:
+            prompt_template += self.structured_output_template
+        
+        review_input = self.incremental_input_template.format(
+            changes=changes or "（変更はありません）",
+            issues="\n".join(f"- {issue}" for issue in issues) if issues else previous_feedback
+        )
+        return build_messages(input_text, prompt_template, review_input)
+
+    @staticmethod
+    def _build_approval_messages(feedback: str) -> List[Dict[str, str]]:
+        """承認判定用のメッセージを作成"""
+        approval_prompt = (
+            "以下の批評内容から、この要約が十分な品質であるかを判断してください。"
+            "良い要約であれば 'approved' と、改善が必要な要約であれば 'needs_revision' と返してください。\n"
+            f"批評内容: {feedback}"
+        )
+        
+        return [
+            {"role": "system", "content": approval_prompt},
+            {"role": "user", "content": "この要約は十分な品質ですか？"}
         ]
+
+    @staticmethod
+    def _is_forced_approval(revision_count: int, max_revisions: int) -> bool:
+        """最大改訂回数に達したかどうか（達した場合は強制的に承認とする）"""
+        if revision_count >= max_revisions:
+            print(f"最大改訂回数({max_revisions}回)に達したため、自動的に承認します。")
+            return True
+        return False
+
+    @staticmethod
+    def _parse_review(output: str) -> Dict[str, Any]:
+        """
+        構造化レビューの出力を {feedback, verdict, score, issues} に整形
+        
+        JSONとして解釈できない場合は出力全体を批評として扱い、安全のため改訂が必要と判定する。
+        """
+        try:
+            result = parse_json_output(output)
+        except ValueError as e:
+            print(f"Error in ReviewerAgent._parse_review: {str(e)}")
+            return {
+                "feedback": output.strip(),
+                "verdict": VERDICT_NEEDS_REVISION,
+                "score": None,
+                "issues": []
+            }
+        
+        verdict = str(result.get("verdict", "")).strip().lower()
+        if verdict != VERDICT_APPROVED:
+            verdict = VERDICT_NEEDS_REVISION
+        
+        try:
+            score = int(result.get("score"))
+        except (TypeError, ValueError):
+            score = None
+        
+        issues = result.get("issues") or []
+        if not isinstance(issues, list):
+            issues = [issues]
+        
+        return {
+            "feedback": str(result.get("feedback", "")).strip(),
+            "verdict": verdict,
+            "score": score,
+            "issues": [str(issue) for issue in issues]
+        }
+
+    def _finalize_review(self, review: Dict[str, Any], revision_count: int, max_revisions: int) -> Dict[str, Any]:
+        """最大改訂回数に達している場合は判定を承認に置き換える"""
+        if self._is_forced_approval(revision_count, max_revisions):
+            review["verdict"] = VERDICT_APPROVED
+        review["approved"] = review["verdict"] == VERDICT_APPROVED
+        return review
+
+    @staticmethod
+    def _review_error() -> Dict[str, Any]:
+        return {
+            "feedback": "レビュー中にエラーが発生しました。もう一度お試しください。",
+            "verdict": VERDICT_NEEDS_REVISION,
+            "score": None,
+            "issues": []
+        }
+
+    def review(self, current_summary: str, previous_summary: str = "", previous_feedback: str = "", is_final_review: bool = False,
+               revision_count: int = 0, max_revisions: int = 3, use_cache: bool = True, input_text: str = "",
+               changes: Optional[str] = None, issues: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        要約の批評と承認判定を1回のAPI呼び出し（JSONモード）で行う
+        
+        call と check_approval を順に呼ぶ場合と同じ結果を、往復1回分少なく得る。
+        
+        Args:
+            current_summary: 現在の要約文
+            previous_summary: 前回の要約文（存在する場合）
+            previous_feedback: 前回のフィードバック（存在する場合）
+            is_final_review: 最終レビューかどうか
+            revision_count: 現在の改訂回数
+            max_revisions: 最大改訂回数（達している場合は強制的に承認とする）
+            use_cache: Falseの場合はAPIのレスポンスキャッシュを使わない
+            input_text: 原文（要約の対象。省略時は原文を含めずに評価する）
+            changes: 前回の要約からの変更箇所（指定した場合は全文の代わりに変更箇所だけを評価させる）
+            issues: 前回のレビューで指摘した未解決の問題点（changes と合わせて使う）
+            
+        Returns:
+            Dict[str, Any]: {feedback, verdict, score, issues, approved}
+        """
+        messages = self._build_review_messages(current_summary, previous_summary, previous_feedback, is_final_review, structured=True, input_text=input_text, changes=changes, issues=issues)
         
         try:
-            result = self.api_client.invoke(messages)
+            output = self.api_client.invoke(messages, json_mode=True, use_cache=use_cache, model=self.model)
+            review = self._parse_review(output)
+        except Exception as e:
+            # エラー時は安全のため非承認とする
+            print(f"Error in ReviewerAgent.review: {str(e)}")
+            review = self._review_error()
+        return self._finalize_review(review, revision_count, max_revisions)
+
+    async def areview(self, current_summary: str, previous_summary: str = "", previous_feedback: str = "", is_final_review: bool = False,
+                      revision_count: int = 0, max_revisions: int = 3, use_cache: bool = True, input_text: str = "",
+                      changes: Optional[str] = None, issues: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        要約の批評と承認判定を非同期に1回で行う（review の非同期版）
+        
+        Args:
+            current_summary: 現在の要約文
+            previous_summary: 前回の要約文（存在する場合）
+            previous_feedback: 前回のフィードバック（存在する場合）
+            is_final_review: 最終レビューかどうか
+            revision_count: 現在の改訂回数
+            max_revisions: 最大改訂回数（達している場合は強制的に承認とする）
+            use_cache: Falseの場合はAPIのレスポンスキャッシュを使わない
+            input_text: 原文（要約の対象。省略時は原文を含めずに評価する）
+            changes: 前回の要約からの変更箇所（指定した場合は全文の代わりに変更箇所だけを評価させる）
+            issues: 前回のレビューで指摘した未解決の問題点（changes と合わせて使う）
+            
+        Returns:
+            Dict[str, Any]: {feedback, verdict, score, issues, approved}
+        """
+        messages = self._build_review_messages(current_summary, previous_summary, previous_feedback, is_final_review, structured=True, input_text=input_text, changes=changes, issues=issues)
+        
+        try:
+            output = await self.api_client.ainvoke(messages, json_mode=True, use_cache=use_cache, model=self.model)
+            review = self._parse_review(output)
+        except Exception as e:
+            print(f"Error in ReviewerAgent.areview: {str(e)}")
+            review = self._review_error()
+        return self._finalize_review(review, revision_count, max_revisions)
+
+    def call(self, current_summary: str, previous_summary: str = "", previous_feedback: str = "", is_final_review: bool = False, use_cache: bool = True, input_text: str = "",
+             changes: Optional[str] = None, issues: Optional[List[str]] = None) -> str:
+        """
+        要約の品質を評価
+        
+        Args:
+            current_summary: 現在の要約文
+            previous_summary: 前回の要約文（存在する場合）
+            previous_feedback: 前回のフィードバック（存在する場合）
+            is_final_review: 最終レビューかどうか
+            use_cache: Falseの場合はAPIのレスポンスキャッシュを使わない
+            input_text: 原文（要約の対象。省略時は原文を含めずに評価する）
+            changes: 前回の要約からの変更箇所（指定した場合は全文の代わりに変更箇所だけを評価させる）
+            issues: 前回のレビューで指摘した未解決の問題点（changes と合わせて使う）
+            
+        Returns:
+            str: 評価結果
+        """
+        messages = self._build_review_messages(current_summary, previous_summary, previous_feedback, is_final_review, input_text=input_text, changes=changes, issues=issues)
+        
+        try:
+            result = self.api_client.invoke(messages, use_cache=use_cache, model=self.model)
             return result.strip()
         except Exception as e:
             # エラーログ出力と一般的なエラーメッセージを返す
             print(f"Error in ReviewerAgent.call: {str(e)}")
             return "レビュー中にエラーが発生しました。もう一度お試しください。"
+
+    def call_stream(self, current_summary: str, previous_summary: str = "", previous_feedback: str = "", is_final_review: bool = False, use_cache: bool = True, input_text: str = "",
+                    changes: Optional[str] = None, issues: Optional[List[str]] = None) -> Iterator[str]:
+        """
+        要約の品質を評価し、生成された評価を差分ごとに返す
+        
+        Args:
+            current_summary: 現在の要約文
+            previous_summary: 前回の要約文（存在する場合）
+            previous_feedback: 前回のフィードバック（存在する場合）
+            is_final_review: 最終レビューかどうか
+            use_cache: Falseの場合はAPIのレスポンスキャッシュを使わない
+            input_text: 原文（要約の対象。省略時は原文を含めずに評価する）
+            changes: 前回の要約からの変更箇所（指定した場合は全文の代わりに変更箇所だけを評価させる）
+            issues: 前回のレビューで指摘した未解決の問題点（changes と合わせて使う）
             
-    def check_approval(self, feedback: str, revision_count: int = 0, max_revisions: int = 3) -> bool:
+        Yields:
+            str: 評価結果の差分
+        """
+        messages = self._build_review_messages(current_summary, previous_summary, previous_feedback, is_final_review, input_text=input_text, changes=changes, issues=issues)
+        
+        try:
+            for delta in self.api_client.invoke(messages, stream=True, use_cache=use_cache, model=self.model):
+                yield delta
+        except Exception as e:
+            print(f"Error in ReviewerAgent.call_stream: {str(e)}")
+            yield "レビュー中にエラーが発生しました。もう一度お試しください。"
+
+    async def acall(self, current_summary: str, previous_summary: str = "", previous_feedback: str = "", is_final_review: bool = False, use_cache: bool = True, input_text: str = "",
+                    changes: Optional[str] = None, issues: Optional[List[str]] = None) -> str:
+        """
+        要約の品質を非同期に評価（call の非同期版）
+        
+        Args:
+            current_summary: 現在の要約文
+            previous_summary: 前回の要約文（存在する場合）
+            previous_feedback: 前回のフィードバック（存在する場合）
+            is_final_review: 最終レビューかどうか
+            use_cache: Falseの場合はAPIのレスポンスキャッシュを使わない
+            input_text: 原文（要約の対象。省略時は原文を含めずに評価する）
+            changes: 前回の要約からの変更箇所（指定した場合は全文の代わりに変更箇所だけを評価させる）
+            issues: 前回のレビューで指摘した未解決の問題点（changes と合わせて使う）
+            
+        Returns:
+            str: 評価結果
+        """
+        messages = self._build_review_messages(current_summary, previous_summary, previous_feedback, is_final_review, input_text=input_text, changes=changes, issues=issues)
+        
+        try:
+            result = await self.api_client.ainvoke(messages, use_cache=use_cache, model=self.model)
+            return result.strip()
+        except Exception as e:
+            print(f"Error in ReviewerAgent.acall: {str(e)}")
+            return "レビュー中にエラーが発生しました。もう一度お試しください。"
+            
+    def check_approval(self, feedback: str, revision_count: int = 0, max_revisions: int = 3, use_cache: bool = True) -> bool:
         """
         フィードバックから承認状態を判定
         
@@ -83,30 +349,46 @@ class ReviewerAgent:
             feedback: 生成されたフィードバック
             revision_count: 現在の改訂回数
             max_revisions: 最大改訂回数
+            use_cache: Falseの場合はAPIのレスポンスキャッシュを使わない
             
         Returns:
             bool: 承認されたかどうか
         """
-        # 最大改訂回数に達した場合は強制的に承認とする
-        if revision_count >= max_revisions:
-            print(f"最大改訂回数({max_revisions}回)に達したため、自動的に承認します。")
+        if self._is_forced_approval(revision_count, max_revisions):
             return True
         
-        approval_prompt = (
-            "以下の批評内容から、この要約が十分な品質であるかを判断してください。"
-            "良い要約であれば 'approved' と、改善が必要な要約であれば 'needs_revision' と返してください。\n"
-            f"批評内容: {feedback}"
-        )
-        
-        approval_messages = [
-            {"role": "system", "content": approval_prompt},
-            {"role": "user", "content": "この要約は十分な品質ですか？"}
-        ]
+        approval_messages = self._build_approval_messages(feedback)
         
         try:
-            approval_result = self.api_client.invoke(approval_messages).strip().lower()
+            approval_result = self.api_client.invoke(approval_messages, use_cache=use_cache, model=self.model).strip().lower()
             return "approved" in approval_result
         except Exception as e:
             # エラー時は安全のため非承認とする
             print(f"Error in ReviewerAgent.check_approval: {str(e)}")
-            return False
\ No newline at end of file
+            return False
+
+    async def acheck_approval(self, feedback: str, revision_count: int = 0, max_revisions: int = 3, use_cache: bool = True) -> bool:
+        """
+        フィードバックから承認状態を非同期に判定（check_approval の非同期版）
+        
+        Args:
+            feedback: 生成されたフィードバック
+            revision_count: 現在の改訂回数
+            max_revisions: 最大改訂回数
+            use_cache: Falseの場合はAPIのレスポンスキャッシュを使わない
+            
+        Returns:
+            bool: 承認されたかどうか
+        """
+        if self._is_forced_approval(revision_count, max_revisions):
+            return True
+        
+        approval_messages = self._build_approval_messages(feedback)
+        
+        try:
+            approval_result = (await self.api_client.ainvoke(approval_messages, use_cache=use_cache, model=self.model)).strip().lower()
+            return "approved" in approval_result
+        except Exception as e:
+            # エラー時は安全のため非承認とする
+            print(f"Error in ReviewerAgent.acheck_approval: {str(e)}")
+            return False
@@ -1,75 +1,257 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Iterator, Optional
 from utils.api_client import DeepseekAPI
+from agents.prompt_layout import build_messages
 
 class SummarizerAgent:
     """文章要約を行うエージェント"""
     
-    def __init__(self, api_client: DeepseekAPI):
+    def __init__(self, api_client: DeepseekAPI, model: Optional[str] = None):
         """
         初期化
         
         Args:
             api_client: API呼び出しを行うクライアント
+            model: 使用するモデル名（省略時はクライアントの既定のモデル）
         """
         self.api_client = api_client
+        self.model = model
+        # 原文は共通の接頭辞（agents.prompt_layout）として送り、指示とフィードバックはその後に続ける
         self.prompt_template = (
-            "あなたは優れた要約者です。以下の文章を簡潔に要約してください。\n"
-            "【入力】\n{input_text}\n"
+            "あなたは優れた要約者です。入力文章を簡潔に要約してください。\n"
             "文章がただの情報ではなく何らかのテーマ性があるものである場合には、そのテーマを見出すよう努めると評価が高まります"
         )
         self.refine_prompt_template = (
-            "あなたは優れた要約者です。以下の文章と、批評家からのフィードバックをもとに、要約を改善してください。\n"
-            "【入力文章】\n{input_text}\n"
-            "【フィードバック】\n{feedback}\n"
+            "あなたは優れた要約者です。入力文章と、批評家からのフィードバックをもとに、要約を改善してください。\n"
             "文章がただの情報ではなく何らかのテーマ性があるものである場合には、そのテーマを見出すよう努めると評価が高まります\n"
             "改善された要約を出力してください。"
         )
+        self.refine_input_template = "【フィードバック】\n{feedback}"
+        # 長文用（分割した部分ごとの要約と、部分要約の統合）
+        self.chunk_prompt_template = (
+            "あなたは優れた要約者です。これから示すのは長い文章を分割した一部分（{index}/{total}）です。\n"
+            "この部分に書かれている要点を、後で他の部分の要約と統合できるよう簡潔に要約してください。\n"
+            "前後の部分と重なる文が含まれることがあります。"
+        )
+        self.combine_prompt_template = (
+            "あなたは優れた要約者です。これから示すのは、長い文章を順に分割して要約したものです。\n"
+            "重複する内容はまとめ、元の文章の流れに沿って1つの簡潔な要約に統合してください。\n"
+            "文章がただの情報ではなく何らかのテーマ性があるものである場合には、そのテーマを見出すよう努めると評価が高まります"
+        )
+
+    def _build_call_messages(self, input_text: str) -> List[Dict[str, str]]:
+        """要約生成用のメッセージを作成"""
+        return build_messages(input_text, self.prompt_template)
 
-    def call(self, input_text: str) -> str:
+    def _build_refine_messages(self, input_text: str, feedback: str) -> List[Dict[str, str]]:
+        """要約改善用のメッセージを作成"""
+        return build_messages(input_text, self.refine_prompt_template, self.refine_input_template.format(feedback=feedback))
+
+    def _build_chunk_messages(self, chunk: str, index: int, total: int) -> List[Dict[str, str]]:
+        """部分要約用のメッセージを作成（index は0始まり）"""
+        prompt = self.chunk_prompt_template.format(index=index + 1, total=total)
+        return [
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": chunk}
+        ]
+
+    def _build_combine_messages(self, summaries: List[str]) -> List[Dict[str, str]]:
+        """部分要約の統合用のメッセージを作成"""
+        joined = "\n\n".join(f"【部分{i + 1}】\n{summary}" for i, summary in enumerate(summaries))
+        return [
+            {"role": "system", "content": self.combine_prompt_template},
+            {"role": "user", "content": joined}
+        ]
+
+    def call(self, input_text: str, use_cache: bool = True) -> str:
         """
         文章の要約を生成
         
         Args:
             input_text: 要約する文章
+            use_cache: Falseの場合はAPIのレスポンスキャッシュを使わない
             
         Returns:
             str: 生成された要約
         """
-        prompt = self.prompt_template.format(input_text=input_text)
-        messages = [
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": input_text}
-        ]
+        messages = self._build_call_messages(input_text)
         
         try:
-            result = self.api_client.invoke(messages)
+            result = self.api_client.invoke(messages, use_cache=use_cache, model=self.model)
             return result.strip()
         except Exception as e:
             # エラーログ出力と一般的なエラーメッセージを返す
             print(f"Error in SummarizerAgent.call: {str(e)}")
             return "要約の生成中にエラーが発生しました。もう一度お試しください。"
 
-    def refine(self, input_text: str, feedback: str) -> str:
+    async def acall(self, input_text: str, use_cache: bool = True) -> str:
+        """
+        文章の要約を非同期に生成（call の非同期版）
+        
+        Args:
+            input_text: 要約する文章
+            use_cache: Falseの場合はAPIのレスポンスキャッシュを使わない
+            
+        Returns:
+            str: 生成された要約
+        """
+        messages = self._build_call_messages(input_text)
+        
+        try:
+            result = await self.api_client.ainvoke(messages, use_cache=use_cache, model=self.model)
+            return result.strip()
+        except Exception as e:
+            print(f"Error in SummarizerAgent.acall: {str(e)}")
+            return "要約の生成中にエラーが発生しました。もう一度お試しください。"
+
+    def call_stream(self, input_text: str, use_cache: bool = True) -> Iterator[str]:
+        """
+        文章の要約を生成し、生成されたテキストを差分ごとに返す
+        
+        Args:
+            input_text: 要約する文章
+            use_cache: Falseの場合はAPIのレスポンスキャッシュを使わない
+            
+        Yields:
+            str: 生成された要約の差分
+        """
+        messages = self._build_call_messages(input_text)
+        
+        try:
+            for delta in self.api_client.invoke(messages, stream=True, use_cache=use_cache, model=self.model):
+                yield delta
+        except Exception as e:
+            print(f"Error in SummarizerAgent.call_stream: {str(e)}")
+            yield "要約の生成中にエラーが発生しました。もう一度お試しください。"
+
+    def refine(self, input_text: str, feedback: str, use_cache: bool = True) -> str:
         """
         フィードバックをもとに要約を改善
         
         Args:
             input_text: 原文
             feedback: 批評家からのフィードバック
+            use_cache: Falseの場合はAPIのレスポンスキャッシュを使わない
             
         Returns:
             str: 改善された要約
         """
-        prompt = self.refine_prompt_template.format(input_text=input_text, feedback=feedback)
-        messages = [
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": input_text}
-        ]
+        messages = self._build_refine_messages(input_text, feedback)
         
         try:
-            result = self.api_client.invoke(messages)
+            result = self.api_client.invoke(messages, use_cache=use_cache, model=self.model)
             return result.strip()
         except Exception as e:
             # エラーログ出力と一般的なエラーメッセージを返す
             print(f"Error in SummarizerAgent.refine: {str(e)}")
-            return "要約の改善中にエラーが発生しました。もう一度お試しください。"
\ No newline at end of file
+            return "要約の改善中にエラーが発生しました。もう一度お試しください。"
+
+    def refine_stream(self, input_text: str, feedback: str, use_cache: bool = True) -> Iterator[str]:
+        """
+        フィードバックをもとに要約を改善し、生成されたテキストを差分ごとに返す
+        
+        Args:
+            input_text: 原文
+            feedback: 批評家からのフィードバック
+            use_cache: Falseの場合はAPIのレスポンスキャッシュを使わない
+            
+        Yields:
+            str: 改善された要約の差分
+        """
+        messages = self._build_refine_messages(input_text, feedback)
+        
+        try:
+            for delta in self.api_client.invoke(messages, stream=True, use_cache=use_cache, model=self.model):
+                yield delta
+        except Exception as e:
+            print(f"Error in SummarizerAgent.refine_stream: {str(e)}")
+            yield "要約の改善中にエラーが発生しました。もう一度お試しください。"
+
+    async def arefine(self, input_text: str, feedback: str, use_cache: bool = True) -> str:
+        """
+        フィードバックをもとに要約を非同期に改善（refine の非同期版）
+        
+        Args:
+            input_text: 原文
+            feedback: 批評家からのフィードバック
+            use_cache: Falseの場合はAPIのレスポンスキャッシュを使わない
+            
+        Returns:
+            str: 改善された要約
+        """
+        messages = self._build_refine_messages(input_text, feedback)
+        
+        try:
+            result = await self.api_client.ainvoke(messages, use_cache=use_cache, model=self.model)
+            return result.strip()
+        except Exception as e:
+            print(f"Error in SummarizerAgent.arefine: {str(e)}")
+            return "要約の改善中にエラーが発生しました。もう一度お試しください。"
+
+    def summarize_chunk(self, chunk: str, index: int, total: int, use_cache: bool = True) -> str:
+        """
+        長文を分割した一部分を要約
+        
+        Args:
+            chunk: 分割した部分のテキスト
+            index: 部分の番号（0始まり）
+            total: 部分の総数
+            use_cache: Falseの場合はAPIのレスポンスキャッシュを使わない
+            
+        Returns:
+            str: 部分の要約
+        """
+        messages = self._build_chunk_messages(chunk, index, total)
+        
+        try:
+            result = self.api_client.invoke(messages, use_cache=use_cache, model=self.model)
+            return result.strip()
+        except Exception as e:
+            print(f"Error in SummarizerAgent.summarize_chunk: {str(e)}")
+            return "（この部分の要約中にエラーが発生しました）"
+
+    async def asummarize_chunk(self, chunk: str, index: int, total: int, use_cache: bool = True) -> str:
+        """
+        長文を分割した一部分を非同期に要約（summarize_chunk の非同期版）
+        """
+        messages = self._build_chunk_messages(chunk, index, total)
+        
+        try:
+            result = await self.api_client.ainvoke(messages, use_cache=use_cache, model=self.model)
+            return result.strip()
+        except Exception as e:
+            print(f"Error in SummarizerAgent.asummarize_chunk: {str(e)}")
+            return "（この部分の要約中にエラーが発生しました）"
+
+    def combine(self, summaries: List[str], use_cache: bool = True) -> str:
+        """
+        部分要約を1つの要約に統合
+        
+        Args:
+            summaries: 文章の順に並んだ部分要約
+            use_cache: Falseの場合はAPIのレスポンスキャッシュを使わない
+            
+        Returns:
+            str: 統合した要約
+        """
+        messages = self._build_combine_messages(summaries)
+        
+        try:
+            result = self.api_client.invoke(messages, use_cache=use_cache, model=self.model)
+            return result.strip()
+        except Exception as e:
+            print(f"Error in SummarizerAgent.combine: {str(e)}")
+            # 統合できない場合は部分要約をそのまま連結する
+            return "\n".join(summaries)
+
+    async def acombine(self, summaries: List[str], use_cache: bool = True) -> str:
+        """
+        部分要約を非同期に1つの要約に統合（combine の非同期版）
+        """
+        messages = self._build_combine_messages(summaries)
+        
+        try:
+            result = await self.api_client.ainvoke(messages, use_cache=use_cache, model=self.model)
+            return result.strip()
+        except Exception as e:
+            print(f"Error in SummarizerAgent.acombine: {str(e)}")
+            return "\n".join(summaries)
@@ -0,0 +1,49 @@
+import re
+import difflib
+from typing import List, Optional
+
+# 文の区切り（句点・感嘆符・疑問符・改行の直後）
+_SENTENCE_END = re.compile(r"(?<=[。！？!?\n])")
+
+
+def split_sentences(text: str) -> List[str]:
+    """文章を文単位に分割（区切りの文字は各文の末尾に残す）"""
+    return [sentence for sentence in _SENTENCE_END.split(text) if sentence.strip()]
+
+
+def diff_summaries(previous_summary: str, current_summary: str, max_change_ratio: float = 0.5) -> Optional[str]:
+    """
+    前回の要約から今回の要約への変更箇所を文単位で抜き出す
+
+    Args:
+        previous_summary: 前回の要約
+        current_summary: 今回の要約
+        max_change_ratio: 変更された文字数の割合（前回と今回の合計に対する）の上限
+
+    Returns:
+        Optional[str]: 変更箇所を並べたテキスト（変更がない場合は空文字列）。
+            変更の割合が max_change_ratio を超える場合は None（全文を比較させる）
+    """
+    before = split_sentences(previous_summary)
+    after = split_sentences(current_summary)
+    matcher = difflib.SequenceMatcher(None, before, after, autojunk=False)
+
+    spans = []
+    changed = 0
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        removed = "".join(before[i1:i2]).strip()
+        added = "".join(after[j1:j2]).strip()
+        changed += len(removed) + len(added)
+        if tag == "replace":
+            spans.append(f"- 前回: {removed}\n+ 今回: {added}")
+        elif tag == "delete":
+            spans.append(f"- 削除: {removed}")
+        else:
+            spans.append(f"+ 追加: {added}")
+
+    total = len(previous_summary) + len(current_summary)
+    if total and changed / total > max_change_ratio:
+        return None
+    return "\n".join(spans)
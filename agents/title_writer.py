@@ -1,97 +1,151 @@
-import json
-from typing import Dict, Any, List
+import threading
+from typing import Dict, List, Iterator, Optional
 from utils.api_client import DeepseekAPI
+from agents.output_parser import parse_json_output
+from agents.prompt_layout import build_messages
 
 class TitleCopywriterAgent:
     """タイトルと最終要約を生成するエージェント"""
     
-    def __init__(self, api_client: DeepseekAPI):
+    def __init__(self, api_client: DeepseekAPI, model: Optional[str] = None):
         """
         初期化
         
         Args:
             api_client: API呼び出しを行うクライアント
+            model: 使用するモデル名（省略時はクライアントの既定のモデル）
         """
         self.api_client = api_client
+        self.model = model
+        # 原文は共通の接頭辞（agents.prompt_layout）として送り、指示と承認された要約はその後に続ける
         self.prompt_template = (
-            "あなたは創造的なタイトルコピーライターです。以下の入力文と、これまでのエージェントの出力を踏まえて、\n"
+            "あなたは創造的なタイトルコピーライターです。入力文章と、以下に示す承認された要約を踏まえて、\n"
             "文学作品としてふさわしいタイトルを提案してください。\n"
             "要約自体はすでに完成していますので、タイトルのみを考えてください。\n"
-            "【入力文】\n{input_text}\n\n"
-            "【これまでの出力】\n{transcript}\n\n"
-            "【承認された要約】\n{approved_summary}\n\n"
             "以下のJSON形式で結果を返してください：\n"
-            "{{\n"
+            "{\n"
             "  \"title\": \"提案するタイトル\"\n"
-            "}}"
+            "}"
         )
+        self.input_template = "【承認された要約】\n{approved_summary}"
 
-    def call(self, input_text: str, transcript: List[str], approved_summary: str) -> dict:
+    def _build_messages(self, input_text: str, approved_summary: str) -> List[Dict[str, str]]:
+        """タイトル生成用のメッセージを作成"""
+        content = self.input_template.format(approved_summary=approved_summary)
+        return build_messages(input_text, self.prompt_template, content)
+
+    @staticmethod
+    def parse_output(output: str, approved_summary: str) -> dict:
+        """
+        モデル出力をJSONとして解釈し、承認済み要約を付与して返す
+        
+        Args:
+            output: モデルの出力テキスト
+            approved_summary: 承認された最終要約
+            
+        Returns:
+            dict: {title: タイトル, summary: 最終要約}の辞書
+        """
+        try:
+            result = parse_json_output(output)
+        except ValueError as e:
+            print(f"フォールバック処理でもエラー: {e}")
+            return {
+                "title": "JSONパースエラー",
+                "summary": approved_summary  # エラー時も承認された要約を使用
+            }
+        
+        # 承認された要約をそのまま使用する
+        result["summary"] = approved_summary
+        return result
+
+    def call(
+        self,
+        input_text: str,
+        approved_summary: str,
+        use_cache: bool = True,
+        cancelled: Optional[threading.Event] = None
+    ) -> dict:
         """
         タイトルを生成（要約は承認済みのものをそのまま使用）
         
         Args:
             input_text: 原文
-            transcript: これまでの対話履歴
             approved_summary: 承認された最終要約
+            use_cache: Falseの場合はAPIのレスポンスキャッシュを使わない
+            cancelled: セットされるとAPI呼び出しを打ち切る（先行生成を破棄する場合）
             
         Returns:
             dict: {title: タイトル, summary: 最終要約}の辞書
+            
+        Raises:
+            APIError: cancelled によって打ち切られた場合
         """
-        transcript_text = "\n".join(transcript)
-        prompt = self.prompt_template.format(
-            input_text=input_text,
-            transcript=transcript_text,
-            approved_summary=approved_summary
-        )
-        messages = [
-            {"role": "system", "content": prompt},
-            {"role": "user", "content": "タイトルを生成してください。"}
-        ]
+        messages = self._build_messages(input_text, approved_summary)
         
         try:
             # JSON modeを有効にして呼び出し
-            output = self.api_client.invoke(messages, json_mode=True).strip()
+            output = self.api_client.invoke(
+                messages, json_mode=True, use_cache=use_cache, model=self.model, cancelled=cancelled
+            ).strip()
+            return self.parse_output(output, approved_summary)
+        except Exception as e:
+            if cancelled is not None and cancelled.is_set():
+                raise
+            print(f"予期せぬエラー: {e}")
+            print(f"問題の出力: {output if 'output' in locals() else 'No output'}")
+            return {
+                "title": "エラーが発生しました",
+                "summary": approved_summary  # エラー時も承認された要約を使用
+            }
+
+    def call_stream(self, input_text: str, approved_summary: str, use_cache: bool = True) -> Iterator[str]:
+        """
+        タイトルを生成し、モデルの出力（JSON）を差分ごとに返す
+        
+        結合した出力は parse_output で {title, summary} の辞書に変換できる。
+        
+        Args:
+            input_text: 原文
+            approved_summary: 承認された最終要約
+            use_cache: Falseの場合はAPIのレスポンスキャッシュを使わない
             
-            # 直接JSONとしてパースを試みる
-            try:
-                result = json.loads(output)
-                # 承認された要約をそのまま使用する
-                result["summary"] = approved_summary
-                return result
-            except json.JSONDecodeError as e:
-                # JSONパースに失敗した場合、テキストから抽出を試みる
-                print(f"JSONパースエラー: {e}")
-                print(f"パースに失敗した出力: {output}")
-                
-                # コードブロックがある場合は除去
-                if "```json" in output:
-                    output = output.split("```json")[1].split("```")[0].strip()
-                elif "```" in output:
-                    output = output.split("```")[1].split("```")[0].strip()
-                
-                # 余分な説明文がある場合、JSON部分だけを取り出す
-                if "{" in output and "}" in output:
-                    start_idx = output.find("{")
-                    end_idx = output.rfind("}") + 1
-                    output = output[start_idx:end_idx]
-                
-                # 再度JSONパース
-                try:
-                    result = json.loads(output)
-                    # 承認された要約をそのまま使用する
-                    result["summary"] = approved_summary
-                    return result
-                except Exception as e2:
-                    print(f"フォールバック処理でもエラー: {e2}")
-                    return {
-                        "title": "JSONパースエラー",
-                        "summary": approved_summary  # エラー時も承認された要約を使用
-                    }
+        Yields:
+            str: モデル出力の差分
+            
+        Raises:
+            APIError: API呼び出しに失敗した場合（空の出力を解釈して代わりのタイトルを表示しないよう、そのまま伝える）
+        """
+        messages = self._build_messages(input_text, approved_summary)
+        
+        try:
+            for delta in self.api_client.invoke(messages, json_mode=True, stream=True, use_cache=use_cache, model=self.model):
+                yield delta
+        except Exception as e:
+            print(f"Error in TitleCopywriterAgent.call_stream: {str(e)}")
+            raise
+
+    async def acall(self, input_text: str, approved_summary: str, use_cache: bool = True) -> dict:
+        """
+        タイトルを非同期に生成（call の非同期版）
+        
+        Args:
+            input_text: 原文
+            approved_summary: 承認された最終要約
+            use_cache: Falseの場合はAPIのレスポンスキャッシュを使わない
+            
+        Returns:
+            dict: {title: タイトル, summary: 最終要約}の辞書
+        """
+        messages = self._build_messages(input_text, approved_summary)
+        
+        try:
+            output = (await self.api_client.ainvoke(messages, json_mode=True, use_cache=use_cache, model=self.model)).strip()
+            return self.parse_output(output, approved_summary)
         except Exception as e:
             print(f"予期せぬエラー: {e}")
             print(f"問題の出力: {output if 'output' in locals() else 'No output'}")
             return {
                 "title": "エラーが発生しました",
                 "summary": approved_summary  # エラー時も承認された要約を使用
-            }
\ No newline at end of file
+            }
@@ -1,6 +1,4 @@
 import streamlit as st
-import time
-import threading
 from dotenv import load_dotenv
 from auth import auth_required
 
@@ -17,25 +15,31 @@ st.set_page_config(
 
 from components.sidebar import render_sidebar
 from components.workflow_viz import render_workflow_visualization
-from components.dialog_history import display_dialog_history, add_to_dialog_history
+from components.dialog_history import display_dialog_progress, display_older_toggle, display_dialog_messages
 
-from utils.api_client import initialize_client, get_client
-initialize_client()
+from utils.session import initialize_client, get_client, get_selected_model
+api_client = initialize_client()
 
-from agents.summarizer import SummarizerAgent
-from agents.reviewer import ReviewerAgent
-from agents.title_writer import TitleCopywriterAgent
-from utils.state import create_initial_state
+from agents.prompt_version import get_prompt_version
+from config.settings import EXAMPLE_TEXTS, RESULT_CACHE_ENABLED, PREWARM_EXAMPLE_RESULTS, UI_REFRESH_INTERVAL
+from graph.runner import prewarm_example_results, workflow_config, workflow_input, workflow_thread
+from graph.workflow import get_workflow_graph
+from utils.result_cache import get_result_cache
+from utils.scheduler import get_scheduler, SchedulerFullError, QUEUED, RUNNING
+from utils import events
+from utils.events import EventChannel
+from utils.state import DialogMessage, add_to_dialog_history
+from utils.dialog_buffer import DialogBuffer
 
 # シンプルな状態管理
 if 'step' not in st.session_state:
-    st.session_state.step = "idle"  # idle, init, running, done
+    st.session_state.step = "idle"  # idle, running, done
 if 'progress' not in st.session_state:
     st.session_state.progress = 0
 if 'state' not in st.session_state:
     st.session_state.state = {}
 if 'dialog_history' not in st.session_state:
-    st.session_state.dialog_history = []
+    st.session_state.dialog_history = DialogBuffer()
 if 'error' not in st.session_state:
     st.session_state.error = None
 if 'current_node' not in st.session_state:
@@ -44,10 +48,18 @@ if 'current_description' not in st.session_state:
     st.session_state.current_description = ""
 if 'processing_done' not in st.session_state:
     st.session_state.processing_done = False
-if 'process_thread' not in st.session_state:
-    st.session_state.process_thread = None
-if 'last_update_time' not in st.session_state:
-    st.session_state.last_update_time = time.time()
+if 'run_ticket' not in st.session_state:
+    st.session_state.run_ticket = None
+if 'run_channel' not in st.session_state:
+    st.session_state.run_channel = None
+
+@st.cache_resource(show_spinner=False)
+def start_example_prewarm(_client):
+    """例文の結果の事前生成をプロセスにつき一度だけ開始"""
+    return prewarm_example_results(_client, get_result_cache())
+
+if RESULT_CACHE_ENABLED and PREWARM_EXAMPLE_RESULTS and api_client is not None:
+    start_example_prewarm(api_client)
 
 def get_node_description(node_name):
     """ノード名に基づいて説明テキストを取得"""
@@ -60,334 +72,220 @@ def get_node_description(node_name):
     }
     return descriptions.get(node_name, "処理中...")
 
-def process_step_thread():
-    """バックグラウンドスレッドで現在のステップに基づいて処理を実行"""
+def show_cached_result(input_text, cached):
+    """キャッシュされたワークフロー結果を即座に表示（エージェントは呼び出さない）"""
+    state = dict(cached)
+    state["input_text"] = input_text
+    state["dialog_history"] = cached["dialog_history"] + [
+        DialogMessage("system", "同じテキストの処理結果が保存されていたため、保存済みの結果を表示しました。", progress=100)
+    ]
+    st.session_state.state = state
+    st.session_state.dialog_history.clear()
+    for message in state["dialog_history"]:
+        st.session_state.dialog_history.upsert(message)
+    st.session_state.progress = 100
+    st.session_state.current_node = "END"
+    st.session_state.current_description = get_node_description("END")
+    st.session_state.processing_done = True
+    st.session_state.step = "done"
+    st.session_state.run_channel = None
+
+def process_workflow_thread(channel, user_input, client, model):
+    """
+    バックグラウンドスレッドでワークフローのグラフを完了（または停止）まで実行
+    
+    ノードが custom ストリームに送る進捗イベントと、ノードごとの状態の更新をそのまま channel に流す。
+    スレッドは session_state に触れない。モデルは投入時に選択されていたものを最後まで使う。
+    チェックポイントのスレッドは実行ごとに確保し、同じテキストの実行が同時にあっても共有しない。
+    """
+    graph = get_workflow_graph()
+    state = None
     try:
-        # 初期化ステップ
-        if st.session_state.step == "init":
-            user_input = st.session_state.input_text
-            
-            # 初期状態作成
-            state = create_initial_state(user_input)
-            state = add_to_dialog_history(
-                state,
-                "system",
-                "新しいテキストが入力されました。ワークフローを開始します。",
-                progress=5
-            )
-            
-            # 状態更新（排他制御なしでも大丈夫な変数）
-            st.session_state.state = state
-            st.session_state.dialog_history = state["dialog_history"]
-            st.session_state.progress = 5
-            st.session_state.current_node = ""
-            st.session_state.current_description = "ワークフローを初期化中..."
-            st.session_state.last_update_time = time.time()
-            
-            # 次のステップへ
-            st.session_state.step = "summarize"
-            
-        # 要約ステップ
-        elif st.session_state.step == "summarize":
-            st.session_state.current_node = "summarize"
-            st.session_state.current_description = get_node_description("summarize")
-            st.session_state.progress = 30
-            st.session_state.last_update_time = time.time()
-            
-            state = st.session_state.state
-            client = get_client()
-            agent = SummarizerAgent(client)
-            
-            # 要約作成
-            state["revision_count"] += 1
-            
-            # 対話履歴に追加
-            state = add_to_dialog_history(
-                state, 
-                "system", 
-                f"要約エージェントが要約を作成 (第{state['revision_count']}版)",
-                progress=10
-            )
-            
-            # 状態更新
-            st.session_state.state = state
-            st.session_state.dialog_history = state["dialog_history"]
-            st.session_state.last_update_time = time.time()
-            
-            # 中間ステップのログを追加
-            state = add_to_dialog_history(
-                state, 
-                "summarizer", 
-                "要約を生成しています...",
-                progress=20
+        # 実行の確保やチェックポイントの読み込みで失敗した場合も、必ず ERROR と DONE を送る
+        with workflow_thread(graph, user_input, model, get_prompt_version()) as thread_id:
+            config = workflow_config(
+                client,
+                thread_id,
+                model=model,
+                stream_text=True,  # 生成中のテキストを逐次表示する
+                should_stop=channel.stop_requested
             )
-            st.session_state.state = state
-            st.session_state.dialog_history = state["dialog_history"]
-            st.session_state.progress = 20
-            st.session_state.last_update_time = time.time()
-            
-            # さらに中間ステップ
-            state = add_to_dialog_history(
-                state, 
-                "summarizer", 
-                "テキストを分析中...",
-                progress=30
-            )
-            st.session_state.state = state
-            st.session_state.dialog_history = state["dialog_history"]
-            st.session_state.progress = 30
-            st.session_state.last_update_time = time.time()
-            
-            # 要約生成
-            if state["revision_count"] == 1:
-                state = add_to_dialog_history(
-                    state, 
-                    "summarizer", 
-                    "初回の要約を作成中...",
-                    progress=40
-                )
-                
-                st.session_state.progress = 40
-                st.session_state.state = state
-                st.session_state.dialog_history = state["dialog_history"]
-                st.session_state.last_update_time = time.time()
-                
-                summary = agent.call(state["input_text"])
+            channel.node("", "ワークフローを初期化中...", progress=5)
+            
+            state = workflow_input(graph, user_input, config)
+            if state is None:
+                # 中断した実行の対話履歴を表示してから、最後に完了したノードの続きを実行する
+                state = graph.get_state(config).values
+                for entry in state["dialog_history"]:
+                    channel.message(entry)
+                state = add_to_dialog_history(state, "system", "前回中断した処理を、最後に完了したステップの続きから再開します。")
+                channel.message(state["dialog_history"][-1])
+                graph_input = None
             else:
-                state = add_to_dialog_history(
-                    state, 
-                    "summarizer", 
-                    "フィードバックを基に要約を改善中...",
-                    progress=40
-                )
-                
-                st.session_state.progress = 40
-                st.session_state.state = state
-                st.session_state.dialog_history = state["dialog_history"]
-                st.session_state.last_update_time = time.time()
-                
-                summary = agent.refine(state["input_text"], state["feedback"])
-            
-            # 状態更新
-            state["summary"] = summary
-            
-            # 対話履歴に追加
-            state = add_to_dialog_history(
-                state, 
-                "summarizer", 
-                f"【要約 第{state['revision_count']}版】\n{summary}",
-                progress=60
-            )
-            
-            st.session_state.progress = 60
-            st.session_state.state = state
-            st.session_state.dialog_history = state["dialog_history"]
-            st.session_state.last_update_time = time.time()
-            
-            # 次のステップへ
-            st.session_state.step = "review"
-            
-        # レビューステップ
-        elif st.session_state.step == "review":
-            st.session_state.current_node = "review"
-            st.session_state.current_description = get_node_description("review")
-            st.session_state.progress = 65
-            st.session_state.last_update_time = time.time()
-            
-            state = st.session_state.state
-            client = get_client()
-            agent = ReviewerAgent(client)
-            
-            # 対話履歴に追加
-            state = add_to_dialog_history(
-                state, 
-                "system", 
-                "批評エージェントが要約レビューを実施",
-                progress=65
-            )
-            
-            st.session_state.state = state
-            st.session_state.dialog_history = state["dialog_history"]
-            st.session_state.last_update_time = time.time()
-            
-            # 中間ステップのログ
-            state = add_to_dialog_history(
-                state, 
-                "reviewer", 
-                "レビューを実施しています...",
-                progress=70
-            )
-            
-            st.session_state.progress = 70
-            st.session_state.state = state
-            st.session_state.dialog_history = state["dialog_history"]
-            st.session_state.last_update_time = time.time()
-            
-            # 評価中メッセージ
-            state = add_to_dialog_history(
-                state, 
-                "reviewer", 
-                "要約の品質を評価中...",
-                progress=75
-            )
-            
-            st.session_state.progress = 75
-            st.session_state.state = state
-            st.session_state.dialog_history = state["dialog_history"]
-            st.session_state.last_update_time = time.time()
-            
-            # レビュー実行
-            is_final_review = (state["revision_count"] >= 3)
-            
-            feedback = agent.call(
-                current_summary=state["summary"],
-                previous_summary=state.get("previous_summary", ""),
-                previous_feedback=state.get("previous_feedback", ""),
-                is_final_review=is_final_review
-            )
-            
-            # 状態更新
-            state["feedback"] = feedback
-            state["previous_summary"] = state["summary"]
-            state["previous_feedback"] = feedback
-            
-            # 対話履歴に追加
-            state = add_to_dialog_history(
-                state,
-                "reviewer",
-                f"【フィードバック】\n{feedback}",
-                progress=80
-            )
-            
-            st.session_state.progress = 80
-            st.session_state.state = state
-            st.session_state.dialog_history = state["dialog_history"]
-            st.session_state.last_update_time = time.time()
-            
-            # 承認判定
-            is_approved = agent.check_approval(feedback, state["revision_count"])
-            state["approved"] = is_approved
-            
-            # 判定結果をログ
-            judge_msg = "承認" if is_approved else "改訂が必要"
-            state = add_to_dialog_history(
-                state,
-                "reviewer",
-                f"【判定】{judge_msg}",
-                progress=85
-            )
-            
-            st.session_state.progress = 85
-            st.session_state.state = state
-            st.session_state.dialog_history = state["dialog_history"]
-            st.session_state.last_update_time = time.time()
-            
-            # 次のステップを判断
-            if is_approved or state["revision_count"] >= 3:
-                st.session_state.step = "title"
-            else:
-                st.session_state.step = "summarize"
-            
-        # タイトル生成ステップ
-        elif st.session_state.step == "title":
-            st.session_state.current_node = "title_node"
-            st.session_state.current_description = get_node_description("title_node")
-            st.session_state.progress = 87
-            st.session_state.last_update_time = time.time()
-            
-            state = st.session_state.state
-            client = get_client()
-            agent = TitleCopywriterAgent(client)
-            
-            # 対話履歴に追加
-            state = add_to_dialog_history(
-                state, 
-                "system", 
-                "タイトル命名エージェントがタイトルを生成します",
-                progress=87
-            )
-            
-            st.session_state.state = state
-            st.session_state.dialog_history = state["dialog_history"]
-            st.session_state.last_update_time = time.time()
-            
-            # 中間ステップのログ
-            state = add_to_dialog_history(
-                state, 
-                "title", 
-                "タイトルを生成しています...",
-                progress=90
-            )
-            
-            st.session_state.progress = 90
-            st.session_state.state = state
-            st.session_state.dialog_history = state["dialog_history"]
-            st.session_state.last_update_time = time.time()
-            
-            # 検討中メッセージ
-            state = add_to_dialog_history(
-                state, 
-                "title", 
-                "要約内容からタイトルを検討中...",
-                progress=93
-            )
-            
-            st.session_state.progress = 93
-            st.session_state.state = state
-            st.session_state.dialog_history = state["dialog_history"]
-            st.session_state.last_update_time = time.time()
-            
-            # タイトル生成
-            output = agent.call(state["input_text"], state.get("transcript", []), state["summary"])
-            
-            # 状態更新
-            state["title"] = output.get("title", "")
-            state["final_summary"] = output.get("summary", "")
-            
-            # 対話履歴に追加
-            state = add_to_dialog_history(
-                state,
-                "title",
-                f"【生成タイトル】『{state['title']}』",
-                progress=96
-            )
-            
-            st.session_state.progress = 96
-            st.session_state.state = state
-            st.session_state.dialog_history = state["dialog_history"]
-            st.session_state.last_update_time = time.time()
-            
-            # 完了メッセージ
-            state = add_to_dialog_history(
-                state, 
-                "system", 
-                "すべての処理が完了しました。",
-                progress=100
-            )
-            
-            st.session_state.progress = 100
-            st.session_state.current_node = "END"
-            st.session_state.state = state
-            st.session_state.dialog_history = state["dialog_history"]
-            st.session_state.last_update_time = time.time()
-            
-            # 完了
-            st.session_state.step = "done"
-            
+                state = add_to_dialog_history(state, "system", "新しいテキストが入力されました。ワークフローを開始します。", progress=5)
+                channel.message(state["dialog_history"][-1])
+                graph_input = state
+            
+            for mode, chunk in graph.stream(graph_input, config=config, stream_mode=["custom", "updates"]):
+                if mode == "custom":
+                    channel.push(**chunk)
+                else:
+                    for node_state in chunk.values():
+                        # 並列ノード（部分要約）は状態の一部だけを返すため、状態全体の更新だけを反映する
+                        if node_state and "dialog_history" in node_state:
+                            state = node_state
+                            channel.state(state)
+                if channel.stop_requested():
+                    break
+            
+            if channel.stop_requested():
+                state = add_to_dialog_history(state, "system", "ユーザーの要求により処理を停止しました。")
+                channel.message(state["dialog_history"][-1])
+            elif RESULT_CACHE_ENABLED and not state.get("error"):
+                # 同じ入力の再実行時に即座に返せるよう結果を保存
+                get_result_cache().set(state["input_text"], model, get_prompt_version(), state)
     except Exception as e:
-        st.session_state.error = str(e)
-        st.session_state.step = "done"  # エラー時も処理を終了
+        channel.push(events.ERROR, text=str(e))
+    finally:
+        if state is not None:
+            channel.state(state)
+        channel.push(events.DONE)
+
+def start_processing(user_input):
+    """
+    プロセス共有のスケジューラーに処理を投入
     
-    # 処理完了フラグを設定
-    st.session_state.processing_done = True
+    ワーカーが空いていなければ待ち行列に入り、順番が来たらワーカースレッドで実行される。
+    
+    Returns:
+        bool: 投入できたかどうか（待ち行列が上限に達している場合はFalse）
+    """
+    ticket = st.session_state.run_ticket
+    if ticket is not None and ticket.status in (QUEUED, RUNNING):
+        return True
+    
+    channel = EventChannel()
+    try:
+        # ユーザーごとに順番に実行する（1人が連続して投入しても他のユーザーを待たせ続けない）
+        ticket = get_scheduler().submit(
+            st.session_state.get("username", "anonymous"),
+            process_workflow_thread,
+            channel, user_input, get_client(), get_selected_model()
+        )
+    except SchedulerFullError as e:
+        st.session_state.error = f"{str(e)} しばらく待ってから再度実行してください。"
+        return False
+    
+    st.session_state.run_ticket = ticket
+    st.session_state.run_channel = channel
+    st.session_state.state = {}
+    st.session_state.dialog_history.clear()
+    st.session_state.processing_done = False
+    return True
 
-def start_processing():
-    """バックグラウンドスレッドで処理を開始"""
-    if st.session_state.process_thread is None or not st.session_state.process_thread.is_alive():
-        st.session_state.processing_done = False
-        st.session_state.process_thread = threading.Thread(target=process_step_thread)
-        st.session_state.process_thread.daemon = True
-        st.session_state.process_thread.start()
+def stop_processing():
+    """処理の停止を要求（実行待ちの場合は待ち行列から取り除いて終了する）"""
+    channel = st.session_state.run_channel
+    ticket = st.session_state.run_ticket
+    if ticket is not None and ticket.cancel():
+        state = add_to_dialog_history({}, "system", "ユーザーの要求により実行待ちを取り消しました。")
+        channel.message(state["dialog_history"][-1])
+        channel.push(events.DONE)
+    else:
+        channel.request_stop()
+
+def apply_progress_events(progress_events):
+    """実行スレッドから届いたイベントをまとめて session_state に反映"""
+    dialog_history = st.session_state.dialog_history
+    for event in progress_events:
+        if event.progress is not None:
+            st.session_state.progress = event.progress
+        
+        if event.kind == events.NODE:
+            st.session_state.current_node = event.node
+            st.session_state.current_description = event.description or get_node_description(event.node)
+        elif event.kind == events.MESSAGE:
+            # 同じIDのメッセージ（ストリーミングの確定など）は置き換える
+            dialog_history.upsert(event.message)
+        elif event.kind == events.DELTA:
+            dialog_history.append_text(event.message_id, event.text)
+        elif event.kind == events.STATE:
+            st.session_state.state = dict(event.data)
+        elif event.kind == events.ERROR:
+            st.session_state.error = event.text
+        elif event.kind == events.DONE:
+            st.session_state.state["dialog_history"] = dialog_history.messages()
+            st.session_state.step = "done"
+            st.session_state.processing_done = True
+
+def render_progress_area(is_processing, header_slot, history_slot):
+    """
+    進捗表示と対話履歴を描画
+    
+    処理中は UI_REFRESH_INTERVAL ごとにこの部分だけを再実行し（ページ全体は再実行しない）、
+    ワークフローのノードが進んだときや処理が終わったときだけページ全体を再実行する。
+    進捗表示と対話履歴はフラグメントの外のプレースホルダー（header_slot, history_slot）に書き込む。
+    フラグメント内の要素は再実行のたびに描き直さないと消えるが、外のプレースホルダーの内容は残るため、
+    前回の描画からイベントも表示状態も変わっていなければ書き込みを省略する。
+    """
+    # 前回の描画以降に届いたイベントをまとめて反映
+    channel = st.session_state.get("run_channel")
+    progress_events = channel.drain() if channel is not None else []
+    apply_progress_events(progress_events)
+    
+    # ノードが進んだ、または処理が終わった場合はワークフロー図・ボタン・最終結果も更新する
+    if is_processing and (st.session_state.processing_done or st.session_state.current_node != st.session_state.rendered_node):
+        st.rerun()
+    
+    # 実行待ちの間は待ち順を表示する
+    ticket = st.session_state.run_ticket
+    position = ticket.position() if ticket is not None and ticket.status == QUEUED else 0
+    
+    # 折りたたみのトグルはウィジェットのため、フラグメント内に毎回描画する（外のプレースホルダーには置けない）
+    dialog_history = st.session_state.dialog_history
+    show_older = display_older_toggle(dialog_history.messages(), spilled=dialog_history.spilled) if dialog_history else False
+    
+    view = (st.session_state.step, position, show_older)
+    if not progress_events and view == st.session_state.rendered_view:
+        return
+    st.session_state.rendered_view = view
+    
+    with header_slot.container():
+        if st.session_state.step != "idle":
+            # プログレスバー
+            st.progress(st.session_state.progress / 100)
+            
+            # 処理中表示（実行待ちの間は待ち順を表示）
+            if st.session_state.step != "done" and position:
+                st.markdown(f"""
+                <div class="processing-indicator">
+                    <div class="processing-icon">⏳</div>
+                    <div>
+                        <strong>待機中...</strong> 実行の順番を待っています
+                        <div class="latest-action">待ち順: {position}番目</div>
+                    </div>
+                </div>
+                """, unsafe_allow_html=True)
+            elif st.session_state.step != "done":
+                st.markdown(f"""
+                <div class="processing-indicator">
+                    <div class="processing-icon">⚙️</div>
+                    <div>
+                        <strong>処理中...</strong> ワークフローを実行しています
+                        <div class="latest-action">{st.session_state.current_description}</div>
+                    </div>
+                </div>
+                """, unsafe_allow_html=True)
+        
+        if dialog_history:
+            display_dialog_progress(dialog_history.messages())
+    
+    # 対話履歴の表示
+    with history_slot.container():
+        if dialog_history:
+            display_dialog_messages(dialog_history.messages(), show_older, spilled=dialog_history.spilled, load_spilled=dialog_history.load_spilled)
+        else:
+            st.info("対話履歴はまだありません。ワークフローを実行すると、ここに対話の流れが表示されます。")
 
 @auth_required
 def render_main_ui():
@@ -418,19 +316,18 @@ def render_main_ui():
     current_state = {
         "revision_count": st.session_state.state.get("revision_count", 0),
         "approved": st.session_state.state.get("approved", False),
-        "dialog_history": st.session_state.dialog_history
+        "dialog_history": st.session_state.dialog_history.messages()
     }
     
     render_workflow_visualization(current_state, st.session_state.current_node)
+    st.session_state.rendered_node = st.session_state.current_node
+    # ページ全体の再実行ではプレースホルダーが作り直されるため、進捗表示と対話履歴も描き直す
+    st.session_state.rendered_view = None
     
     st.markdown('<div class="card">', unsafe_allow_html=True)
     
-    # サンプルテキストの定義
-    example_texts = [
-        "例文を選択してください...",
-        "人工知能（AI）は、機械学習、深層学習、自然言語処理などの技術を通じて、人間のような知能を模倣するコンピュータシステムです。近年のAI技術の急速な進歩により、自動運転車、医療診断、翻訳サービスなど、様々な分野で革新的なアプリケーションが開発されています。",
-        "宇宙探査は人類の好奇心と技術の集大成です。太陽系の惑星や衛星への無人探査機の送付から、国際宇宙ステーションでの有人ミッション、さらには将来の火星有人探査計画まで、私たちは宇宙への理解を深め続けています。"
-    ]
+    # サンプルテキスト（起動時に結果を事前生成する例文と共通）
+    example_texts = EXAMPLE_TEXTS
     
     col1, col2 = st.columns([3, 1])
     with col1:
@@ -460,50 +357,43 @@ def render_main_ui():
         disabled=is_processing
     )
     
+    # 停止ボタン（処理中のみ表示）。生成中のテキストもその時点で打ち切る
+    if is_processing:
+        if st.button("停止", key="stop_button", use_container_width=True):
+            stop_processing()
+    
     # エージェント対話履歴セクション
     st.subheader("エージェント対話履歴")
     
-    # 進捗状況表示用コンテナ
-    progress_status_container = st.container()
-    dialog_container = st.container()
+    # 進捗状況・対話履歴の表示用コンテナ（フラグメントは折りたたみのトグルだけを直接描画する）
+    progress_container = st.container()
+    with progress_container:
+        header_slot = st.empty()
+        toggle_container = st.container()
+        history_slot = st.empty()
     
     # 実行ボタンが押された場合の処理
     if run_button:
+        cached = None
+        if user_input and RESULT_CACHE_ENABLED:
+            cached = get_result_cache().get(user_input, get_selected_model(), get_prompt_version())
+        
         if not user_input:
             st.error("文章が入力されていません。")
+        elif cached is not None:
+            # 処理済みのテキストはワークフローを実行せずに結果を表示
+            st.session_state.error = None
+            show_cached_result(user_input, cached)
         else:
-            # 実行開始
-            st.session_state.step = "init"
+            # 実行開始（待ち行列が上限に達している場合は受け付けない）
             st.session_state.error = None
-            st.session_state.processing_done = False
-            
-            # バックグラウンド処理を開始
-            start_processing()
-    
-    # 処理中・完了後の表示
-    with progress_status_container:
-        if st.session_state.step != "idle":
-            # プログレスバー
-            st.progress(st.session_state.progress / 100)
-            
-            # 処理中表示
-            if st.session_state.step != "done":
-                st.markdown(f"""
-                <div class="processing-indicator">
-                    <div class="processing-icon">⚙️</div>
-                    <div>
-                        <strong>処理中...</strong> ワークフローを実行しています
-                        <div class="latest-action">{st.session_state.current_description}</div>
-                    </div>
-                </div>
-                """, unsafe_allow_html=True)
+            if start_processing(user_input):
+                st.session_state.step = "running"
     
-    # 対話履歴の表示
-    with dialog_container:
-        if st.session_state.dialog_history:
-            display_dialog_history(st.session_state.dialog_history)
-        else:
-            st.info("対話履歴はまだありません。ワークフローを実行すると、ここに対話の流れが表示されます。")
+    # 処理中・完了後の表示（処理中は一定間隔でこの部分だけを更新）
+    is_processing = st.session_state.step not in ["idle", "done"]
+    with toggle_container:
+        st.fragment(render_progress_area, run_every=UI_REFRESH_INTERVAL if is_processing else None)(is_processing, header_slot, history_slot)
     
     # 最終結果の表示（処理完了後）
     if st.session_state.step == "done" and 'result_placeholder' in st.session_state:
@@ -529,13 +419,6 @@ def render_main_ui():
     
     if st.session_state.error:
         st.error(f"エラーが発生しました: {st.session_state.error}")
-    
-    # 処理中の場合は定期的に更新
-    if is_processing and not st.session_state.processing_done:
-        # 最後の更新から0.5秒以上経過していたら自動更新
-        if time.time() - st.session_state.last_update_time > 0.5:
-            time.sleep(0.5)  # 少し待機して状態の更新を待つ
-            st.rerun()
 
 
 if __name__ == "__main__":
@@ -58,6 +58,7 @@ def check_password():
         # 管理者アカウントとのチェック
         if username == admin_username and password == admin_password:
             st.session_state.authenticated = True
+            st.session_state.username = username
             st.rerun()
             return True
             
@@ -69,6 +70,7 @@ def check_password():
                     user, pwd = credential.strip().split(':')
                     if username == user and password == pwd:
                         st.session_state.authenticated = True
+                        st.session_state.username = username
                         st.rerun()
                         return True
         
@@ -0,0 +1,251 @@
+"""
+JSONL形式の入力をワークフローで一括処理するコマンドラインツール
+
+入力ファイルは1行1件のJSONで、"text"（または "input_text"）に要約対象のテキストを持つ。
+"id" があれば結果にそのまま引き継ぐ。結果は処理が完了した順に出力ファイルへ追記される。
+
+使い方:
+    python batch.py inputs.jsonl -o results.jsonl --workers 8
+    python batch.py inputs.jsonl -o results.jsonl --mode async --workers 64
+    python batch.py inputs.jsonl -o results.jsonl --resume      # 出力済みの行をスキップして再開
+    python batch.py inputs.jsonl -o results.jsonl --offset 1000  # 先頭1000行をスキップ
+"""
+import os
+import sys
+import json
+import math
+import time
+import asyncio
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, Iterator, Optional, Set, Tuple, List
+from dotenv import load_dotenv
+
+from config.settings import RESULT_CACHE_ENABLED
+from graph.runner import run_workflow, arun_workflow
+from graph.workflow import get_workflow_graph
+from utils.api_client import DeepseekAPI, create_client, get_available_models
+from utils.metrics import summarize_metrics
+from utils.result_cache import WorkflowResultCache, get_result_cache
+
+
+def read_inputs(path: str, offset: int = 0, skip: Optional[Set[int]] = None) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    入力JSONLを1件ずつ読み込む
+
+    Args:
+        path: 入力ファイルのパス
+        offset: 先頭から読み飛ばす行数
+        skip: 読み飛ばす行番号（0始まり）の集合
+
+    Yields:
+        Tuple[int, Dict[str, Any]]: (行番号, レコード)
+    """
+    skip = skip or set()
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f):
+            if line_no < offset or line_no in skip or not line.strip():
+                continue
+            record = json.loads(line)
+            if isinstance(record, str):
+                record = {"text": record}
+            yield line_no, record
+
+
+def load_completed_lines(output_path: str) -> Set[int]:
+    """既存の出力ファイルから処理済みの行番号を読み込む（再開用）"""
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                completed.add(json.loads(line)["line"])
+            except (json.JSONDecodeError, KeyError):
+                # 書き込み途中で中断された行は未処理として扱う
+                continue
+    return completed
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """ソート済みの値から百分位数を求める（最近傍法）"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(q / 100 * len(sorted_values))
+    return sorted_values[min(len(sorted_values), max(rank, 1)) - 1]
+
+
+class BatchReport:
+    """バッチ処理の結果を出力ファイルへ書き込み、スループットを集計するクラス"""
+
+    def __init__(self, output_path: str, append: bool = False):
+        """
+        初期化
+
+        Args:
+            output_path: 出力ファイルのパス
+            append: Trueの場合は既存の出力に追記する
+        """
+        self._file = open(output_path, "a" if append else "w", encoding="utf-8")
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.succeeded = 0
+        self.failed = 0
+        self.cached = 0
+        self.started_at = time.monotonic()
+
+    def record(self, line_no: int, record: Dict[str, Any], final_state: Optional[Dict[str, Any]],
+               elapsed: float, error: Optional[str] = None) -> None:
+        """1件分の結果を書き込む（完了順・スレッドセーフ）"""
+        final_state = final_state or {}
+        error = error or final_state.get("error") or None
+        result = {
+            "line": line_no,
+            "id": record.get("id", line_no),
+            "title": final_state.get("title", ""),
+            "final_summary": final_state.get("final_summary", ""),
+            "revision_count": final_state.get("revision_count", 0),
+            "approved": final_state.get("approved", False),
+            "from_cache": final_state.get("from_cache", False),
+            "elapsed_sec": round(elapsed, 3),
+            "usage": summarize_metrics(final_state.get("metrics")),
+            "error": error
+        }
+        with self._lock:
+            self._file.write(json.dumps(result, ensure_ascii=False) + "\n")
+            # 中断しても完了分が失われないよう1件ごとに書き出す
+            self._file.flush()
+            self.latencies.append(elapsed)
+            if error:
+                self.failed += 1
+            else:
+                self.succeeded += 1
+            if result["from_cache"]:
+                self.cached += 1
+
+    def close(self) -> None:
+        self._file.close()
+
+    def summary(self) -> Dict[str, Any]:
+        """スループットとレイテンシの集計結果を返す"""
+        wall = time.monotonic() - self.started_at
+        latencies = sorted(self.latencies)
+        processed = self.succeeded + self.failed
+        return {
+            "processed": processed,
+            "succeeded": self.succeeded,
+            "failed": self.failed,
+            "cached": self.cached,
+            "wall_sec": round(wall, 3),
+            "docs_per_sec": round(processed / wall, 3) if wall > 0 else 0.0,
+            "latency_p50_sec": round(percentile(latencies, 50), 3),
+            "latency_p95_sec": round(percentile(latencies, 95), 3),
+            "latency_max_sec": round(latencies[-1], 3) if latencies else 0.0
+        }
+
+
+def _input_text(record: Dict[str, Any]) -> str:
+    return record.get("text") or record.get("input_text") or ""
+
+
+def run_batch_threads(
+    inputs: Iterator[Tuple[int, Dict[str, Any]]],
+    report: BatchReport,
+    client: DeepseekAPI,
+    workers: int,
+    result_cache: Optional[WorkflowResultCache] = None
+) -> None:
+    """
+    スレッドプールで入力を並列処理
+
+    未完了のタスク数を workers の2倍までに制限し、大きな入力でも全件をメモリに載せない。
+    """
+    graph = get_workflow_graph()
+
+    def _process(line_no, record):
+        started = time.monotonic()
+        try:
+            final_state = run_workflow(_input_text(record), client, result_cache, graph=graph)
+            report.record(line_no, record, final_state, time.monotonic() - started)
+        except Exception as e:
+            report.record(line_no, record, None, time.monotonic() - started, error=str(e))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for line_no, record in inputs:
+            if len(pending) >= workers * 2:
+                _, pending = wait(pending, return_when=FIRST_COMPLETED)
+            pending.add(executor.submit(_process, line_no, record))
+        wait(pending)
+
+
+async def run_batch_async(
+    inputs: Iterator[Tuple[int, Dict[str, Any]]],
+    report: BatchReport,
+    client: DeepseekAPI,
+    workers: int,
+    result_cache: Optional[WorkflowResultCache] = None
+) -> None:
+    """
+    1つのイベントループ上で workers 個のコルーチンが入力を順に取り出して処理
+    """
+    graph = get_workflow_graph()
+
+    async def _worker():
+        # イテレーターの取り出しは await を挟まないため、コルーチン間で競合しない
+        for line_no, record in inputs:
+            started = time.monotonic()
+            try:
+                final_state = await arun_workflow(_input_text(record), client, result_cache, graph=graph)
+                report.record(line_no, record, final_state, time.monotonic() - started)
+            except Exception as e:
+                report.record(line_no, record, None, time.monotonic() - started, error=str(e))
+
+    await asyncio.gather(*(_worker() for _ in range(workers)))
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="JSONL形式の入力を要約ワークフローで一括処理します。")
+    parser.add_argument("input", help="入力JSONLファイル")
+    parser.add_argument("-o", "--output", required=True, help="結果を書き込むJSONLファイル")
+    parser.add_argument("--workers", type=int, default=8, help="同時に処理する件数（既定: 8）")
+    parser.add_argument("--mode", choices=["thread", "async"], default="thread",
+                        help="ワーカープールの種類（既定: thread）")
+    parser.add_argument("--offset", type=int, default=0, help="入力の先頭から読み飛ばす行数")
+    parser.add_argument("--resume", action="store_true",
+                        help="出力ファイルに記録済みの行をスキップし、出力に追記する")
+    parser.add_argument("--model", choices=list(get_available_models().keys()), default=None,
+                        help="使用するモデル")
+    parser.add_argument("--no-cache", action="store_true", help="ワークフロー結果のキャッシュを使用しない")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    load_dotenv()
+    args = parse_args(argv)
+
+    client = create_client(args.model)
+    result_cache = get_result_cache() if RESULT_CACHE_ENABLED and not args.no_cache else None
+
+    skip = load_completed_lines(args.output) if args.resume else set()
+    inputs = read_inputs(args.input, offset=args.offset, skip=skip)
+    report = BatchReport(args.output, append=args.resume)
+
+    try:
+        if args.mode == "async":
+            asyncio.run(run_batch_async(inputs, report, client, args.workers, result_cache))
+        else:
+            run_batch_threads(inputs, report, client, args.workers, result_cache)
+    finally:
+        report.close()
+        summary = report.summary()
+        if skip:
+            summary["skipped_completed"] = len(skip)
+        print(json.dumps(summary, ensure_ascii=False, indent=2), file=sys.stderr)
+
+    return 0 if report.failed == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+"""
+エンジン（agents, graph, utils.api_client）と Streamlit の import 時間を比較する
+
+それぞれ新しいインタープリターで import し、所要時間の中央値を表示する。
+エンジンの import で Streamlit が読み込まれた場合、またはエンジンの import 時間が
+Streamlit の --max-ratio 倍を超えた場合は終了コード1を返す。
+
+使い方:
+    python -m benchmarks.import_time --repeat 5
+"""
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+ENGINE_IMPORT = "import agents, graph, graph.runner, utils.api_client"
+STREAMLIT_IMPORT = "import streamlit"
+
+_PROBE = (
+    "import sys, time\n"
+    "started = time.perf_counter()\n"
+    "{statement}\n"
+    "elapsed = time.perf_counter() - started\n"
+    "print(elapsed, 'streamlit' in sys.modules)\n"
+)
+
+
+def measure(statement: str, repeat: int) -> dict:
+    """statement を新しいプロセスで repeat 回 import し、所要時間を計測"""
+    timings = []
+    loaded_streamlit = False
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", _PROBE.format(statement=statement)],
+            check=True, capture_output=True, text=True
+        ).stdout.split()
+        timings.append(float(output[0]))
+        loaded_streamlit = loaded_streamlit or output[1] == "True"
+    return {
+        "median_sec": round(statistics.median(timings), 4),
+        "min_sec": round(min(timings), 4),
+        "loads_streamlit": loaded_streamlit
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="エンジンと Streamlit の import 時間を比較します。")
+    parser.add_argument("--repeat", type=int, default=5, help="計測回数（既定: 5）")
+    parser.add_argument("--max-ratio", type=float, default=0.5,
+                        help="エンジン/Streamlit の import 時間比の上限（既定: 0.5）")
+    args = parser.parse_args(argv)
+
+    engine = measure(ENGINE_IMPORT, args.repeat)
+    streamlit = measure(STREAMLIT_IMPORT, args.repeat)
+    ratio = engine["median_sec"] / streamlit["median_sec"] if streamlit["median_sec"] else 0.0
+    print(json.dumps({"engine": engine, "streamlit": streamlit, "ratio": round(ratio, 3)}, indent=2))
+
+    if engine["loads_streamlit"]:
+        print("エンジンの import で streamlit が読み込まれています。", file=sys.stderr)
+        return 1
+    if ratio > args.max_ratio:
+        print(f"エンジンの import 時間が Streamlit の {args.max_ratio} 倍を超えています。", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
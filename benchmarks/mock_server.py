@@ -0,0 +1,439 @@
+"""
+Deepseek（OpenAI互換）の /chat/completions を模擬するローカルサーバー
+
+実際のAPIを呼ばずにパイプライン自体のオーバーヘッドや並列時の挙動を計測するためのもの。
+リクエストの内容からエージェントの種類（要約・批評・承認判定・タイトル）を判別し、
+それぞれの出力形式に沿った応答を返す。
+
+- 応答時間の分布（fixed / uniform / normal / lognormal / pareto）
+- ストリーミング（SSE）と JSON モード
+- エラーの注入（429 は Retry-After 付き）
+- 批評の判定（approve_after 回目の要約で承認）
+- usage（プレフィックスキャッシュのヒット数を含む）
+
+使い方:
+    python -m benchmarks.mock_server --port 8901 --latency lognormal:0.8,0.5 --error-rate 0.02
+    API_ENDPOINT=http://127.0.0.1:8901/chat/completions DEEPSEEK_API_KEY=mock streamlit run app.py
+"""
+import re
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Any, List, Callable, Optional, Tuple
+
+# 模擬出力に埋め込む改訂回数の目印（要約は 〔r1〕、批評は 〔f1〕 のように付与する）
+_SUMMARY_MARK = re.compile(r"〔r(\d+)〕")
+_FEEDBACK_MARK = re.compile(r"〔f(\d+)〕")
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    応答時間の分布指定を、乱数生成器から秒数を返す関数に変換
+
+    指定形式:
+        fixed:S             常に S 秒
+        uniform:A,B         A〜B 秒の一様分布
+        normal:MU,SIGMA     正規分布（負の値は0）
+        lognormal:MEDIAN,SIGMA  中央値 MEDIAN 秒の対数正規分布（裾の重い遅延）
+        pareto:SCALE,ALPHA  最小 SCALE 秒のパレート分布（まれに非常に遅い応答）
+
+    Raises:
+        ValueError: 指定形式が不正な場合
+    """
+    name, _, args = spec.partition(":")
+    try:
+        params = [float(value) for value in args.split(",")] if args else []
+    except ValueError:
+        raise ValueError(f"応答時間の指定が不正です: {spec}")
+
+    if name == "fixed" and len(params) == 1:
+        return lambda rng: params[0]
+    if name == "uniform" and len(params) == 2:
+        return lambda rng: rng.uniform(params[0], params[1])
+    if name == "normal" and len(params) == 2:
+        return lambda rng: max(0.0, rng.gauss(params[0], params[1]))
+    if name == "lognormal" and len(params) == 2:
+        mu = math.log(params[0]) if params[0] > 0 else 0.0
+        return lambda rng: rng.lognormvariate(mu, params[1]) if params[0] > 0 else 0.0
+    if name == "pareto" and len(params) == 2:
+        return lambda rng: params[0] * rng.paretovariate(params[1])
+    raise ValueError(f"応答時間の指定が不正です: {spec}")
+
+
+class MockBehavior:
+    """模擬サーバーの応答の振る舞い"""
+
+    def __init__(
+        self,
+        latency: str = "fixed:0",
+        ttfb_ratio: float = 0.2,
+        error_rate: float = 0.0,
+        error_statuses: Tuple[int, ...] = (500, 503, 429),
+        retry_after: float = 1.0,
+        approve_after: int = 2,
+        chunk_chars: int = 8,
+        seed: Optional[int] = None
+    ):
+        """
+        初期化
+
+        Args:
+            latency: 1リクエストあたりの応答時間の分布（parse_latency の形式）
+            ttfb_ratio: ストリーミング時、応答時間のうち最初の差分を返すまでの割合
+            error_rate: エラーを返す確率
+            error_statuses: 注入するエラーのステータスコード（この中から一様に選ぶ）
+            retry_after: 429 に付与する Retry-After（秒）
+            approve_after: この回数目以降の要約を承認する
+            chunk_chars: ストリーミングの1差分あたりの文字数
+            seed: 乱数のシード（再現性が必要な場合）
+        """
+        self.latency_spec = latency
+        self.latency = parse_latency(latency)
+        self.ttfb_ratio = ttfb_ratio
+        self.error_rate = error_rate
+        self.error_statuses = tuple(error_statuses)
+        self.retry_after = retry_after
+        self.approve_after = approve_after
+        self.chunk_chars = chunk_chars
+        self.rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+
+    def sample(self) -> Tuple[float, Optional[int]]:
+        """1リクエスト分の応答時間と、注入するエラー（ない場合はNone）を決める"""
+        with self._rng_lock:
+            latency = self.latency(self.rng)
+            error = None
+            if self.error_statuses and self.rng.random() < self.error_rate:
+                error = self.rng.choice(self.error_statuses)
+        return latency, error
+
+
+class PrefixCache:
+    """
+    Deepseek のコンテキストキャッシュを模擬する
+
+    プロンプト（メッセージを連結した文字列）の先頭から unit 文字単位の接頭辞を記録し、
+    過去のリクエストと一致する最長の接頭辞をキャッシュヒットとして数える。
+    トークン数は1文字1トークンとして扱う。
+    """
+
+    def __init__(self, unit: int = 64, max_entries: int = 100000):
+        self.unit = unit
+        self.max_entries = max_entries
+        self._prefixes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup_and_store(self, prompt: str) -> int:
+        """一致した接頭辞の長さ（キャッシュヒットのトークン数）を返し、今回の接頭辞を記録"""
+        units = len(prompt) // self.unit
+        keys = [hash(prompt[:k * self.unit]) for k in range(1, units + 1)]
+        with self._lock:
+            hit = 0
+            for k in range(units, 0, -1):
+                if keys[k - 1] in self._prefixes:
+                    hit = k * self.unit
+                    break
+            for key in keys:
+                self._prefixes[key] = True
+                self._prefixes.move_to_end(key)
+            while len(self._prefixes) > self.max_entries:
+                self._prefixes.popitem(last=False)
+        return hit
+
+
+def classify_request(messages: List[Dict[str, str]], json_mode: bool) -> str:
+    """
+    メッセージからエージェントの種類を判別
+
+    Returns:
+        str: "review"（批評）, "approval"（承認判定）, "title"（タイトル）, "summary"（要約）のいずれか
+    """
+    # 役割ごとの指示は共通のシステムプロンプトの後（ユーザーメッセージの【依頼】）にも置かれるため、全メッセージを見る
+    text = " ".join(m.get("content") or "" for m in messages)
+    if json_mode and '"title"' in text:
+        return "title"
+    # 要約の改善依頼にも「批評家」が含まれるため、役割の宣言で判別する
+    if "あなたは批評家" in text:
+        return "review"
+    if "'needs_revision'" in text:
+        return "approval"
+    return "summary"
+
+
+def _max_mark(pattern: re.Pattern, messages: List[Dict[str, str]]) -> int:
+    found = [int(n) for m in messages for n in pattern.findall(m.get("content") or "")]
+    return max(found) if found else 0
+
+
+def build_content(kind: str, messages: List[Dict[str, str]], behavior: MockBehavior) -> str:
+    """エージェントの種類に応じた模擬出力を作成"""
+    if kind == "summary":
+        # 改善依頼（フィードバック付き）の場合は、その批評の回数+1 版の要約になる
+        revision = _max_mark(_FEEDBACK_MARK, messages) + 1
+        # 改訂では最初の文だけが変わる（全体を書き直さない）
+        return (
+            f"これは模擬サーバーが生成した第{revision}版の要約です。"
+            + "入力文章の主題と要点を簡潔にまとめています。" * 3
+            + f"〔r{revision}〕"
+        )
+    if kind == "review":
+        revision = _max_mark(_SUMMARY_MARK, messages)
+        approved = revision >= behavior.approve_after
+        feedback = (
+            "要点は押さえられており、十分な品質です。" if approved
+            else "主題の説明が不足しています。具体例を減らし、結論を明確にしてください。"
+        ) + f"〔f{revision}〕"
+        review = {
+            "feedback": feedback,
+            "verdict": "approved" if approved else "needs_revision",
+            "score": 8 if approved else 5,
+            "issues": [] if approved else ["主題の説明が不足している", "結論が不明確"]
+        }
+        # 非構造化レビュー（JSONモードなし）の場合も本文は批評として解釈される
+        return json.dumps(review, ensure_ascii=False)
+    if kind == "approval":
+        revision = _max_mark(_FEEDBACK_MARK, messages)
+        return "approved" if revision >= behavior.approve_after else "needs_revision"
+    return json.dumps({"title": "模擬タイトル：要約の試み"}, ensure_ascii=False)
+
+
+class MockDeepseekServer:
+    """模擬サーバー本体（バックグラウンドスレッドで起動する）"""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        behavior: Optional[MockBehavior] = None,
+        record_requests: bool = False
+    ):
+        """
+        初期化
+
+        Args:
+            host: 待ち受けるホスト
+            port: 待ち受けるポート（0の場合は空いているポートを使用）
+            behavior: 応答の振る舞い（省略時は遅延なし・エラーなし）
+            record_requests: 受け取ったメッセージと応答を request_log に記録するかどうか（プロンプトの検査用）
+        """
+        self.behavior = behavior or MockBehavior()
+        self.prefix_cache = PrefixCache()
+        self.record_requests = record_requests
+        self.request_log: List[Dict[str, Any]] = []
+        self._stats = {"requests": 0, "errors": 0, "streams": 0}
+        self._stats_lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def endpoint(self) -> str:
+        """クライアントに指定するエンドポイントURL"""
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}/chat/completions"
+
+    def start(self) -> "MockDeepseekServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        """現在のスレッドで待ち受ける（Ctrl+C で終了）"""
+        try:
+            self._httpd.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self._httpd.server_close()
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "MockDeepseekServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def count(self, key: str) -> None:
+        with self._stats_lock:
+            self._stats[key] = self._stats.get(key, 0) + 1
+
+    def stats(self) -> Dict[str, int]:
+        """処理したリクエスト数（種類別）、注入したエラー数などを返す"""
+        with self._stats_lock:
+            return dict(self._stats)
+
+    def _make_handler(self):
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # ヘッダーと本文を別々に書き込むため、Nagle アルゴリズムによる遅延（約40ms）を避ける
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send_json(self, status: int, body: Dict[str, Any], headers: Optional[Dict[str, str]] = None):
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_HEAD(self):
+                # クライアントのコネクション事前確立用
+                self.send_response(200)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+
+            def do_GET(self):
+                if self.path.rstrip("/").endswith("/stats"):
+                    self._send_json(200, server.stats())
+                else:
+                    self._send_json(404, {"error": {"message": "not found"}})
+
+            def do_POST(self):
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "not found"}})
+                    return
+                length = int(self.headers.get("Content-Length", 0))
+                try:
+                    payload = json.loads(self.rfile.read(length))
+                    messages = payload["messages"]
+                except (ValueError, KeyError):
+                    self._send_json(400, {"error": {"message": "invalid request"}})
+                    return
+
+                behavior = server.behavior
+                server.count("requests")
+                latency, error = behavior.sample()
+                if error is not None:
+                    server.count("errors")
+                    time.sleep(latency * behavior.ttfb_ratio)
+                    headers = {"Retry-After": str(behavior.retry_after)} if error == 429 else None
+                    self._send_json(error, {"error": {"message": f"injected error {error}"}}, headers)
+                    return
+
+                json_mode = (payload.get("response_format") or {}).get("type") == "json_object"
+                kind = classify_request(messages, json_mode)
+                server.count(kind)
+                content = build_content(kind, messages, behavior)
+
+                prompt = "\n".join(f"{m.get('role')}:{m.get('content') or ''}" for m in messages)
+                cache_hit = server.prefix_cache.lookup_and_store(prompt)
+                usage = {
+                    "prompt_tokens": len(prompt),
+                    "completion_tokens": len(content),
+                    "total_tokens": len(prompt) + len(content),
+                    "prompt_cache_hit_tokens": cache_hit,
+                    "prompt_cache_miss_tokens": len(prompt) - cache_hit
+                }
+                if server.record_requests:
+                    with server._stats_lock:
+                        server.request_log.append({"kind": kind, "messages": messages, "content": content, "usage": usage})
+
+                if payload.get("stream"):
+                    server.count("streams")
+                    self._stream(content, usage, latency, payload.get("model", ""))
+                else:
+                    time.sleep(latency)
+                    self._send_json(200, {
+                        "id": "mock",
+                        "object": "chat.completion",
+                        "model": payload.get("model", ""),
+                        "choices": [{
+                            "index": 0,
+                            "message": {"role": "assistant", "content": content},
+                            "finish_reason": "stop"
+                        }],
+                        "usage": usage
+                    })
+
+            def _stream(self, content: str, usage: Dict[str, int], latency: float, model: str):
+                behavior = server.behavior
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                # 本文の長さが事前に分からないため、送信後に接続を閉じて終端を示す
+                self.send_header("Connection", "close")
+                self.end_headers()
+                self.close_connection = True
+
+                step = max(1, behavior.chunk_chars)
+                chunks = [content[i:i + step] for i in range(0, len(content), step)] or [""]
+                time.sleep(latency * behavior.ttfb_ratio)
+                interval = latency * (1 - behavior.ttfb_ratio) / len(chunks)
+                try:
+                    for i, chunk in enumerate(chunks):
+                        if i:
+                            time.sleep(interval)
+                        event = {"model": model, "choices": [{"index": 0, "delta": {"content": chunk}}]}
+                        self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+                        self.wfile.flush()
+                    final = {
+                        "model": model,
+                        "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                        "usage": usage
+                    }
+                    self.wfile.write(f"data: {json.dumps(final)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+                except (BrokenPipeError, ConnectionResetError):
+                    # クライアントが途中で切断した（生成の打ち切り）
+                    server.count("cancelled")
+
+        return _Handler
+
+
+def parse_behavior_args(parser: argparse.ArgumentParser) -> None:
+    """MockBehavior の設定をコマンドライン引数に追加（ベンチマークと共通）"""
+    parser.add_argument("--latency", default="fixed:0",
+                        help="応答時間の分布（例: fixed:0.5, uniform:0.2,1, lognormal:0.8,0.5, pareto:0.3,2）")
+    parser.add_argument("--ttfb-ratio", type=float, default=0.2,
+                        help="ストリーミング時に最初の差分を返すまでの応答時間の割合（既定: 0.2）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="エラーを返す確率（既定: 0）")
+    parser.add_argument("--error-statuses", default="500,503,429",
+                        help="注入するエラーのステータスコード（カンマ区切り）")
+    parser.add_argument("--retry-after", type=float, default=1.0, help="429 に付与する Retry-After（秒）")
+    parser.add_argument("--approve-after", type=int, default=2, help="この回数目以降の要約を承認する（既定: 2）")
+    parser.add_argument("--seed", type=int, default=None, help="乱数のシード")
+
+
+def behavior_from_args(args: argparse.Namespace) -> MockBehavior:
+    return MockBehavior(
+        latency=args.latency,
+        ttfb_ratio=args.ttfb_ratio,
+        error_rate=args.error_rate,
+        error_statuses=tuple(int(s) for s in args.error_statuses.split(",") if s),
+        retry_after=args.retry_after,
+        approve_after=args.approve_after,
+        seed=args.seed
+    )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Deepseek互換の模擬サーバーを起動します。")
+    parser.add_argument("--host", default="127.0.0.1", help="待ち受けるホスト（既定: 127.0.0.1）")
+    parser.add_argument("--port", type=int, default=8901, help="待ち受けるポート（既定: 8901）")
+    parse_behavior_args(parser)
+    args = parser.parse_args(argv)
+
+    server = MockDeepseekServer(args.host, args.port, behavior_from_args(args))
+    print(f"模擬サーバーを起動しました: {server.endpoint}", file=sys.stderr)
+    server.serve_forever()
+    print(json.dumps(server.stats(), ensure_ascii=False), file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
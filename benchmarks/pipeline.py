@@ -0,0 +1,199 @@
+"""
+模擬サーバーに対してワークフローを並列実行し、レイテンシとスループットを計測する
+
+同時実行数を段階的に上げながら、次の経路でワークフローを実行する。
+    graph         プロセス共有のコンパイル済みグラフをスレッドプールで実行（ノード別のレイテンシも計測）
+    batch-thread  batch.py のスレッドプール経路
+    batch-async   batch.py の非同期経路
+
+結果はJSONで出力する（実行ごとのレイテンシ p50/p95/p99、runs/sec、ノード別レイテンシ、
+プロセスのピークRSS）。ピークRSSはプロセス開始からの最大値のため、段階ごとに単調増加する。
+
+使い方:
+    python -m benchmarks.pipeline --concurrency 1,4,16,64 --runs 64
+    python -m benchmarks.pipeline --paths graph --latency lognormal:0.5,0.6 --hedge
+    python -m benchmarks.pipeline --endpoint http://127.0.0.1:8901/chat/completions  # 起動済みの模擬サーバーを使用
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Tuple
+
+from batch import BatchReport, percentile, run_batch_threads, run_batch_async
+from benchmarks.mock_server import MockDeepseekServer, parse_behavior_args, behavior_from_args
+from config.settings import EXAMPLE_TEXTS
+from graph.workflow import get_workflow_graph
+from utils.api_client import DeepseekAPI, get_http_session
+from utils.state import create_initial_state
+
+PATHS = ("graph", "batch-thread", "batch-async")
+
+
+def peak_rss_mb() -> float:
+    """プロセスのピークRSS（MB）。取得できない環境では0を返す"""
+    try:
+        import resource
+    except ImportError:
+        # Windows では resource モジュールがないため、psutil があれば現在のRSSで代用する
+        try:
+            import psutil
+        except ImportError:
+            return 0.0
+        return round(psutil.Process().memory_info().rss / 1024 / 1024, 1)
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux は KB、macOS はバイト単位
+    return round(maxrss / 1024 / (1024 if sys.platform == "darwin" else 1), 1)
+
+
+def latency_summary(values: List[float]) -> Dict[str, float]:
+    """レイテンシの一覧から p50/p95/p99 を求める（秒）"""
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50_sec": round(percentile(values, 50), 4),
+        "p95_sec": round(percentile(values, 95), 4),
+        "p99_sec": round(percentile(values, 99), 4)
+    }
+
+
+def make_inputs(runs: int) -> List[str]:
+    """キャッシュに当たらないよう、例文に通し番号を付けた入力を作成"""
+    base = EXAMPLE_TEXTS[1:]  # 先頭はプレースホルダー
+    return [f"{base[i % len(base)]}（{i}）" for i in range(runs)]
+
+
+def _timed_run(graph, client: DeepseekAPI, input_text: str) -> Tuple[float, List[Tuple[str, float]], bool]:
+    """
+    グラフを1回実行し、全体の所要時間とノードごとの所要時間を計測
+
+    ノードは順に実行されるため、更新イベントの間隔をそのノードの所要時間とみなす。
+    """
+    started = previous = time.monotonic()
+    nodes = []
+    failed = False
+    state = create_initial_state(input_text)
+    for update in graph.stream(
+        state,
+        config={"configurable": {"api_client": client, "thread_id": state["run_id"]}},
+        stream_mode="updates"
+    ):
+        now = time.monotonic()
+        for node_name, node_state in update.items():
+            nodes.append((node_name, now - previous))
+            failed = failed or bool((node_state or {}).get("error"))
+        previous = now
+    return time.monotonic() - started, nodes, failed
+
+
+def bench_graph(client: DeepseekAPI, inputs: List[str], concurrency: int) -> Dict[str, Any]:
+    """プロセス共有のコンパイル済みグラフをスレッドプールで並列実行"""
+    graph = get_workflow_graph()
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda text: _timed_run(graph, client, text), inputs))
+    wall = time.monotonic() - started
+
+    per_node: Dict[str, List[float]] = {}
+    for _, nodes, _ in results:
+        for node_name, elapsed in nodes:
+            per_node.setdefault(node_name, []).append(elapsed)
+    return {
+        "runs": len(results),
+        "failed": sum(1 for _, _, failed in results if failed),
+        "wall_sec": round(wall, 3),
+        "runs_per_sec": round(len(results) / wall, 3) if wall > 0 else 0.0,
+        "run_latency": latency_summary([elapsed for elapsed, _, _ in results]),
+        "node_latency": {name: latency_summary(values) for name, values in per_node.items()}
+    }
+
+
+def bench_batch(client: DeepseekAPI, inputs: List[str], concurrency: int, mode: str) -> Dict[str, Any]:
+    """batch.py の経路で一括処理（出力は一時ファイルに書き捨てる）"""
+    records = ((i, {"id": i, "text": text}) for i, text in enumerate(inputs))
+    fd, output_path = tempfile.mkstemp(suffix=".jsonl")
+    os.close(fd)
+    report = BatchReport(output_path)
+    try:
+        if mode == "batch-async":
+            asyncio.run(run_batch_async(records, report, client, concurrency))
+        else:
+            run_batch_threads(records, report, client, concurrency)
+    finally:
+        report.close()
+        os.remove(output_path)
+
+    summary = report.summary()
+    return {
+        "runs": summary["processed"],
+        "failed": summary["failed"],
+        "wall_sec": summary["wall_sec"],
+        "runs_per_sec": summary["docs_per_sec"],
+        "run_latency": latency_summary(report.latencies)
+    }
+
+
+def run_benchmark(endpoint: str, paths: List[str], levels: List[int], runs: int, hedge: bool) -> Dict[str, Any]:
+    """各経路・各同時実行数でワークフローを実行して計測結果を返す"""
+    # プロセス共有のコネクションプールを最大の同時実行数に合わせて作成しておく
+    get_http_session(pool_size=max(levels))
+    client = DeepseekAPI(
+        api_key="mock",
+        endpoint=endpoint,
+        model="deepseek-chat",
+        max_concurrency=max(levels),
+        cache=None,  # 計測対象はパイプライン自体のため、レスポンスキャッシュは使わない
+        hedge=hedge
+    )
+
+    results = []
+    for path in paths:
+        for concurrency in levels:
+            inputs = make_inputs(runs)
+            if path == "graph":
+                result = bench_graph(client, inputs, concurrency)
+            else:
+                result = bench_batch(client, inputs, concurrency, path)
+            result.update({"path": path, "concurrency": concurrency, "peak_rss_mb": peak_rss_mb()})
+            results.append(result)
+            print(
+                f"{path} x{concurrency}: {result['runs_per_sec']} runs/sec, "
+                f"p95 {result['run_latency']['p95_sec']}s, 失敗 {result['failed']}",
+                file=sys.stderr
+            )
+    return {"endpoint": endpoint, "results": results}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="模擬サーバーに対してワークフローのレイテンシとスループットを計測します。")
+    parser.add_argument("--concurrency", default="1,4,16,64", help="同時実行数（カンマ区切り、既定: 1,4,16,64）")
+    parser.add_argument("--runs", type=int, default=64, help="同時実行数ごとの実行回数（既定: 64）")
+    parser.add_argument("--paths", default=",".join(PATHS), help=f"計測する経路（カンマ区切り: {', '.join(PATHS)}）")
+    parser.add_argument("--endpoint", default=None, help="起動済みのサーバーを使う場合のエンドポイント（省略時は内蔵の模擬サーバー）")
+    parser.add_argument("--hedge", action="store_true", help="ヘッジリクエストを有効にする")
+    parse_behavior_args(parser)
+    args = parser.parse_args(argv)
+
+    levels = [int(level) for level in args.concurrency.split(",") if level]
+    paths = [path for path in args.paths.split(",") if path]
+    unknown = set(paths) - set(PATHS)
+    if unknown:
+        parser.error(f"不明な経路: {', '.join(sorted(unknown))}")
+
+    if args.endpoint:
+        report = run_benchmark(args.endpoint, paths, levels, args.runs, args.hedge)
+    else:
+        with MockDeepseekServer(behavior=behavior_from_args(args)) as server:
+            report = run_benchmark(server.endpoint, paths, levels, args.runs, args.hedge)
+            report["server"] = server.stats()
+    report["latency"] = args.latency
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+"""
+プロンプトに同じ長文が重複して含まれていないかを模擬サーバーで検査し、プロンプトのトークン数を計測する
+
+模擬サーバーに届いた各リクエストについて、入力文章とそれまでに生成された要約・フィードバックの本文が
+メッセージ全体に何回現れるかを数える。どれかが2回以上現れた場合は終了コード1を返す
+（エージェントのメッセージ構成を変えたときの回帰の検出用）。
+模擬サーバーは1文字を1トークンとして数えるため、トークン数は文字数に相当する。
+また、応答の usage（prompt_cache_hit_tokens）からコンテキストキャッシュに一致したトークン数を集計する
+（全呼び出しで共通の接頭辞が保たれているかの確認用）。
+
+使い方:
+    python -m benchmarks.prompt_tokens
+    python -m benchmarks.prompt_tokens --input-chars 5000 --approve-after 3 --max-prompt-tokens 60000
+    python -m benchmarks.prompt_tokens --min-cached-ratio 0.5
+"""
+import sys
+import json
+import argparse
+from collections import defaultdict
+from typing import Any, Dict, List
+
+from benchmarks.mock_server import MockDeepseekServer, MockBehavior
+from config.settings import EXAMPLE_TEXTS
+from utils.api_client import DeepseekAPI, get_http_session
+
+
+def make_input(chars: int) -> str:
+    """例文を繰り返して chars 文字程度の入力文章を作成（長文として分割されない長さにする）"""
+    base = "".join(EXAMPLE_TEXTS[1:])
+    text = ""
+    while len(text) < chars:
+        text += f"【第{len(text) // len(base) + 1}節】{base}"
+    return text[:chars]
+
+
+def _generated_texts(entry: Dict[str, Any]) -> List[str]:
+    """応答のうち、後続のプロンプトに埋め込まれる本文（要約・フィードバック）"""
+    if entry["kind"] == "summary":
+        return [entry["content"].strip()]
+    if entry["kind"] == "review":
+        try:
+            return [str(json.loads(entry["content"]).get("feedback", "")).strip()]
+        except ValueError:
+            return [entry["content"].strip()]
+    return []
+
+
+def check_requests(request_log: List[Dict[str, Any]], input_text: str, min_length: int) -> Dict[str, Any]:
+    """
+    各リクエストに長文が重複して含まれていないかを調べ、種類別のトークン数を集計する
+
+    Returns:
+        Dict[str, Any]: 種類別の呼び出し回数・プロンプトのトークン数・キャッシュヒットのトークン数と、重複の一覧
+    """
+    large_texts = [input_text]
+    by_kind: Dict[str, Dict[str, int]] = defaultdict(lambda: {"calls": 0, "prompt_tokens": 0, "cached_tokens": 0})
+    duplicates = []
+    for number, entry in enumerate(request_log, start=1):
+        prompt = "\n".join(message.get("content") or "" for message in entry["messages"])
+        for text in large_texts:
+            count = prompt.count(text)
+            if count > 1:
+                duplicates.append({"request": number, "kind": entry["kind"], "text": text[:30], "count": count})
+        stats = by_kind[entry["kind"]]
+        stats["calls"] += 1
+        stats["prompt_tokens"] += entry["usage"]["prompt_tokens"]
+        stats["cached_tokens"] += entry["usage"]["prompt_cache_hit_tokens"]
+        large_texts.extend(text for text in _generated_texts(entry) if len(text) >= min_length)
+    prompt_tokens = sum(stats["prompt_tokens"] for stats in by_kind.values())
+    cached_tokens = sum(stats["cached_tokens"] for stats in by_kind.values())
+    return {
+        "by_kind": dict(by_kind),
+        "prompt_tokens": prompt_tokens,
+        "cached_tokens": cached_tokens,
+        "cached_ratio": round(cached_tokens / prompt_tokens, 4) if prompt_tokens else 0.0,
+        "duplicates": duplicates
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="プロンプト内の長文の重複とトークン数を模擬サーバーで検査します。")
+    parser.add_argument("--input-chars", type=int, default=4000, help="入力文章の文字数（既定: 4000）")
+    parser.add_argument("--approve-after", type=int, default=3, help="模擬サーバーが承認する要約の版（既定: 3）")
+    parser.add_argument("--min-length", type=int, default=50, help="重複を調べる本文の最小文字数（既定: 50）")
+    parser.add_argument("--max-prompt-tokens", type=int, default=None,
+                        help="1回のワークフローのプロンプトのトークン数の上限（超えた場合は終了コード1）")
+    parser.add_argument("--min-cached-ratio", type=float, default=None,
+                        help="プロンプトのトークンのうちキャッシュヒットした割合の下限（下回った場合は終了コード1）")
+    args = parser.parse_args(argv)
+
+    from graph.runner import run_workflow
+
+    input_text = make_input(args.input_chars)
+    with MockDeepseekServer(behavior=MockBehavior(approve_after=args.approve_after), record_requests=True) as server:
+        client = DeepseekAPI(api_key="mock", endpoint=server.endpoint, model="deepseek-chat", session=get_http_session())
+        run_workflow(input_text, client)
+        result = check_requests(server.request_log, input_text, args.min_length)
+    result["input_chars"] = len(input_text)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    failed = False
+    if result["duplicates"]:
+        print("同じ長文が1つのリクエストに複数回含まれています。", file=sys.stderr)
+        failed = True
+    if args.max_prompt_tokens is not None and result["prompt_tokens"] > args.max_prompt_tokens:
+        print(f"プロンプトのトークン数が上限（{args.max_prompt_tokens}）を超えています。", file=sys.stderr)
+        failed = True
+    if args.min_cached_ratio is not None and result["cached_ratio"] < args.min_cached_ratio:
+        print(f"キャッシュヒットの割合が下限（{args.min_cached_ratio}）を下回っています。", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,85 @@
+"""
+1セッションが保持するワークフロー状態（対話履歴を含む）のメモリ量を計測する
+
+模擬サーバーに対してワークフローを --sessions 回実行し、画面側のセッションが保持する最終状態の
+大きさを数える。複数の箇所から参照される同じオブジェクト（共有された文字列など）は1回だけ数えるため、
+要約・フィードバックの本文を状態と対話履歴で共有している場合や、エージェント種別を intern している場合は
+その分だけ小さくなる。
+
+使い方:
+    python -m benchmarks.session_memory --sessions 50
+    python -m benchmarks.session_memory --approve-after 4  # 改訂を最大回数まで繰り返す
+"""
+import sys
+import json
+import argparse
+from typing import Any, Dict, Set
+
+from benchmarks.mock_server import MockDeepseekServer, MockBehavior
+from config.settings import EXAMPLE_TEXTS
+from utils.api_client import DeepseekAPI, get_http_session
+
+
+def deep_size(obj: Any, seen: Set[int]) -> int:
+    """
+    obj から辿れるオブジェクトの合計サイズ（バイト）
+
+    seen に含まれるオブジェクトは数えない（複数のセッション・フィールドで共有されたものは1回だけ数える）。
+    """
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, int, float, bool)) or obj is None:
+        return size
+    if hasattr(obj, "items"):
+        return size + sum(deep_size(key, seen) + deep_size(value, seen) for key, value in obj.items())
+    if isinstance(obj, (list, tuple, set, frozenset)) or hasattr(obj, "__iter__") and hasattr(obj, "maxlen"):
+        return size + sum(deep_size(item, seen) for item in obj)
+    for name in getattr(type(obj), "__slots__", ()):
+        if hasattr(obj, name):
+            size += deep_size(getattr(obj, name), seen)
+    if hasattr(obj, "__dict__"):
+        size += deep_size(vars(obj), seen)
+    return size
+
+
+def run_sessions(endpoint: str, sessions: int) -> Dict[str, Any]:
+    """ワークフローを sessions 回実行し、1セッションあたりのメモリ量を求める"""
+    from graph.runner import run_workflow
+
+    # 計測ごとに新しく生成させる（レスポンスキャッシュは使わない）
+    client = DeepseekAPI(api_key="mock", endpoint=endpoint, model="deepseek-chat", session=get_http_session(), cache=None)
+    texts = [text for text in EXAMPLE_TEXTS[1:]]
+    states = [run_workflow(f"{texts[i % len(texts)]}（{i}）", client) for i in range(sessions)]
+
+    # 計測記録（metrics）は対話履歴と無関係なため除く（一時オブジェクトのIDが再利用されないよう参照を保持する）
+    retained = [{key: value for key, value in state.items() if key != "metrics"} for state in states]
+    seen: Set[int] = set()
+    state_bytes = sum(deep_size(state, seen) for state in retained)
+    seen = set()
+    history_bytes = sum(deep_size(state["dialog_history"], seen) for state in states)
+    messages = sum(len(state["dialog_history"]) for state in states)
+    return {
+        "sessions": sessions,
+        "messages_per_session": round(messages / sessions, 1),
+        "state_bytes_per_session": state_bytes // sessions,
+        "dialog_history_bytes_per_session": history_bytes // sessions,
+        "bytes_per_message": history_bytes // max(messages, 1)
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="1セッションが保持するワークフロー状態のメモリ量を計測します。")
+    parser.add_argument("--sessions", type=int, default=50, help="実行するワークフローの数（既定: 50）")
+    parser.add_argument("--approve-after", type=int, default=2, help="模擬サーバーが承認する要約の版（既定: 2）")
+    args = parser.parse_args(argv)
+
+    with MockDeepseekServer(behavior=MockBehavior(approve_after=args.approve_after)) as server:
+        result = run_sessions(server.endpoint, args.sessions)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
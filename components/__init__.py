@@ -1,6 +1,7 @@
 from utils.state import create_initial_state
 from utils.theme import apply_theme_styles
-from utils.api_client import get_client, initialize_client, update_model, get_available_models
+from utils.api_client import get_available_models
+from utils.session import get_client, initialize_client, update_model
 
 __all__ = [
     'create_initial_state', 
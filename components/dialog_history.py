@@ -1,211 +1,280 @@
+import json
 import streamlit as st
-from datetime import datetime
-from typing import Dict, Any, List, Optional
+import streamlit.components.v1 as components
+from typing import Dict, List, Tuple, Optional, Callable
+from config.settings import DIALOG_HISTORY_WINDOW
+# 対話履歴の操作はエンジン側（utils.state）で定義し、UIからも同じ名前で使えるようにする
+from utils.state import DialogMessage, format_timestamp, add_to_dialog_history, update_progress, stream_to_dialog_history
 
-def display_dialog_history(dialog_history: List[Dict[str, Any]]):
+# 対話履歴のカスタムCSSスタイル（セッションごとに1回だけ注入する）
+DIALOG_CSS = """
+.dialog-card {
+    background-color: white;
+    border-radius: 8px;
+    padding: 15px;
+    margin-bottom: 15px;
+    box-shadow: 0 1px 3px rgba(0,0,0,0.1);
+    animation: fadeIn 0.5s ease-out forwards;
+}
+.agent-header {
+    display: flex;
+    justify-content: space-between;
+    margin-bottom: 10px;
+    border-bottom: 1px solid #f0f0f0;
+    padding-bottom: 5px;
+}
+.agent-name {
+    font-weight: bold;
+    display: flex;
+    align-items: center;
+}
+.agent-icon {
+    margin-right: 8px;
+    font-size: 18px;
+}
+.agent-timestamp {
+    font-size: 12px;
+    color: #888;
+}
+.agent-content {
+    line-height: 1.5;
+}
+.agent-summarizer {
+    border-left: 4px solid #009688;
+}
+.agent-reviewer {
+    border-left: 4px solid #673AB7;
+}
+.agent-title {
+    border-left: 4px solid #FF5722;
+}
+.agent-system {
+    border-left: 4px solid #9E9E9E;
+    background-color: #f9f9f9;
+}
+.progress-container {
+    margin-top: 10px;
+    margin-bottom: 5px;
+}
+.progress-bar {
+    height: 6px;
+    background-color: #f0f0f0;
+    border-radius: 3px;
+    overflow: hidden;
+}
+.progress-indicator {
+    height: 100%;
+    background-color: #00796B;
+    border-radius: 3px;
+    transition: width 0.3s ease;
+}
+.progress-text {
+    font-size: 12px;
+    color: #666;
+    text-align: right;
+    margin-top: 2px;
+}
+@keyframes fadeIn {
+    from { opacity: 0; transform: translateY(10px); }
+    to { opacity: 1; transform: translateY(0); }
+}
+@keyframes pulse {
+    0% { opacity: 0.6; }
+    50% { opacity: 1; }
+    100% { opacity: 0.6; }
+}
+.pulse-animation {
+    animation: pulse 1.5s infinite;
+}
+.stream-cursor {
+    color: #00796B;
+    animation: pulse 1s infinite;
+}
+"""
+
+# エージェント種別ごとの表示設定（アイコン、表示名、CSSクラス）
+AGENT_STYLES = {
+    "summarizer": ("📝", "要約者", "agent-summarizer"),
+    "reviewer": ("⭐", "批評家", "agent-reviewer"),
+    "title": ("🏷️", "タイトル作成者", "agent-title"),
+    "system": ("🔄", "システム", "agent-system")
+}
+UNKNOWN_AGENT_STYLE = ("💬", "不明なエージェント", "")
+
+
+def inject_dialog_css():
     """
-    洗練された対話履歴表示
+    対話履歴のCSSをセッションごとに1回だけページに注入
+    
+    st.markdown の <style> は再実行のたびに送り直さないと消えてしまうため、
+    コンポーネントのスクリプトから親ページの <head> に追加する（再実行後も残る）。
     """
-    if not dialog_history:
-        st.info("対話履歴はまだありません。ワークフローを実行すると、ここに対話の流れが表示されます。")
+    if st.session_state.get("dialog_css_injected"):
         return
+    st.session_state.dialog_css_injected = True
+    components.html(f"""
+    <script>
+    const doc = window.parent.document;
+    if (!doc.getElementById("dialog-history-style")) {{
+        const style = doc.createElement("style");
+        style.id = "dialog-history-style";
+        style.textContent = {json.dumps(DIALOG_CSS)};
+        doc.head.appendChild(style);
+    }}
+    </script>
+    """, height=0)
+
+
+def render_message_html(dialog: DialogMessage, is_latest: bool = False) -> str:
+    """
+    対話メッセージ1件分のHTMLを作成
     
-    # カスタムCSSスタイル
-    st.markdown("""
-    <style>
-    .dialog-card {
-        background-color: white;
-        border-radius: 8px;
-        padding: 15px;
-        margin-bottom: 15px;
-        box-shadow: 0 1px 3px rgba(0,0,0,0.1);
-        animation: fadeIn 0.5s ease-out forwards;
-    }
-    .agent-header {
-        display: flex;
-        justify-content: space-between;
-        margin-bottom: 10px;
-        border-bottom: 1px solid #f0f0f0;
-        padding-bottom: 5px;
-    }
-    .agent-name {
-        font-weight: bold;
-        display: flex;
-        align-items: center;
-    }
-    .agent-icon {
-        margin-right: 8px;
-        font-size: 18px;
-    }
-    .agent-timestamp {
-        font-size: 12px;
-        color: #888;
-    }
-    .agent-content {
-        line-height: 1.5;
-    }
-    .agent-summarizer {
-        border-left: 4px solid #009688;
-    }
-    .agent-reviewer {
-        border-left: 4px solid #673AB7;
-    }
-    .agent-title {
-        border-left: 4px solid #FF5722;
-    }
-    .agent-system {
-        border-left: 4px solid #9E9E9E;
-        background-color: #f9f9f9;
-    }
-    .progress-container {
-        margin-top: 10px;
-        margin-bottom: 5px;
-    }
-    .progress-bar {
-        height: 6px;
-        background-color: #f0f0f0;
-        border-radius: 3px;
-        overflow: hidden;
-    }
-    .progress-indicator {
-        height: 100%;
-        background-color: #00796B;
-        border-radius: 3px;
-        transition: width 0.3s ease;
-    }
-    .progress-text {
-        font-size: 12px;
-        color: #666;
-        text-align: right;
-        margin-top: 2px;
-    }
-    @keyframes fadeIn {
-        from { opacity: 0; transform: translateY(10px); }
-        to { opacity: 1; transform: translateY(0); }
-    }
-    @keyframes pulse {
-        0% { opacity: 0.6; }
-        50% { opacity: 1; }
-        100% { opacity: 0.6; }
-    }
-    .pulse-animation {
-        animation: pulse 1.5s infinite;
-    }
-    </style>
-    """, unsafe_allow_html=True)
+    Args:
+        dialog: 対話履歴のメッセージ
+        is_latest: 最新のメッセージかどうか（処理中のアニメーション用）
+        
+    Returns:
+        str: メッセージのHTML
+    """
+    content = dialog.content
+    timestamp = format_timestamp(dialog.timestamp)
+    progress = dialog.progress
+    is_streaming = dialog.streaming
+    emoji, agent_name, agent_class = AGENT_STYLES.get(dialog.agent_type, UNKNOWN_AGENT_STYLE)
     
-    # 全体の進捗状態を表示（最新の進捗値を使用）
-    latest_progress = 0
-    for dialog in dialog_history:
-        if "progress" in dialog and dialog["progress"] is not None:
-            latest_progress = max(latest_progress, dialog["progress"])
+    pulse_class = " pulse-animation" if is_latest and "完了" not in content and "生成" in content else ""
     
-    # 全体の進捗バーを表示
-    if latest_progress > 0:
-        st.markdown(f"""
-        <div style="margin-bottom: 15px; background-color: white; padding: 15px; border-radius: 8px; box-shadow: 0 1px 3px rgba(0,0,0,0.1);">
-            <div style="display: flex; justify-content: space-between; margin-bottom: 5px;">
-                <span style="font-weight: bold;">全体の進捗状況</span>
-                <span style="color: #00796B; font-weight: bold;">{latest_progress}%</span>
-            </div>
-            <div class="progress-bar">
-                <div class="progress-indicator" style="width: {latest_progress}%;"></div>
-            </div>
+    # f-string内でバックスラッシュを使えないため事前に変換する
+    content_html = content.replace('\n', '<br>')
+    # ストリーミング中のメッセージには入力カーソルを表示
+    if is_streaming:
+        content_html += '<span class="stream-cursor">▌</span>'
+    
+    # 進捗表示（対話メッセージごと）
+    progress_html = ""
+    if progress is not None:
+        progress_html = f"""
+    <div class="progress-container">
+        <div class="progress-bar">
+            <div class="progress-indicator" style="width: {progress}%;"></div>
         </div>
-        """, unsafe_allow_html=True)
+        <div class="progress-text">{progress}% 完了</div>
+    </div>"""
     
-    # 各対話メッセージを表示
-    for i, dialog in enumerate(dialog_history):
-        agent_type = dialog.get("agent_type", "unknown")
-        content = dialog.get("content", "")
-        timestamp = dialog.get("timestamp", "")
-        progress = dialog.get("progress", None)
-        
-        # エージェント毎の設定
-        if agent_type == "summarizer":
-            emoji = "📝"
-            agent_name = "要約者"
-            agent_class = "agent-summarizer"
-        elif agent_type == "reviewer":
-            emoji = "⭐"
-            agent_name = "批評家"
-            agent_class = "agent-reviewer"
-        elif agent_type == "title":
-            emoji = "🏷️"
-            agent_name = "タイトル作成者"
-            agent_class = "agent-title"
-        elif agent_type == "system":
-            emoji = "🔄"
-            agent_name = "システム"
-            agent_class = "agent-system"
-        else:
-            emoji = "💬"
-            agent_name = "不明なエージェント"
-            agent_class = ""
-        
-        # 最新メッセージかどうかを判定（アニメーション用）
-        is_latest = (i == len(dialog_history) - 1)
-        pulse_class = " pulse-animation" if is_latest and "完了" not in content and "生成" in content else ""
-        
-        # 対話カードの表示
-        st.markdown(f"""
-        <div class="dialog-card {agent_class}">
-            <div class="agent-header">
-                <div class="agent-name">
-                    <span class="agent-icon">{emoji}</span> {agent_name}
-                </div>
-                <span class="agent-timestamp">{timestamp}</span>
-            </div>
-            <div class="agent-content{pulse_class}">
-                {content.replace('\n', '<br>')}
-            </div>
-        """, unsafe_allow_html=True)
-        
-        # 進捗表示（対話メッセージごと）
-        if progress is not None:
-            st.markdown(f"""
-            <div class="progress-container">
-                <div class="progress-bar">
-                    <div class="progress-indicator" style="width: {progress}%;"></div>
-                </div>
-                <div class="progress-text">{progress}% 完了</div>
-            </div>
-            """, unsafe_allow_html=True)
-            
-        st.markdown("</div>", unsafe_allow_html=True)
+    return f"""
+<div class="dialog-card {agent_class}">
+    <div class="agent-header">
+        <div class="agent-name">
+            <span class="agent-icon">{emoji}</span> {agent_name}
+        </div>
+        <span class="agent-timestamp">{timestamp}</span>
+    </div>
+    <div class="agent-content{pulse_class}">
+        {content_html}
+    </div>{progress_html}
+</div>"""
 
 
-def add_to_dialog_history(
-    state: Dict[str, Any], 
-    agent_type: str, 
-    content: str, 
-    progress: Optional[int] = None
-) -> Dict[str, Any]:
+def _render_batch(dialog_history: List[DialogMessage], start: int, end: int) -> str:
     """
-    対話履歴にメッセージを追加
+    start〜end番目のメッセージのHTMLをまとめて作成
+    
+    メッセージごとのHTMLはセッション内でIDをキーにキャッシュし、
+    内容・進捗・ストリーミング状態が変わったメッセージだけを作り直す。
     """
-    if "dialog_history" not in state:
-        state["dialog_history"] = []
+    cache: Dict[str, Tuple[Tuple, str]] = st.session_state.setdefault("dialog_html_cache", {})
+    last = len(dialog_history) - 1
+    parts = []
+    for i in range(start, end):
+        dialog = dialog_history[i]
+        is_latest = (i == last)
+        key = dialog.id
+        signature = (dialog.body, dialog.progress, dialog.streaming, is_latest)
+        cached = cache.get(key)
+        if cached is None or cached[0] != signature:
+            cached = (signature, render_message_html(dialog, is_latest))
+            cache[key] = cached
+        parts.append(cached[1])
     
-    timestamp = datetime.now().strftime("%H:%M:%S")
-    state["dialog_history"].append({
-        "agent_type": agent_type,
-        "content": content,
-        "timestamp": timestamp,
-        "progress": progress
-    })
+    # 新しいワークフローで履歴が入れ替わった場合は、表示されなくなったメッセージを捨てる
+    if len(cache) > 2 * len(dialog_history):
+        keys = {dialog.id for dialog in dialog_history}
+        st.session_state.dialog_html_cache = {key: value for key, value in cache.items() if key in keys}
+    return "".join(parts)
+
+
+def display_dialog_progress(dialog_history: List[DialogMessage]):
+    """
+    対話履歴全体の進捗状況を表示（最新の進捗値を使用）
     
-    return state
+    Args:
+        dialog_history: 対話履歴（メモリ上のメッセージ）
+    """
+    inject_dialog_css()
+    
+    latest_progress = max((dialog.progress or 0 for dialog in dialog_history), default=0)
+    if latest_progress > 0:
+        progress_html = f"""
+<div style="margin-bottom: 15px; background-color: white; padding: 15px; border-radius: 8px; box-shadow: 0 1px 3px rgba(0,0,0,0.1);">
+    <div style="display: flex; justify-content: space-between; margin-bottom: 5px;">
+        <span style="font-weight: bold;">全体の進捗状況</span>
+        <span style="color: #00796B; font-weight: bold;">{latest_progress}%</span>
+    </div>
+    <div class="progress-bar">
+        <div class="progress-indicator" style="width: {latest_progress}%;"></div>
+    </div>
+</div>"""
+        st.markdown(progress_html, unsafe_allow_html=True)
 
 
-def update_progress(
-    state: Dict[str, Any], 
-    index: int, 
-    progress: int
-) -> Dict[str, Any]:
+def display_older_toggle(
+    dialog_history: List[DialogMessage],
+    window: int = DIALOG_HISTORY_WINDOW,
+    spilled: int = 0
+) -> bool:
     """
-    指定されたインデックスのメッセージの進捗を更新
+    最新の window 件より古いメッセージを展開するトグルを表示
+    
+    Args:
+        dialog_history: 対話履歴（メモリ上のメッセージ）
+        window: 常に表示する最新メッセージの件数
+        spilled: dialog_history より前にディスクへ書き出されたメッセージの件数
+        
+    Returns:
+        bool: 古いメッセージを展開する場合は True（折りたたむメッセージがなければ False）
     """
-    if "dialog_history" in state and 0 <= index < len(state["dialog_history"]):
-        state["dialog_history"][index]["progress"] = progress
-    return state
+    older = max(len(dialog_history) - window, 0) + spilled
+    if older == 0:
+        return False
+    return st.toggle(f"以前のメッセージを表示（{older}件）", key="show_older_dialog")
+
+
+def display_dialog_messages(
+    dialog_history: List[DialogMessage],
+    show_older: bool,
+    window: int = DIALOG_HISTORY_WINDOW,
+    spilled: int = 0,
+    load_spilled: Optional[Callable[[], List[DialogMessage]]] = None
+):
+    """
+    洗練された対話履歴表示
+    
+    最新の window 件だけを常に表示し、それより古いメッセージは show_older のときだけ
+    HTMLを作成して送る。表示するメッセージはまとめて1回の st.markdown で送る。
+    
+    Args:
+        dialog_history: 対話履歴（メモリ上のメッセージ）
+        show_older: 古いメッセージも表示するか（display_older_toggle の戻り値）
+        window: 常に表示する最新メッセージの件数
+        spilled: dialog_history より前にディスクへ書き出されたメッセージの件数
+        load_spilled: 書き出されたメッセージを読み戻す関数（古いメッセージを表示するときだけ呼ぶ）
+    """
+    split = max(len(dialog_history) - window, 0)
+    if show_older:
+        if spilled and load_spilled is not None:
+            # 書き出されたメッセージは内容が変わらないため、キャッシュせずにそのまま作成する
+            st.markdown("".join(render_message_html(dialog) for dialog in load_spilled()), unsafe_allow_html=True)
+        st.markdown(_render_batch(dialog_history, 0, split), unsafe_allow_html=True)
+    
+    # 最新のメッセージを表示
+    st.markdown(_render_batch(dialog_history, split, len(dialog_history)), unsafe_allow_html=True)
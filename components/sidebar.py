@@ -1,5 +1,6 @@
 import streamlit as st
-from utils.api_client import get_available_models, update_model, get_selected_model, test_api_connection
+from utils.api_client import get_available_models
+from utils.session import update_model, get_selected_model, test_api_connection
 
 def render_sidebar():
     """サイドバーUI - シンプル化"""
@@ -1,11 +1,41 @@
 from config.settings import (
     APP_NAME, APP_ICON, APP_DESCRIPTION,
-    DEFAULT_API_ENDPOINT, DEFAULT_TIMEOUT,
-    MAX_REVISION_COUNT, EXAMPLE_TEXTS
+    DEFAULT_API_ENDPOINT, DEFAULT_TIMEOUT, DEFAULT_CONNECT_TIMEOUT,
+    HTTP_POOL_SIZE, HTTP_PREWARM_CONNECTIONS, ASYNC_MAX_CONCURRENCY,
+    API_MAX_RETRIES, API_BACKOFF_BASE, API_BACKOFF_MAX,
+    API_HEDGE_ENABLED, API_HEDGE_PERCENTILE, API_HEDGE_MIN_DELAY, API_HEDGE_MIN_SAMPLES,
+    CIRCUIT_BREAKER_FAILURE_THRESHOLD, CIRCUIT_BREAKER_RESET_TIMEOUT,
+    RATE_LIMIT_REQUESTS_PER_SEC, RATE_LIMIT_TOKENS_PER_MIN, RATE_LIMIT_COMPLETION_TOKENS,
+    LLM_CACHE_ENABLED, LLM_CACHE_PATH, LLM_CACHE_MEMORY_ENTRIES, LLM_CACHE_DISK_ENTRIES, LLM_CACHE_TTL,
+    RESULT_CACHE_ENABLED, RESULT_CACHE_PATH, RESULT_CACHE_ENTRIES, RESULT_CACHE_TTL, PREWARM_EXAMPLE_RESULTS,
+    CHECKPOINT_ENABLED, CHECKPOINT_PATH, CHECKPOINT_TTL, CHECKPOINT_KEEP_PER_THREAD, CHECKPOINT_PRUNE_INTERVAL,
+    CHECKPOINT_LEASE,
+    SCHEDULER_WORKERS, SCHEDULER_MAX_QUEUE,
+    METRICS_LOG_PATH,
+    DIALOG_HISTORY_WINDOW, UI_REFRESH_INTERVAL, DIALOG_HISTORY_CAPACITY, DIALOG_SPILL_DIR,
+    MAX_REVISION_COUNT, STRUCTURED_REVIEW, INCREMENTAL_REVIEW, INCREMENTAL_REVIEW_MAX_CHANGE, REVIEW_WITH_SOURCE,
+    SPECULATIVE_TITLE, SPECULATIVE_TITLE_WORKERS,
+    LONG_INPUT_THRESHOLD, CHUNK_SIZE, CHUNK_OVERLAP, REDUCE_FAN_IN,
+    EXAMPLE_TEXTS
 )
 
 __all__ = [
     'APP_NAME', 'APP_ICON', 'APP_DESCRIPTION',
-    'DEFAULT_API_ENDPOINT', 'DEFAULT_TIMEOUT',
-    'MAX_REVISION_COUNT', 'EXAMPLE_TEXTS'
+    'DEFAULT_API_ENDPOINT', 'DEFAULT_TIMEOUT', 'DEFAULT_CONNECT_TIMEOUT',
+    'HTTP_POOL_SIZE', 'HTTP_PREWARM_CONNECTIONS', 'ASYNC_MAX_CONCURRENCY',
+    'API_MAX_RETRIES', 'API_BACKOFF_BASE', 'API_BACKOFF_MAX',
+    'API_HEDGE_ENABLED', 'API_HEDGE_PERCENTILE', 'API_HEDGE_MIN_DELAY', 'API_HEDGE_MIN_SAMPLES',
+    'CIRCUIT_BREAKER_FAILURE_THRESHOLD', 'CIRCUIT_BREAKER_RESET_TIMEOUT',
+    'RATE_LIMIT_REQUESTS_PER_SEC', 'RATE_LIMIT_TOKENS_PER_MIN', 'RATE_LIMIT_COMPLETION_TOKENS',
+    'LLM_CACHE_ENABLED', 'LLM_CACHE_PATH', 'LLM_CACHE_MEMORY_ENTRIES', 'LLM_CACHE_DISK_ENTRIES', 'LLM_CACHE_TTL',
+    'RESULT_CACHE_ENABLED', 'RESULT_CACHE_PATH', 'RESULT_CACHE_ENTRIES', 'RESULT_CACHE_TTL', 'PREWARM_EXAMPLE_RESULTS',
+    'CHECKPOINT_ENABLED', 'CHECKPOINT_PATH', 'CHECKPOINT_TTL', 'CHECKPOINT_KEEP_PER_THREAD', 'CHECKPOINT_PRUNE_INTERVAL',
+    'CHECKPOINT_LEASE',
+    'SCHEDULER_WORKERS', 'SCHEDULER_MAX_QUEUE',
+    'METRICS_LOG_PATH',
+    'DIALOG_HISTORY_WINDOW', 'UI_REFRESH_INTERVAL', 'DIALOG_HISTORY_CAPACITY', 'DIALOG_SPILL_DIR',
+    'MAX_REVISION_COUNT', 'STRUCTURED_REVIEW', 'INCREMENTAL_REVIEW', 'INCREMENTAL_REVIEW_MAX_CHANGE', 'REVIEW_WITH_SOURCE',
+    'SPECULATIVE_TITLE', 'SPECULATIVE_TITLE_WORKERS',
+    'LONG_INPUT_THRESHOLD', 'CHUNK_SIZE', 'CHUNK_OVERLAP', 'REDUCE_FAN_IN',
+    'EXAMPLE_TEXTS'
 ]
\ No newline at end of file
@@ -9,10 +9,83 @@ APP_DESCRIPTION = "DeepseekとLangGraphを使ったテキスト要約ワーク
 
 # API設定のデフォルト値
 DEFAULT_API_ENDPOINT = "https://api.deepseek.com/chat/completions"
-DEFAULT_TIMEOUT = 60
+DEFAULT_TIMEOUT = 60  # 読み取りタイムアウト（秒）
+DEFAULT_CONNECT_TIMEOUT = 5  # 接続タイムアウト（秒）
+
+# HTTPコネクションプール設定
+HTTP_POOL_SIZE = 16  # エンドポイントごとに保持する最大コネクション数
+HTTP_PREWARM_CONNECTIONS = 4  # 起動時に事前確立するコネクション数
+ASYNC_MAX_CONCURRENCY = 64  # 非同期クライアントで同時に送信するリクエストの上限
+
+# リトライ設定（429・5xx・通信エラー時）
+API_MAX_RETRIES = 3  # 最大リトライ回数
+API_BACKOFF_BASE = 0.5  # バックオフの基準時間（秒）。試行ごとに2倍にし、0〜上限の範囲でランダムに待つ
+API_BACKOFF_MAX = 30  # バックオフの上限（秒）
+
+# ヘッジリクエスト設定（応答が遅い場合に同じリクエストをもう1件送り、先に返った方を使う）
+API_HEDGE_ENABLED = True
+API_HEDGE_PERCENTILE = 95  # この百分位数の応答時間を超えたら2件目を送信する
+API_HEDGE_MIN_DELAY = 1.0  # 2件目を送信するまでの最短待ち時間（秒）
+API_HEDGE_MIN_SAMPLES = 20  # ヘッジを開始するのに必要な応答時間のサンプル数
+
+# サーキットブレーカー設定
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = 5  # 呼び出しを停止する連続失敗回数
+CIRCUIT_BREAKER_RESET_TIMEOUT = 30  # 停止してから試行を再開するまでの時間（秒）
+
+# クライアント側レート制限（プロセス全体で共有、0で無制限）
+RATE_LIMIT_REQUESTS_PER_SEC = 10  # 1秒あたりの最大リクエスト数
+RATE_LIMIT_TOKENS_PER_MIN = 300000  # 1分あたりの最大トークン数（見積もり）
+RATE_LIMIT_COMPLETION_TOKENS = 512  # トークン数の見積もりに加える出力トークン数
+
+# LLMレスポンスキャッシュ設定
+LLM_CACHE_ENABLED = True
+LLM_CACHE_PATH = ".cache/llm_cache.sqlite3"
+LLM_CACHE_MEMORY_ENTRIES = 256  # メモリ階層（LRU）の最大件数
+LLM_CACHE_DISK_ENTRIES = 10000  # ディスク階層（SQLite）の最大件数
+LLM_CACHE_TTL = 7 * 24 * 60 * 60  # 有効期間（秒）
+
+# ワークフロー結果キャッシュ設定
+RESULT_CACHE_ENABLED = True
+RESULT_CACHE_PATH = ".cache/workflow_results.sqlite3"
+RESULT_CACHE_ENTRIES = 1000  # 保持する最大件数
+RESULT_CACHE_TTL = 24 * 60 * 60  # 有効期間（秒）
+PREWARM_EXAMPLE_RESULTS = True  # 起動時に例文の結果をキャッシュに用意する
+
+# チェックポイント設定（ノードごとの状態をSQLiteに保存し、中断した実行を再開できるようにする）
+CHECKPOINT_ENABLED = False
+CHECKPOINT_PATH = ".cache/checkpoints.sqlite3"
+CHECKPOINT_TTL = 7 * 24 * 60 * 60  # 最後の更新からスレッドを保持する期間（秒）
+CHECKPOINT_KEEP_PER_THREAD = 5  # スレッドごとに残す最新のチェックポイント数
+CHECKPOINT_PRUNE_INTERVAL = 60  # 古いチェックポイントを削除する間隔（秒）
+CHECKPOINT_LEASE = 60  # 実行中のスレッドを占有する期間（秒、実行中は1/3ごとに延長。プロセスごと落ちた実行はこの期間が過ぎるまで再開できない）
+
+# 実行スケジューラー設定（画面からのワークフロー実行をプロセス全体で制限する）
+SCHEDULER_WORKERS = 4  # 同時に実行するワークフローの数
+SCHEDULER_MAX_QUEUE = 32  # 実行待ちにできる件数の上限（超えた場合は受け付けない）
+
+# 計測設定
+METRICS_LOG_PATH = None  # ノード・API呼び出しの計測記録を追記するJSONLファイル（Noneの場合は出力しない）
+
+# 対話履歴の表示設定
+DIALOG_HISTORY_WINDOW = 20  # 常に表示する最新メッセージの件数（それより古いものは折りたたむ）
+UI_REFRESH_INTERVAL = 0.5  # 処理中に進捗表示・対話履歴を更新する間隔（秒）
+DIALOG_HISTORY_CAPACITY = 200  # セッションがメモリに保持するメッセージの最大件数（超えた分はディスクに書き出す）
+DIALOG_SPILL_DIR = ".cache/dialog"  # 書き出したメッセージの保存先（Noneの場合は書き出さずに捨てる）
 
 # ワークフロー設定
 MAX_REVISION_COUNT = 3  # 最大改訂回数
+STRUCTURED_REVIEW = True  # 批評と承認判定を1回のAPI呼び出し（JSONモード）で行う
+INCREMENTAL_REVIEW = True  # 2回目以降のレビューでは前回の要約からの変更箇所と未解決の問題点だけを送る
+INCREMENTAL_REVIEW_MAX_CHANGE = 0.5  # 変更された文字数の割合がこれを超える場合は全文でレビューする
+REVIEW_WITH_SOURCE = False  # レビューにも原文を送る（接頭辞のキャッシュを共有できるが、送るトークン数はレビューの回数分増える）
+SPECULATIVE_TITLE = False  # レビューと並行してタイトルを先行生成する（承認が確定している最終改訂では常に行う）
+SPECULATIVE_TITLE_WORKERS = 4  # 先行生成を同時に実行する数（プロセス全体、超えた分は順番待ち）
+
+# 長文（分割して並列に要約し、階層的に統合する）設定
+LONG_INPUT_THRESHOLD = 6000  # この文字数を超える入力を長文として扱う
+CHUNK_SIZE = 3000  # 1チャンクの最大文字数
+CHUNK_OVERLAP = 200  # 隣り合うチャンクで重複させる最大文字数
+REDUCE_FAN_IN = 4  # 1回の統合でまとめる部分要約の数
 
 # 例文
 EXAMPLE_TEXTS = [
@@ -1,4 +1,5 @@
-from graph.workflow import create_workflow_graph
+from graph.workflow import create_workflow_graph, get_workflow_graph
 from graph.nodes import node_summarize, node_review, node_title, should_revise
+from graph.runner import run_workflow, arun_workflow, prewarm_example_results
 
-__all__ = ['create_workflow_graph', 'node_summarize', 'node_review', 'node_title', 'should_revise']
\ No newline at end of file
+__all__ = ['create_workflow_graph', 'get_workflow_graph', 'node_summarize', 'node_review', 'node_title', 'should_revise', 'run_workflow', 'arun_workflow', 'prewarm_example_results']
\ No newline at end of file
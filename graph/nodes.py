@@ -1,311 +1,722 @@
-import streamlit as st
-from typing import Dict, Any, Generator
-from utils.api_client import get_client
+import time
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, Iterator, Tuple
+from langchain_core.runnables import RunnableConfig
+from langgraph.config import get_stream_writer
+from langgraph.types import Send
+from utils.api_client import DeepseekAPI
 from agents.summarizer import SummarizerAgent
 from agents.reviewer import ReviewerAgent
+from agents.summary_diff import diff_summaries
 from agents.title_writer import TitleCopywriterAgent
-from components.workflow_viz import render_workflow_visualization
-from components.dialog_history import add_to_dialog_history
-from utils.state import State
+from config.settings import (
+    STRUCTURED_REVIEW, INCREMENTAL_REVIEW, INCREMENTAL_REVIEW_MAX_CHANGE, REVIEW_WITH_SOURCE,
+    SPECULATIVE_TITLE, SPECULATIVE_TITLE_WORKERS,
+    LONG_INPUT_THRESHOLD, CHUNK_SIZE, CHUNK_OVERLAP, REDUCE_FAN_IN
+)
+from utils import events
+from utils.state import State, add_to_dialog_history, stream_to_dialog_history
+from utils.metrics import collect_calls, record_node, emit
+from utils.text_splitter import split_text
 
 
-def node_summarize(state: State) -> Generator[State, None, State]:
+def get_node_client(config: Optional[RunnableConfig] = None) -> DeepseekAPI:
     """
-    要約ノード: テキストの要約を生成する
+    ノードで使用するAPIクライアントを取得
+
+    ノードはUIに依存しないため、クライアントは呼び出し側が
+    config["configurable"]["api_client"] で明示的に渡す。
+
+    Raises:
+        ValueError: クライアントが渡されていない場合
+    """
+    client = (config or {}).get("configurable", {}).get("api_client")
+    if client is None:
+        raise ValueError("config['configurable']['api_client'] にAPIクライアントを指定してください。")
+    return client
+
+
+def get_node_model(config: Optional[RunnableConfig] = None) -> Optional[str]:
+    """
+    ノードで使用するモデル名を取得
+
+    クライアントはプロセスで共有されるため、モデルはクライアントを書き換えずに
+    config["configurable"]["model"] で実行ごとに渡す（省略時はクライアントの既定のモデル）。
+    """
+    return (config or {}).get("configurable", {}).get("model")
+
+
+def emit_event(kind: str, **fields) -> None:
+    """
+    ノードの進捗イベントを custom ストリームに送る
+
+    イベントの種類と項目は utils.events と共通。stream_mode に "custom" を含めずに実行した場合や、
+    グラフの外からノードを直接呼んだ場合は何もしない。
+    """
+    try:
+        writer = get_stream_writer()
+    except RuntimeError:
+        return
+    writer({"kind": kind, **fields})
+
+
+def log_message(
+    state: State,
+    agent_type: str,
+    content: str,
+    progress: Optional[int] = None,
+    header: str = ""
+) -> State:
+    """対話履歴にメッセージを追加し、進捗イベントとして送る（header は content の前に表示する見出し）"""
+    state = add_to_dialog_history(state, agent_type, content, progress=progress, header=header)
+    emit_event(events.MESSAGE, **events.message_fields(state["dialog_history"][-1]))
+    return state
+
+
+def enter_node(state: State, node: str, progress: int) -> None:
+    """実行中のノードを状態に記録し、進捗イベントとして送る"""
+    state["current_node"] = node
+    emit_event(events.NODE, node=node, progress=progress)
+
+
+def stream_text(config: Optional[RunnableConfig] = None) -> bool:
+    """生成中のテキストを逐次送るかどうか（config["configurable"]["stream_text"]）"""
+    return bool((config or {}).get("configurable", {}).get("stream_text"))
+
+
+def stream_message(
+    state: State,
+    agent_type: str,
+    deltas: Iterator[str],
+    header: str,
+    progress: int,
+    config: Optional[RunnableConfig] = None
+) -> str:
+    """
+    生成されたテキストを対話履歴に逐次反映し、差分を進捗イベントとして送る
+
+    config["configurable"]["should_stop"] が True を返した時点で生成を打ち切る。
     """
-    client = get_client()
-    agent = SummarizerAgent(client)
-    
+    should_stop = (config or {}).get("configurable", {}).get("should_stop")
+    text = stream_to_dialog_history(
+        state,
+        agent_type,
+        events.forward_deltas(emit_event, state, deltas),
+        header=header,
+        progress=progress,
+        should_stop=should_stop
+    )
+    # 確定した内容（前後の空白除去・ストリーミング終了）で置き換える
+    emit_event(events.MESSAGE, **events.message_fields(state["dialog_history"][-1]))
+    return text
+
+
+def source_text(state: State) -> str:
+    """
+    改訂・タイトル生成に渡す原文を取得
+
+    長文の場合は原文の代わりに部分要約を連結したもの（condensed_input）を使う。
+    """
+    return state.get("condensed_input") or state["input_text"]
+
+
+def _fail(state: State, message: str, progress: int) -> str:
+    """エラーを対話履歴と状態に記録してメッセージを返す"""
+    state = log_message(state, "system", message, progress=progress)  # エラー時は進捗を進めない
+    state["error"] = message
+    return message
+
+
+def _start_summarize(state: State) -> State:
+    """要約ノードの開始処理（改訂回数の更新と開始メッセージ）"""
     # SummarizerAgentを呼び出す度に revision_count をインクリメント
     state["revision_count"] += 1
-    
-    # ワークフロー図の可視化
-    if "current_node" not in state or state["current_node"] != "summarize":
-        state["current_node"] = "summarize"
-        # render_workflow_visualization はUI更新するためスレッドから直接呼ばない
-        # 代わりに状態を返して、メインスレッドでUI更新する
-    
-    # システムメッセージを対話履歴に追加
-    state = add_to_dialog_history(
-        state, 
-        "system", 
-        f"要約エージェントが要約を作成 (第{state['revision_count']}版)",
-        progress=10  # 進捗状況の追加（10%）
-    )
-    
-    # 開始メッセージ
-    state = add_to_dialog_history(
-        state, 
-        "summarizer", 
-        "要約を生成しています...",
-        progress=20  # 進捗状況の追加（20%）
-    )
-    # 状態を返してUIを更新
-    yield state
-    
+    enter_node(state, "summarize", progress=10)
+
+    state = log_message(state, "system", f"要約エージェントが要約を作成 (第{state['revision_count']}版)", progress=10)
+    state = log_message(state, "summarizer", "要約を生成しています...", progress=20)
+    state = log_message(state, "summarizer", "テキストを分析中...", progress=30)
+
     # 1回目の要約かどうかで処理を分岐
-    state = add_to_dialog_history(
-        state, 
-        "summarizer", 
-        "テキストを分析中...",
-        progress=30  # 進捗状況の追加（30%）
-    )
-    yield state
-    
+    if state["revision_count"] == 1:
+        return log_message(state, "summarizer", "初回の要約を作成中...", progress=40)
+    return log_message(state, "summarizer", "フィードバックを基に要約を改善中...", progress=40)
+
+
+def _summary_header(state: State) -> str:
+    return f"【要約 第{state['revision_count']}版】\n"
+
+
+def node_summarize(state: State, config: Optional[RunnableConfig] = None) -> State:
+    """
+    要約ノード: テキストの要約を生成する
+    """
+    started = time.monotonic()
+    calls = []
+    error_message = ""
+    agent = SummarizerAgent(get_node_client(config), get_node_model(config))
+    state = _start_summarize(state)
+
     try:
-        if state["revision_count"] == 1:
-            state = add_to_dialog_history(
-                state, 
-                "summarizer", 
-                "初回の要約を作成中...",
-                progress=40  # 進捗状況の追加（40%）
-            )
-            yield state
-            summary = agent.call(state["input_text"])
-        else:
-            state = add_to_dialog_history(
-                state, 
-                "summarizer", 
-                f"フィードバックを基に要約を改善中...",
-                progress=40  # 進捗状況の追加（40%）
-            )
-            yield state
-            summary = agent.refine(state["input_text"], state["feedback"])
-        
+        with collect_calls(calls):
+            if stream_text(config):
+                if state["revision_count"] == 1:
+                    deltas = agent.call_stream(state["input_text"])
+                else:
+                    deltas = agent.refine_stream(source_text(state), state["feedback"])
+                summary = stream_message(state, "summarizer", deltas, _summary_header(state), 60, config)
+            else:
+                if state["revision_count"] == 1:
+                    summary = agent.call(state["input_text"])
+                else:
+                    summary = agent.refine(source_text(state), state["feedback"])
+                state = log_message(state, "summarizer", summary, progress=60, header=_summary_header(state))
         state["summary"] = summary
-        
-        # エージェントの応答をログ
-        state = add_to_dialog_history(
-            state, 
-            "summarizer", 
-            f"【要約 第{state['revision_count']}版】\n{summary}",
-            progress=60  # 進捗状況の追加（60%）
-        )
     except Exception as e:
-        # エラーハンドリング
-        error_message = f"要約生成中にエラーが発生しました: {str(e)}"
-        state = add_to_dialog_history(
-            state,
-            "system",
-            error_message,
-            progress=30  # エラー時は進捗を進めない
-        )
-        state["error"] = error_message
-    
-    # 状態を返してUIを更新
-    yield state
-    
+        error_message = _fail(state, f"要約生成中にエラーが発生しました: {str(e)}", progress=30)
+
+    record_node(state, "summarize", started, calls, error_message)
     return state
 
 
-def node_review(state: State) -> Generator[State, None, State]:
+async def anode_summarize(state: State, config: Optional[RunnableConfig] = None) -> State:
     """
-    レビューノード: 要約の品質を評価する
+    要約ノード（非同期版）
     """
-    client = get_client()
-    agent = ReviewerAgent(client)
-    
-    # ワークフロー図の可視化
-    if "current_node" not in state or state["current_node"] != "review":
-        state["current_node"] = "review"
-        # レンダリングはメインスレッドで行う
-    
-    # システムメッセージ
-    state = add_to_dialog_history(
-        state, 
-        "system", 
-        f"批評エージェントが要約レビューを実施",
-        progress=65  # 進捗状況の追加（65%）
-    )
-    
-    # 開始メッセージ
-    state = add_to_dialog_history(
-        state, 
-        "reviewer", 
-        "レビューを実施しています...",
-        progress=70  # 進捗状況の追加（70%）
-    )
-    # 状態を返してUIを更新
-    yield state
-    
-    # レビュー進行中メッセージ
-    state = add_to_dialog_history(
-        state, 
-        "reviewer", 
-        "要約の品質を評価中...",
-        progress=75  # 進捗状況の追加（75%）
-    )
-    yield state
-    
+    started = time.monotonic()
+    calls = []
+    error_message = ""
+    agent = SummarizerAgent(get_node_client(config), get_node_model(config))
+    state = _start_summarize(state)
+
     try:
+        with collect_calls(calls):
+            if state["revision_count"] == 1:
+                summary = await agent.acall(state["input_text"])
+            else:
+                summary = await agent.arefine(source_text(state), state["feedback"])
+        state["summary"] = summary
+        state = log_message(state, "summarizer", summary, progress=60, header=_summary_header(state))
+    except Exception as e:
+        error_message = _fail(state, f"要約生成中にエラーが発生しました: {str(e)}", progress=30)
+
+    record_node(state, "summarize", started, calls, error_message)
+    return state
+
+
+def _is_final_revision(state: State) -> bool:
+    """最大改訂回数に達しているかどうか（このレビューは必ず承認され、タイトル生成に進む）"""
+    return state["revision_count"] >= 3
+
+
+def _start_review(state: State) -> State:
+    """レビューノードの開始処理"""
+    enter_node(state, "review", progress=65)
+    state = log_message(state, "system", "批評エージェントが要約レビューを実施", progress=65)
+    state = log_message(state, "reviewer", "レビューを実施しています...", progress=70)
+    return log_message(state, "reviewer", "要約の品質を評価中...", progress=75)
+
+
+def _review_args(state: State) -> Dict[str, Any]:
+    """
+    批評エージェントに渡す引数
+
+    2回目以降のレビューでは、前回の要約からの変更が小さければ全文の代わりに
+    変更箇所と前回指摘した問題点（issues）だけを渡す。
+    """
+    args = {
+        "current_summary": state["summary"],
+        "previous_summary": state.get("previous_summary", ""),
+        "previous_feedback": state.get("previous_feedback", ""),
         # 最終レビューかどうか
-        is_final_review = (state["revision_count"] >= 3)
-        
-        # レビュー実行
-        feedback = agent.call(
-            current_summary=state["summary"],
-            previous_summary=state.get("previous_summary", ""),
-            previous_feedback=state.get("previous_feedback", ""),
-            is_final_review=is_final_review
-        )
-        
-        state["feedback"] = feedback
-        state["previous_summary"] = state["summary"]
-        state["previous_feedback"] = feedback
-        
-        # フィードバックをログ
-        state = add_to_dialog_history(
-            state,
-            "reviewer",
-            f"【フィードバック】\n{feedback}",
-            progress=80  # 進捗状況の追加（80%）
-        )
-        
-        # 承認判定
-        is_approved = agent.check_approval(feedback, state["revision_count"])
-        state["approved"] = is_approved
-        
-        # 判定結果をログ
-        judge_msg = "承認" if is_approved else "改訂が必要"
-        state = add_to_dialog_history(
-            state,
-            "reviewer",
-            f"【判定】{judge_msg}",
-            progress=85  # 進捗状況の追加（85%）
-        )
+        "is_final_review": _is_final_revision(state),
+        # REVIEW_WITH_SOURCE の場合は要約・改訂・タイトル生成と同じ原文を先頭に置き、キャッシュされた接頭辞を共有する
+        # （既定では原文を送らず、要約とフィードバックだけで評価する）
+        "input_text": source_text(state) if REVIEW_WITH_SOURCE else ""
+    }
+    if INCREMENTAL_REVIEW and args["previous_summary"]:
+        changes = diff_summaries(args["previous_summary"], args["current_summary"], INCREMENTAL_REVIEW_MAX_CHANGE)
+        if changes is not None:
+            args["changes"] = changes
+            args["issues"] = state.get("issues", [])
+    return args
+
+
+def _apply_feedback(state: State, feedback: str) -> None:
+    state["feedback"] = feedback
+    state["previous_summary"] = state["summary"]
+    state["previous_feedback"] = feedback
+
+
+def _finish_review(state: State, is_approved: bool) -> State:
+    """承認判定を状態に記録してログに出す"""
+    state["approved"] = is_approved
+    judge_msg = "承認" if is_approved else "改訂が必要"
+    return log_message(state, "reviewer", f"【判定】{judge_msg}", progress=85)
+
+
+def _review_failed(state: State, e: Exception) -> str:
+    error_message = _fail(state, f"レビュー中にエラーが発生しました: {str(e)}", progress=70)
+    # エラー時はデフォルトで承認として扱い、次のステップに進める
+    state["approved"] = True
+    return error_message
+
+
+# タイトルの先行生成を実行するプロセス共有のスレッドプール
+_speculation_executor = None
+_speculation_executor_lock = threading.Lock()
+
+
+def _get_speculation_executor() -> ThreadPoolExecutor:
+    """タイトルの先行生成用のスレッドプールを取得（同時に実行する数は SPECULATIVE_TITLE_WORKERS まで）"""
+    global _speculation_executor
+    if _speculation_executor is None:
+        with _speculation_executor_lock:
+            if _speculation_executor is None:
+                _speculation_executor = ThreadPoolExecutor(
+                    max_workers=SPECULATIVE_TITLE_WORKERS, thread_name_prefix="speculative-title"
+                )
+    return _speculation_executor
+
+
+def _should_speculate(state: State) -> bool:
+    """レビューと並行してタイトルを先行生成するかどうか"""
+    if state.get("error"):
+        return False
+    return SPECULATIVE_TITLE or _is_final_revision(state)
+
+
+def _speculative_title_args(state: State) -> tuple:
+    """タイトルエージェントに渡す引数（node_title と同じ）"""
+    return source_text(state), state["summary"]
+
+
+def _start_speculative_title(state: State, config: Optional[RunnableConfig]) -> Optional[Tuple[Future, threading.Event]]:
+    """
+    現在の要約のタイトル生成をプロセス共有のスレッドプールで開始する
+
+    Returns:
+        Optional[Tuple[Future, threading.Event]]: {summary, output, calls} を返す Future と、
+            セットするとAPI呼び出しを打ち切るイベント（先行生成しない場合はNone）
+    """
+    if not _should_speculate(state):
+        return None
+    agent = TitleCopywriterAgent(get_node_client(config), get_node_model(config))
+    args = _speculative_title_args(state)
+    cancelled = threading.Event()
+
+    def _run() -> Dict[str, Any]:
+        with collect_calls() as calls:
+            output = agent.call(*args, cancelled=cancelled)
+        return {"summary": args[-1], "output": output, "calls": calls}
+
+    return _get_speculation_executor().submit(_run), cancelled
+
+
+def _emit_discarded_title(future: Future) -> None:
+    """破棄した先行生成のAPI呼び出しを単独の記録としてシンクに送る（使われなかったトークンの把握用）"""
+    if future.cancelled() or future.exception() is not None:
+        return
+    for call in future.result()["calls"]:
+        emit({**call, "speculative": "discarded"})
+
+
+def _finish_speculative_title(state: State, speculation: Optional[Tuple[Future, threading.Event]]) -> None:
+    """承認された場合は先行生成の完了を待って結果を状態に置き、改訂が必要な場合は打ち切って破棄する"""
+    if speculation is None:
+        return
+    future, cancelled = speculation
+    if state.get("approved") and not state.get("error"):
+        try:
+            state["speculative_title"] = future.result()
+        except Exception as e:
+            # 先行生成に失敗した場合はタイトルノードで改めて生成する
+            print(f"タイトルの先行生成に失敗: {str(e)}")
+        return
+    # 開始前なら取り消し、実行中なら再試行をやめ、ヘッダー受信時に本文を読まずにレスポンスを閉じる
+    # （打ち切る前に完了していた場合は、使われなかった呼び出しとして記録する）
+    cancelled.set()
+    if not future.cancel():
+        future.add_done_callback(_emit_discarded_title)
+
+
+def _astart_speculative_title(state: State, config: Optional[RunnableConfig]) -> Optional[asyncio.Task]:
+    """現在の要約のタイトル生成をタスクとして開始する（_start_speculative_title の非同期版）"""
+    if not _should_speculate(state):
+        return None
+    agent = TitleCopywriterAgent(get_node_client(config), get_node_model(config))
+    args = _speculative_title_args(state)
+
+    async def _run() -> Dict[str, Any]:
+        with collect_calls() as calls:
+            output = await agent.acall(*args)
+        return {"summary": args[-1], "output": output, "calls": calls}
+
+    return asyncio.ensure_future(_run())
+
+
+async def _afinish_speculative_title(state: State, task: Optional[asyncio.Task]) -> None:
+    """承認された場合は先行生成の結果を状態に置き、改訂が必要な場合はキャンセルする"""
+    if task is None:
+        return
+    if state.get("approved") and not state.get("error"):
+        try:
+            state["speculative_title"] = await task
+        except Exception as e:
+            print(f"タイトルの先行生成に失敗: {str(e)}")
+        return
+    task.cancel()
+
+
+def node_review(state: State, config: Optional[RunnableConfig] = None) -> State:
+    """
+    レビューノード: 要約の品質を評価する
+    """
+    started = time.monotonic()
+    calls = []
+    error_message = ""
+    agent = ReviewerAgent(get_node_client(config), get_node_model(config))
+    state = _start_review(state)
+    # 承認された場合に備えてタイトルを並行して生成しておく
+    speculation = _start_speculative_title(state, config)
+
+    try:
+        with collect_calls(calls):
+            if STRUCTURED_REVIEW:
+                # 批評と承認判定を1回の呼び出しで取得
+                review = agent.review(revision_count=state["revision_count"], **_review_args(state))
+                feedback = review["feedback"]
+                state["issues"] = review["issues"]
+                state = log_message(state, "reviewer", feedback, progress=80, header="【フィードバック】\n")
+            elif stream_text(config):
+                deltas = agent.call_stream(**_review_args(state))
+                feedback = stream_message(state, "reviewer", deltas, "【フィードバック】\n", 80, config)
+            else:
+                feedback = agent.call(**_review_args(state))
+                state = log_message(state, "reviewer", feedback, progress=80, header="【フィードバック】\n")
+            _apply_feedback(state, feedback)
+
+            # 承認判定
+            if STRUCTURED_REVIEW:
+                is_approved = review["approved"]
+            else:
+                is_approved = agent.check_approval(feedback, state["revision_count"])
+        state = _finish_review(state, is_approved)
+    except Exception as e:
+        error_message = _review_failed(state, e)
+    _finish_speculative_title(state, speculation)
+
+    record_node(state, "review", started, calls, error_message)
+    return state
+
+
+async def anode_review(state: State, config: Optional[RunnableConfig] = None) -> State:
+    """
+    レビューノード（非同期版）
+    """
+    started = time.monotonic()
+    calls = []
+    error_message = ""
+    agent = ReviewerAgent(get_node_client(config), get_node_model(config))
+    state = _start_review(state)
+    speculation = _astart_speculative_title(state, config)
+
+    try:
+        with collect_calls(calls):
+            if STRUCTURED_REVIEW:
+                review = await agent.areview(revision_count=state["revision_count"], **_review_args(state))
+                feedback = review["feedback"]
+                state["issues"] = review["issues"]
+            else:
+                feedback = await agent.acall(**_review_args(state))
+            state = log_message(state, "reviewer", feedback, progress=80, header="【フィードバック】\n")
+            _apply_feedback(state, feedback)
+
+            if STRUCTURED_REVIEW:
+                is_approved = review["approved"]
+            else:
+                is_approved = await agent.acheck_approval(feedback, state["revision_count"])
+        state = _finish_review(state, is_approved)
     except Exception as e:
-        # エラーハンドリング
-        error_message = f"レビュー中にエラーが発生しました: {str(e)}"
-        state = add_to_dialog_history(
-            state,
-            "system",
-            error_message,
-            progress=70  # エラー時は進捗を進めない
-        )
-        state["error"] = error_message
-        # エラー時はデフォルトで承認として扱い、次のステップに進める
-        state["approved"] = True
-    
-    # 状態を返してUIを更新
-    yield state
-    
+        error_message = _review_failed(state, e)
+    await _afinish_speculative_title(state, speculation)
+
+    record_node(state, "review", started, calls, error_message)
     return state
 
 
-def node_title(state: State) -> Generator[State, None, State]:
+def _start_title(state: State) -> State:
+    """タイトルノードの開始処理"""
+    enter_node(state, "title_node", progress=87)
+    state = log_message(state, "system", "タイトル命名エージェントがタイトルを生成します", progress=87)
+    state = log_message(state, "title", "タイトルを生成しています...", progress=90)
+    return log_message(state, "title", "要約内容からタイトルを検討中...", progress=93)
+
+
+def _finish_title(state: State, output: Dict[str, Any]) -> State:
+    """生成したタイトルを状態に記録して完了メッセージを出す"""
+    state["title"] = output.get("title", "")
+    state["final_summary"] = output.get("summary", "")
+    state = log_message(state, "title", f"【生成タイトル】『{state['title']}』", progress=96)
+    return log_message(state, "system", "すべての処理が完了しました。", progress=100)
+
+
+def _title_failed(state: State, e: Exception) -> str:
+    error_message = _fail(state, f"タイトル生成中にエラーが発生しました: {str(e)}", progress=90)
+    # エラー時もタイトルとサマリーをデフォルト値で設定
+    state["title"] = "エラーが発生しました"
+    state["final_summary"] = state.get("summary", "要約が生成できませんでした。")
+    log_message(state, "system", "エラーが発生しましたが、処理を完了します。", progress=100)  # エラー時も完了として扱う
+    return error_message
+
+
+def _take_speculative_title(state: State) -> Optional[Dict[str, Any]]:
+    """レビューと並行して生成したタイトルを取り出す（現在の要約に対するものでなければ None）"""
+    speculative = state.get("speculative_title")
+    state["speculative_title"] = None
+    if speculative is None or speculative["summary"] != state["summary"]:
+        return None
+    return speculative
+
+
+def node_title(state: State, config: Optional[RunnableConfig] = None) -> State:
     """
     タイトルノード: タイトルのみを生成する（要約はそのまま使用）
     """
-    client = get_client()
-    agent = TitleCopywriterAgent(client)
-    
-    # ワークフロー図の可視化
-    if "current_node" not in state or state["current_node"] != "title_node":
-        state["current_node"] = "title_node"
-        # レンダリングはメインスレッドで行う
-    
-    # システムメッセージ
-    state = add_to_dialog_history(
-        state, 
-        "system", 
-        "タイトル命名エージェントがタイトルを生成します",
-        progress=87  # 進捗状況の追加（87%）
-    )
-    
-    # 開始メッセージ
-    state = add_to_dialog_history(
-        state, 
-        "title", 
-        "タイトルを生成しています...",
-        progress=90  # 進捗状況の追加（90%）
-    )
-    # 状態を返してUIを更新
-    yield state
-    
-    # 進捗メッセージ追加
-    state = add_to_dialog_history(
-        state, 
-        "title", 
-        "要約内容からタイトルを検討中...",
-        progress=93  # 進捗状況の追加（93%）
-    )
-    yield state
-    
+    started = time.monotonic()
+    calls = []
+    error_message = ""
+    agent = TitleCopywriterAgent(get_node_client(config), get_node_model(config))
+    state = _start_title(state)
+
     try:
-        # タイトル生成
-        output = agent.call(state["input_text"], state.get("transcript", []), state["summary"])
-        
-        state["title"] = output.get("title", "")
-        state["final_summary"] = output.get("summary", "")
-        
-        # タイトル生成結果
-        state = add_to_dialog_history(
-            state,
-            "title",
-            f"【生成タイトル】『{state['title']}』",
-            progress=96  # 進捗状況の追加（96%）
-        )
-        
-        # 処理完了
-        state = add_to_dialog_history(
-            state, 
-            "system", 
-            "すべての処理が完了しました。",
-            progress=100  # 進捗状況の追加（100%）
-        )
+        speculative = _take_speculative_title(state)
+        if speculative is not None:
+            # レビュー中に生成済みのタイトルを使う（API呼び出しはその時の記録をこのノードに計上する）
+            calls.extend(speculative["calls"])
+            output = speculative["output"]
+        else:
+            with collect_calls(calls):
+                output = agent.call(source_text(state), state["summary"])
+        state = _finish_title(state, output)
+    except Exception as e:
+        error_message = _title_failed(state, e)
+
+    record_node(state, "title_node", started, calls, error_message)
+    enter_node(state, "END", progress=100)
+    return state
+
+
+async def anode_title(state: State, config: Optional[RunnableConfig] = None) -> State:
+    """
+    タイトルノード（非同期版）
+    """
+    started = time.monotonic()
+    calls = []
+    error_message = ""
+    agent = TitleCopywriterAgent(get_node_client(config), get_node_model(config))
+    state = _start_title(state)
+
+    try:
+        speculative = _take_speculative_title(state)
+        if speculative is not None:
+            calls.extend(speculative["calls"])
+            output = speculative["output"]
+        else:
+            with collect_calls(calls):
+                output = await agent.acall(source_text(state), state["summary"])
+        state = _finish_title(state, output)
     except Exception as e:
-        # エラーハンドリング
-        error_message = f"タイトル生成中にエラーが発生しました: {str(e)}"
-        state = add_to_dialog_history(
-            state,
-            "system",
-            error_message,
-            progress=90  # エラー時は進捗を進めない
-        )
-        state["error"] = error_message
-        # エラー時もタイトルとサマリーをデフォルト値で設定
-        state["title"] = "エラーが発生しました"
-        state["final_summary"] = state.get("summary", "要約が生成できませんでした。")
-        
-        # エラー完了メッセージ
-        state = add_to_dialog_history(
-            state, 
-            "system", 
-            "エラーが発生しましたが、処理を完了します。",
-            progress=100  # エラー時も完了として扱う
-        )
-    
-    # 状態を返してUIを更新
-    yield state
-    
-    # 完了状態に移行
-    state["current_node"] = "END"
-    # レンダリングはメインスレッドで行うため、ここでは状態設定のみを行う
-    
+        error_message = _title_failed(state, e)
+
+    record_node(state, "title_node", started, calls, error_message)
+    enter_node(state, "END", progress=100)
     return state
 
 
+def select_mode(state: State) -> str:
+    """
+    入力の長さに応じて最初のノードを決定する条件分岐関数
+
+    LONG_INPUT_THRESHOLD 文字を超える入力は分割して要約する（map-reduce）。
+
+    Returns:
+        str: 次のノード名
+    """
+    if len(state["input_text"]) > LONG_INPUT_THRESHOLD:
+        return "split"
+    return "summarize"
+
+
+def node_split(state: State, config: Optional[RunnableConfig] = None) -> State:
+    """
+    分割ノード: 長文を文・段落の境界でチャンクに分割する
+    """
+    enter_node(state, "summarize", progress=10)
+    state["chunks"] = split_text(state["input_text"], CHUNK_SIZE, CHUNK_OVERLAP)
+
+    state = log_message(state, "system", f"長文のため{len(state['chunks'])}個の部分に分割して要約します", progress=10)
+    return log_message(state, "summarizer", "各部分の要約を並列に作成中...", progress=20)
+
+
+def fan_out_chunks(state: State) -> List[Send]:
+    """
+    チャンクごとに部分要約ノードを並列に起動する
+
+    Returns:
+        List[Send]: チャンクごとの部分要約ノードへの送信
+    """
+    total = len(state["chunks"])
+    return [
+        Send("summarize_chunk", {"run_id": state.get("run_id", ""), "chunk": chunk, "index": i, "total": total})
+        for i, chunk in enumerate(state["chunks"])
+    ]
+
+
+def _partial(task: Dict[str, Any], level: int, index: int, node: str, started: float, calls: List[Dict[str, Any]], summary: str) -> Dict[str, Any]:
+    """
+    部分要約ノードの戻り値を作成
+
+    並列に実行されるため状態全体は返さず、部分要約だけを返してリデューサーでまとめる。
+    実行記録も部分要約に持たせ、node_finalize_long で state["metrics"] に移す。
+    """
+    record = record_node({"run_id": task["run_id"]}, node, started, calls)
+    return {"partial_summaries": [{"level": level, "index": index, "summary": summary, "metrics": record}]}
+
+
+def node_summarize_chunk(task: Dict[str, Any], config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+    """
+    部分要約ノード: 1つのチャンクを要約する（fan_out_chunks から並列に起動される）
+    """
+    started = time.monotonic()
+    calls = []
+    agent = SummarizerAgent(get_node_client(config), get_node_model(config))
+    with collect_calls(calls):
+        summary = agent.summarize_chunk(task["chunk"], task["index"], task["total"])
+    return _partial(task, 0, task["index"], "summarize_chunk", started, calls, summary)
+
+
+async def anode_summarize_chunk(task: Dict[str, Any], config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+    """部分要約ノード（非同期版）"""
+    started = time.monotonic()
+    calls = []
+    agent = SummarizerAgent(get_node_client(config), get_node_model(config))
+    with collect_calls(calls):
+        summary = await agent.asummarize_chunk(task["chunk"], task["index"], task["total"])
+    return _partial(task, 0, task["index"], "summarize_chunk", started, calls, summary)
+
+
+def node_combine_group(task: Dict[str, Any], config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+    """
+    統合ノード: 部分要約のグループを1つの要約に統合する（route_partials から並列に起動される）
+    """
+    started = time.monotonic()
+    calls = []
+    agent = SummarizerAgent(get_node_client(config), get_node_model(config))
+    with collect_calls(calls):
+        summary = agent.combine(task["summaries"])
+    return _partial(task, task["level"], task["index"], "combine", started, calls, summary)
+
+
+async def anode_combine_group(task: Dict[str, Any], config: Optional[RunnableConfig] = None) -> Dict[str, Any]:
+    """統合ノード（非同期版）"""
+    started = time.monotonic()
+    calls = []
+    agent = SummarizerAgent(get_node_client(config), get_node_model(config))
+    with collect_calls(calls):
+        summary = await agent.acombine(task["summaries"])
+    return _partial(task, task["level"], task["index"], "combine", started, calls, summary)
+
+
+def _top_level(partials: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """最も統合が進んだ段階の部分要約を順に返す"""
+    level = max(item["level"] for item in partials)
+    return [item for item in partials if item["level"] == level]
+
+
+def node_merge(state: State, config: Optional[RunnableConfig] = None) -> State:
+    """
+    集約ノード: 並列に作成された部分要約がそろったことを記録する
+    """
+    top = _top_level(state["partial_summaries"])
+    if len(top) > 1:
+        state = log_message(state, "summarizer", f"{len(top)}個の部分要約を統合中...", progress=40)
+    return state
+
+
+def route_partials(state: State) -> Any:
+    """
+    部分要約が1つにまとまるまで REDUCE_FAN_IN 個ずつ統合ノードを並列に起動する条件分岐関数
+
+    Returns:
+        Any: 統合ノードへの送信のリスト、またはまとまった場合は次のノード名
+    """
+    top = _top_level(state["partial_summaries"])
+    if len(top) == 1:
+        return "finalize_long"
+
+    level = top[0]["level"] + 1
+    return [
+        Send("combine", {
+            "run_id": state.get("run_id", ""),
+            "summaries": [item["summary"] for item in top[start:start + REDUCE_FAN_IN]],
+            "level": level,
+            "index": start // REDUCE_FAN_IN
+        })
+        for start in range(0, len(top), REDUCE_FAN_IN)
+    ]
+
+
+def node_finalize_long(state: State, config: Optional[RunnableConfig] = None) -> State:
+    """
+    長文要約の確定ノード: 統合した要約を第1版とし、以降の改訂で使う原文の代わりを用意する
+    """
+    partials = state["partial_summaries"]
+    state["revision_count"] += 1
+    state["summary"] = _top_level(partials)[0]["summary"]
+
+    # 改訂・タイトル生成では、入力の上限に収まる最も詳しい段階の部分要約を原文の代わりに使う
+    levels = sorted({item["level"] for item in partials})
+    for level in levels:
+        condensed = "\n\n".join(item["summary"] for item in partials if item["level"] == level)
+        if len(condensed) <= LONG_INPUT_THRESHOLD:
+            break
+    state["condensed_input"] = condensed
+
+    # 並列ノードの実行記録を状態に移す
+    state.setdefault("metrics", []).extend(item["metrics"] for item in partials if item.get("metrics"))
+    state["partial_summaries"] = [
+        {key: value for key, value in item.items() if key != "metrics"}
+        for item in partials
+    ]
+    state["chunks"] = []
+
+    return log_message(state, "summarizer", state["summary"], progress=60, header=_summary_header(state))
+
+
 def should_revise(state: State) -> str:
     """
     批評に基づいて次のステップを決定する条件分岐関数
-    
+
     Args:
         state: 現在の状態
-        
+
     Returns:
         str: 次のノード名
     """
     # エラーが発生した場合は直接タイトル生成へ進む
-    if "error" in state:
+    if state.get("error"):
         return "title_node"
-        
+
     # 最大改訂回数を超えている場合は次のステップへ
-    if state["revision_count"] >= 3:
+    if _is_final_revision(state):
         return "title_node"
-    
+
     # 承認されていない場合は要約をやり直す
     if not state.get("approved", False):
         return "summarize"
-    
+
     # 承認された場合はタイトル生成へ進む
     return "title_node"
@@ -0,0 +1,255 @@
+import uuid
+import asyncio
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from typing import Dict, Any, Optional, List, Iterator, AsyncIterator
+from agents import get_prompt_version
+from config.settings import EXAMPLE_TEXTS
+from graph.workflow import get_workflow_graph
+from utils.api_client import DeepseekAPI
+from utils.checkpoint import make_run_key
+from utils.result_cache import WorkflowResultCache
+from utils.state import State, create_initial_state
+
+
+def _get_cached_result(
+    input_text: str,
+    model: str,
+    result_cache: Optional[WorkflowResultCache],
+    prompt_version: str
+) -> Optional[Dict[str, Any]]:
+    """キャッシュ済みの結果を取得（存在しない場合はNone）"""
+    if result_cache is None:
+        return None
+    cached = result_cache.get(input_text, model, prompt_version)
+    if cached is not None:
+        cached["input_text"] = input_text
+        cached["from_cache"] = True
+    return cached
+
+
+def workflow_config(
+    client: DeepseekAPI,
+    thread_id: str,
+    model: Optional[str] = None,
+    **configurable
+) -> Dict[str, Any]:
+    """
+    グラフの実行に渡す config を作成
+
+    Args:
+        client: API呼び出しを行うクライアント
+        thread_id: チェックポイントのスレッドID（チェックポインターがない場合は使われない）
+        model: 使用するモデル名（省略時はクライアントの既定のモデル）
+        **configurable: その他の設定（stream_text, should_stop など）
+    """
+    return {"configurable": {"api_client": client, "thread_id": thread_id, "model": model or client.model, **configurable}}
+
+
+@contextmanager
+def workflow_thread(graph, input_text: str, model: str, prompt_version: str) -> Iterator[str]:
+    """
+    1回の実行に使うチェックポイントのスレッドIDを確保
+
+    スレッドIDは実行ごとに発行するため、同じ入力の実行が同時にあってもスレッドを共有しない。
+    チェックポインターが同じ入力・モデル・プロンプトで中断した実行を占有できた場合は、
+    そのスレッドIDを返して続きから再開させる（workflow_input が None を返す）。
+    終了時、最後まで完了していればスレッドを削除し、中断していれば次の実行が再開できるよう解放する。
+
+    Args:
+        graph: コンパイル済みのグラフ
+        input_text: 要約対象のテキスト
+        model: 使用するモデル名
+        prompt_version: プロンプトのバージョン
+
+    Yields:
+        str: チェックポイントのスレッドID
+    """
+    claim_run = getattr(graph.checkpointer, "claim_run", None)
+    if claim_run is None:
+        yield uuid.uuid4().hex
+        return
+    thread_id, token, _ = claim_run(make_run_key(input_text, model, prompt_version))
+    try:
+        yield thread_id
+    finally:
+        finished = False
+        try:
+            snapshot = graph.get_state({"configurable": {"thread_id": thread_id}})
+            finished = bool(snapshot.values) and not snapshot.next
+        except Exception as e:
+            # 状態を読めない場合も占有は必ず外す（中断した実行として残す）
+            print(f"チェックポイントの状態の取得に失敗: {str(e)}")
+        graph.checkpointer.release_run(thread_id, token, finished)
+
+
+@asynccontextmanager
+async def aworkflow_thread(graph, input_text: str, model: str, prompt_version: str) -> AsyncIterator[str]:
+    """
+    workflow_thread の非同期版
+
+    SQLiteへの書き込みを伴う確保・解放はスレッドで実行し、イベントループを止めない。
+    """
+    claim_run = getattr(graph.checkpointer, "claim_run", None)
+    if claim_run is None:
+        yield uuid.uuid4().hex
+        return
+    thread_id, token, _ = await asyncio.to_thread(claim_run, make_run_key(input_text, model, prompt_version))
+    try:
+        yield thread_id
+    finally:
+        finished = False
+        try:
+            snapshot = await graph.aget_state({"configurable": {"thread_id": thread_id}})
+            finished = bool(snapshot.values) and not snapshot.next
+        except Exception as e:
+            print(f"チェックポイントの状態の取得に失敗: {str(e)}")
+        await asyncio.to_thread(graph.checkpointer.release_run, thread_id, token, finished)
+
+
+def _discard_finished_thread(graph, config: Dict[str, Any]) -> None:
+    """完了済みの実行のチェックポイントを削除（部分要約などが新しい実行に混ざらないようにする）"""
+    delete_thread = getattr(graph.checkpointer, "delete_thread", None)
+    if delete_thread is not None:
+        delete_thread(config["configurable"]["thread_id"])
+
+
+def workflow_input(graph, input_text: str, config: Dict[str, Any]) -> Optional[State]:
+    """
+    グラフに渡す入力を決定
+
+    チェックポインターがあり、workflow_thread が確保したスレッドに途中で中断した実行が残っていれば None を返す
+    （None を入力にすると、最後に完了したノードの次から再開される）。
+    それ以外は新しい初期状態を返す。
+
+    Returns:
+        Optional[State]: 初期状態、または再開する場合はNone
+    """
+    if graph.checkpointer is not None:
+        snapshot = graph.get_state(config)
+        if snapshot.next:
+            return None
+        if snapshot.values:
+            _discard_finished_thread(graph, config)
+    return create_initial_state(input_text)
+
+
+async def aworkflow_input(graph, input_text: str, config: Dict[str, Any]) -> Optional[State]:
+    """workflow_input の非同期版"""
+    if graph.checkpointer is not None:
+        snapshot = await graph.aget_state(config)
+        if snapshot.next:
+            return None
+        if snapshot.values:
+            _discard_finished_thread(graph, config)
+    return create_initial_state(input_text)
+
+
+def run_workflow(
+    input_text: str,
+    client: DeepseekAPI,
+    result_cache: Optional[WorkflowResultCache] = None,
+    graph=None,
+    model: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    要約 → レビュー →（改訂）→ タイトル生成のワークフローを最後まで実行
+    
+    result_cache が指定されていれば先に参照し、同じ入力・モデル・プロンプトの結果があれば
+    エージェントを呼ばずにそのまま返す（"from_cache": True が付与される）。
+    チェックポイントが有効な場合、同じ入力・モデル・プロンプトで中断した実行があれば続きから再開する。
+    
+    Args:
+        input_text: 要約対象のテキスト
+        client: API呼び出しを行うクライアント
+        result_cache: ワークフロー結果のキャッシュ
+        graph: コンパイル済みのグラフ（省略時はプロセス共有のグラフ）
+        model: 使用するモデル名（省略時はクライアントの既定のモデル）
+        
+    Returns:
+        Dict[str, Any]: 最終状態（title, final_summary, dialog_history などを含む）
+    """
+    model = model or client.model
+    prompt_version = get_prompt_version()
+    cached = _get_cached_result(input_text, model, result_cache, prompt_version)
+    if cached is not None:
+        return cached
+    
+    graph = graph or get_workflow_graph()
+    with workflow_thread(graph, input_text, model, prompt_version) as thread_id:
+        config = workflow_config(client, thread_id, model)
+        final_state = graph.invoke(workflow_input(graph, input_text, config), config=config)
+    
+    # エラーで終了した結果は再利用しない
+    if result_cache is not None and not final_state.get("error"):
+        result_cache.set(input_text, model, prompt_version, final_state)
+    return final_state
+
+
+async def arun_workflow(
+    input_text: str,
+    client: DeepseekAPI,
+    result_cache: Optional[WorkflowResultCache] = None,
+    graph=None,
+    model: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    ワークフローを非同期に最後まで実行（run_workflow の非同期版）
+    
+    Args:
+        input_text: 要約対象のテキスト
+        client: API呼び出しを行うクライアント
+        result_cache: ワークフロー結果のキャッシュ
+        graph: コンパイル済みのグラフ（省略時はプロセス共有のグラフ）
+        model: 使用するモデル名（省略時はクライアントの既定のモデル）
+        
+    Returns:
+        Dict[str, Any]: 最終状態（title, final_summary, dialog_history などを含む）
+    """
+    model = model or client.model
+    prompt_version = get_prompt_version()
+    cached = _get_cached_result(input_text, model, result_cache, prompt_version)
+    if cached is not None:
+        return cached
+    
+    graph = graph or get_workflow_graph()
+    async with aworkflow_thread(graph, input_text, model, prompt_version) as thread_id:
+        config = workflow_config(client, thread_id, model)
+        final_state = await graph.ainvoke(await aworkflow_input(graph, input_text, config), config=config)
+    
+    if result_cache is not None and not final_state.get("error"):
+        result_cache.set(input_text, model, prompt_version, final_state)
+    return final_state
+
+
+def prewarm_example_results(
+    client: DeepseekAPI,
+    result_cache: WorkflowResultCache,
+    texts: Optional[List[str]] = None
+) -> threading.Thread:
+    """
+    例文のワークフロー結果をバックグラウンドで用意
+    
+    キャッシュ済みの例文は run_workflow 内で即座に返るため、API呼び出しは発生しない。
+    
+    Args:
+        client: API呼び出しを行うクライアント
+        result_cache: 結果を格納するキャッシュ
+        texts: 対象のテキスト（省略時は設定の例文）
+        
+    Returns:
+        threading.Thread: 開始したスレッド
+    """
+    # 先頭は「例文を選択してください...」のプレースホルダー
+    texts = texts if texts is not None else EXAMPLE_TEXTS[1:]
+    
+    def _prewarm():
+        for text in texts:
+            try:
+                run_workflow(text, client, result_cache)
+            except Exception as e:
+                print(f"例文結果の事前生成に失敗: {str(e)}")
+    
+    thread = threading.Thread(target=_prewarm, daemon=True)
+    thread.start()
+    return thread
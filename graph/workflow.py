@@ -1,28 +1,65 @@
+import threading
 from langgraph.graph import StateGraph, START, END
-from langgraph.checkpoint.memory import MemorySaver
+from langgraph.utils.runnable import RunnableCallable
+from utils.checkpoint import get_checkpointer
 from utils.state import State
-from graph.nodes import node_summarize, node_review, node_title, should_revise
+from graph.nodes import (
+    node_summarize, anode_summarize, node_review, anode_review, node_title, anode_title, should_revise,
+    select_mode, node_split, fan_out_chunks, node_summarize_chunk, anode_summarize_chunk,
+    node_combine_group, anode_combine_group, node_merge, route_partials, node_finalize_long
+)
 
+_shared_graph = None
+_shared_graph_lock = threading.Lock()
 
-def create_workflow_graph():
+
+def create_workflow_graph(checkpointer=None):
     """
     ワークフローグラフを作成
-    
+
+    API呼び出しを行うノードは同期版と非同期版を持ち、invoke / stream では同期版、
+    ainvoke / astream では非同期版がイベントループ上で直接実行される。
+
+    Args:
+        checkpointer: ノードごとの状態を保存するチェックポインター（指定した場合は
+            config["configurable"]["thread_id"] が必要）
+
     Returns:
         compiled_graph: コンパイル済みのグラフオブジェクト
     """
     # グラフビルダーの初期化
     builder = StateGraph(State)
-    
+
     # ノードの追加
-    builder.add_node("summarize", node_summarize)
-    builder.add_node("review", node_review)
-    builder.add_node("title_node", node_title)
-    
+    builder.add_node("summarize", RunnableCallable(node_summarize, anode_summarize, name="summarize"))
+    builder.add_node("review", RunnableCallable(node_review, anode_review, name="review"))
+    builder.add_node("title_node", RunnableCallable(node_title, anode_title, name="title_node"))
+
+    # 長文用のノード（分割 → 部分要約を並列に作成 → 段階的に統合）
+    builder.add_node("split", node_split)
+    builder.add_node("summarize_chunk", RunnableCallable(node_summarize_chunk, anode_summarize_chunk, name="summarize_chunk"))
+    builder.add_node("combine", RunnableCallable(node_combine_group, anode_combine_group, name="combine"))
+    builder.add_node("merge", node_merge)
+    builder.add_node("finalize_long", node_finalize_long)
+
     # エッジの定義
-    builder.add_edge(START, "summarize")
+    builder.add_conditional_edges(
+        START,
+        select_mode,
+        {
+            "summarize": "summarize",  # 通常の入力
+            "split": "split"  # 長文の入力
+        }
+    )
     builder.add_edge("summarize", "review")
-    
+
+    # 長文の場合は部分要約が1つにまとまるまで統合を繰り返し、第1版としてレビューへ
+    builder.add_conditional_edges("split", fan_out_chunks, ["summarize_chunk"])
+    builder.add_edge("summarize_chunk", "merge")
+    builder.add_edge("combine", "merge")
+    builder.add_conditional_edges("merge", route_partials, ["combine", "finalize_long"])
+    builder.add_edge("finalize_long", "review")
+
     # 条件分岐のエッジを追加
     builder.add_conditional_edges(
         "review",
@@ -32,11 +69,25 @@ def create_workflow_graph():
             "title_node": "title_node"  # 要約が承認された場合
         }
     )
-    
+
     # 最後のノードから終了へのエッジ
     builder.add_edge("title_node", END)
-    
-    # チェックポインターなしでコンパイル
-    compiled_graph = builder.compile()
-    
+
+    compiled_graph = builder.compile(checkpointer=checkpointer)
+
     return compiled_graph
+
+
+def get_workflow_graph():
+    """
+    プロセス共有のコンパイル済みグラフを取得（初回のみコンパイル）
+
+    コンパイル済みのグラフは状態を持たないため、スレッドやセッションをまたいで同時に実行できる。
+    チェックポイントが有効な場合（utils.checkpoint.get_checkpointer）はSQLiteのチェックポインターを付ける。
+    """
+    global _shared_graph
+    if _shared_graph is None:
+        with _shared_graph_lock:
+            if _shared_graph is None:
+                _shared_graph = create_workflow_graph(get_checkpointer())
+    return _shared_graph
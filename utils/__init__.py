@@ -1,12 +1,22 @@
-from utils.state import create_initial_state
-from utils.theme import apply_theme_styles
-from utils.api_client import get_client, initialize_client, update_model, get_available_models
-
-__all__ = [
-    'create_initial_state', 
-    'apply_theme_styles', 
-    'get_client', 
-    'initialize_client', 
-    'update_model',
-    'get_available_models'
-]
+# utils はエンジン（api_client, state, キャッシュ）とUI用のモジュール（theme, session）を含む。
+# エンジンだけを使う場合に Streamlit を読み込まないよう、再エクスポートは参照時に遅延して行う。
+import importlib
+
+_EXPORTS = {
+    'create_initial_state': 'utils.state',
+    'apply_theme_styles': 'utils.theme',
+    'get_client': 'utils.session',
+    'initialize_client': 'utils.session',
+    'update_model': 'utils.session',
+    'get_available_models': 'utils.api_client',
+    'create_client': 'utils.api_client',
+    'get_shared_client': 'utils.api_client'
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module 'utils' has no attribute '{name}'")
+    return getattr(importlib.import_module(_EXPORTS[name]), name)
@@ -1,10 +1,28 @@
 import os
+import time
+import random
+import asyncio
+import threading
+import weakref
+import httpx
 import requests
 import json
-import streamlit as st
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from requests.adapters import HTTPAdapter
 from urllib3.exceptions import InsecureRequestWarning
 import urllib3
 from dotenv import load_dotenv
+from config.settings import (
+    DEFAULT_API_ENDPOINT, DEFAULT_TIMEOUT, DEFAULT_CONNECT_TIMEOUT,
+    HTTP_POOL_SIZE, HTTP_PREWARM_CONNECTIONS, ASYNC_MAX_CONCURRENCY, LLM_CACHE_ENABLED,
+    API_MAX_RETRIES, API_BACKOFF_BASE, API_BACKOFF_MAX,
+    API_HEDGE_ENABLED, API_HEDGE_PERCENTILE, API_HEDGE_MIN_DELAY
+)
+from utils.llm_cache import LLMCache, make_cache_key, get_llm_cache
+from utils.rate_limit import RateLimiter, estimate_tokens, get_rate_limiter
+from utils.resilience import LatencyTracker, CircuitBreaker, get_latency_tracker, get_circuit_breaker
+from utils.metrics import record_call
 load_dotenv()
 urllib3.disable_warnings(InsecureRequestWarning)
 
@@ -14,28 +32,251 @@ AVAILABLE_MODELS = {
     "deepseek-reasoner": "Deepseek R1"
 }
 
+# 一時的なエラーとして再試行するステータスコード
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+# プロセス全体で共有するHTTPセッション（コネクションプール）
+_http_session = None
+_http_session_lock = threading.Lock()
+_prewarm_started = False
+
+# ヘッジ付きの同期呼び出しで使う、プロセス共有のスレッドプール（スレッド数ごと）
+_hedge_executors = {}
+_hedge_executor_lock = threading.Lock()
+
+# イベントループ毎の非同期HTTPクライアントと同時実行数リミッター
+# （httpx.AsyncClient と asyncio.Semaphore は生成したループに紐づくため）
+_async_transports = weakref.WeakKeyDictionary()
+
+
+def get_http_session(pool_size: int = HTTP_POOL_SIZE) -> requests.Session:
+    """
+    プロセス共有のkeep-alive HTTPセッションを取得
+    
+    requests.Session はリクエスト送信に関してスレッド間で共有でき、
+    urllib3 のコネクションプールが接続の再利用を担う。
+    ヘッダーはクライアント毎にリクエスト単位で渡すため、セッションには保持しない。
+    
+    Args:
+        pool_size: 1ホストあたりに保持する最大コネクション数（初回生成時のみ有効）
+    """
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                session = requests.Session()
+                # pool_block=True: プール上限を超えた場合は新規接続を作って捨てるのではなく空きを待つ
+                adapter = HTTPAdapter(
+                    pool_connections=4,
+                    pool_maxsize=pool_size,
+                    pool_block=True
+                )
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                session.headers["Connection"] = "keep-alive"
+                _http_session = session
+    return _http_session
+
+
+def get_async_transport(max_concurrency: int = ASYNC_MAX_CONCURRENCY):
+    """
+    実行中のイベントループに対応する非同期HTTPクライアントとリミッターを取得
+    
+    同じループ上の全てのワークフローで1つのコネクションプールとセマフォを共有し、
+    送信中のリクエスト数を max_concurrency 以下に抑える。
+    コネクションプールも同じ上限で確保するため、セマフォを通過したリクエストは
+    プールの空きを待たずに送信できる。
+    
+    Args:
+        max_concurrency: 同時に送信するリクエストの上限（初回生成時のみ有効）
+        
+    Returns:
+        tuple: (httpx.AsyncClient, asyncio.Semaphore)
+    """
+    loop = asyncio.get_running_loop()
+    transport = _async_transports.get(loop)
+    if transport is None:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency),
+            verify=False,  # 開発環境のみ
+            headers={"Connection": "keep-alive"}
+        )
+        transport = (client, asyncio.Semaphore(max_concurrency))
+        _async_transports[loop] = transport
+    return transport
+
+
+async def aclose_async_transport():
+    """実行中のイベントループに対応する非同期HTTPクライアントを閉じる"""
+    transport = _async_transports.pop(asyncio.get_running_loop(), None)
+    if transport is not None:
+        await transport[0].aclose()
+
+
+class APIError(Exception):
+    """API呼び出しのエラー（再試行の可否と Retry-After を保持）"""
+    
+    def __init__(self, message, status_code=None, retryable=False, retry_after=None):
+        """
+        初期化
+        
+        Args:
+            message: エラーメッセージ
+            status_code: HTTPステータスコード（通信エラーの場合はNone）
+            retryable: 再試行で回復する可能性があるかどうか
+            retry_after: サーバーが指定した再試行までの待ち時間（秒）
+        """
+        super().__init__(message)
+        self.status_code = status_code
+        self.retryable = retryable
+        self.retry_after = retry_after
+    
+    @classmethod
+    def from_response(cls, status_code, headers, text):
+        """エラーレスポンスから作成"""
+        return cls(
+            f"API呼び出しエラー: APIエラー: ステータスコード {status_code}, レスポンス: {text}",
+            status_code=status_code,
+            retryable=status_code in RETRYABLE_STATUS_CODES,
+            retry_after=parse_retry_after(headers.get("Retry-After"))
+        )
+    
+    @classmethod
+    def from_exception(cls, error, retryable=False):
+        """通信エラーなどの例外から作成"""
+        # httpx の一部の例外はメッセージが空のため、型名で補う
+        return cls(f"API呼び出しエラー: {str(error) or type(error).__name__}", retryable=retryable)
+
+
+def parse_retry_after(value):
+    """
+    Retry-After ヘッダーを秒数に変換
+    
+    Args:
+        value: ヘッダーの値（秒数またはHTTP日付）
+        
+    Returns:
+        float | None: 待ち時間（秒）。ヘッダーがない・解釈できない場合はNone
+    """
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def get_hedge_executor(pool_size: int = HTTP_POOL_SIZE) -> ThreadPoolExecutor:
+    """
+    ヘッジ付きの同期呼び出しを実行するプロセス共有のスレッドプールを取得
+    
+    スレッド数はクライアントのコネクションプールと同じ上限にする。
+    それ以上のリクエストを同時に送っても、接続の空きを待つだけのため。
+    
+    Args:
+        pool_size: スレッド数（同じ値のクライアントは同じプールを共有する）
+    """
+    executor = _hedge_executors.get(pool_size)
+    if executor is None:
+        with _hedge_executor_lock:
+            executor = _hedge_executors.get(pool_size)
+            if executor is None:
+                executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="deepseek-hedge")
+                _hedge_executors[pool_size] = executor
+    return executor
+
+
 class DeepseekAPI:
     """DeepseekのAPI呼び出しを処理するクラス"""
     
-    def __init__(self, api_key, endpoint, model, timeout=60):
+    def __init__(self, api_key, endpoint, model, timeout=DEFAULT_TIMEOUT,
+                 connect_timeout=DEFAULT_CONNECT_TIMEOUT, pool_size=HTTP_POOL_SIZE, session=None,
+                 max_concurrency=ASYNC_MAX_CONCURRENCY, cache: LLMCache = None,
+                 max_retries=API_MAX_RETRIES, backoff_base=API_BACKOFF_BASE, backoff_max=API_BACKOFF_MAX,
+                 rate_limiter: RateLimiter = None, hedge=API_HEDGE_ENABLED, hedge_min_delay=API_HEDGE_MIN_DELAY,
+                 latency_tracker: LatencyTracker = None, circuit_breaker: CircuitBreaker = None):
+        """
+        初期化
+        
+        Args:
+            api_key: APIキー
+            endpoint: チャット補完APIのエンドポイント
+            model: 使用するモデル名
+            timeout: 読み取りタイムアウト（秒）
+            connect_timeout: 接続タイムアウト（秒）
+            pool_size: コネクションプールのサイズ
+            session: 使用するHTTPセッション（省略時はプロセス共有セッション）
+            max_concurrency: 非同期呼び出しで同時に送信するリクエストの上限
+            cache: レスポンスキャッシュ（Noneの場合はキャッシュしない）
+            max_retries: 一時的なエラー（429・5xx・通信エラー）の最大リトライ回数
+            backoff_base: バックオフの基準時間（秒）
+            backoff_max: バックオフの上限（秒）
+            rate_limiter: 送信前に枠を確保するレートリミッター（Noneの場合は制限しない）
+            hedge: 応答が遅い場合に同じリクエストをもう1件送信するかどうか（ストリーミング以外）
+            hedge_min_delay: 2件目を送信するまでの最短待ち時間（秒）
+            latency_tracker: ヘッジの待ち時間を決める応答時間の記録（省略時はクライアント専用）
+            circuit_breaker: 連続失敗時に呼び出しを止めるサーキットブレーカー（Noneの場合は使用しない）
+        """
         self.api_key = api_key
         self.endpoint = endpoint
         self.model = model
         self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.max_concurrency = max_concurrency
+        self.cache = cache
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = rate_limiter
+        self.hedge = hedge
+        self.hedge_min_delay = hedge_min_delay
+        self.latency_tracker = latency_tracker or LatencyTracker()
+        self.circuit_breaker = circuit_breaker
+        self.pool_size = pool_size
+        self.session = session or get_http_session(pool_size)
         self.headers = {
             "Content-Type": "application/json",
             "Authorization": f"Bearer {api_key}"
         }
     
-    def invoke(self, messages, json_mode=False):
-        """メッセージを送信してレスポンスを取得
+    def prewarm(self, connections=HTTP_PREWARM_CONNECTIONS):
+        """
+        エンドポイントへのコネクションを事前に確立してプールに格納
+        
+        TCP+TLSハンドシェイクを初回のAPI呼び出しから切り離すため、
+        軽量なHEADリクエストを並列に送信する。ステータスコードは問わない。
         
         Args:
-            messages: 会話メッセージの配列
-            json_mode: JSONフォーマットのレスポンスを要求する場合はTrue
+            connections: 確立するコネクション数
+            
+        Returns:
+            int: 確立に成功したコネクション数
         """
+        def _open(_):
+            try:
+                self.session.head(
+                    self.endpoint,
+                    headers=self.headers,
+                    verify=False,  # 開発環境のみ
+                    timeout=(self.connect_timeout, self.connect_timeout)
+                )
+                return True
+            except requests.RequestException as e:
+                print(f"コネクションの事前確立に失敗: {str(e)}")
+                return False
+        
+        with ThreadPoolExecutor(max_workers=connections) as executor:
+            return sum(executor.map(_open, range(connections)))
+    
+    def _build_payload(self, messages, json_mode=False, model=None):
+        """リクエストペイロードを作成（model を省略した場合はクライアントの既定のモデル）"""
         payload = {
-            "model": self.model,
+            "model": model or self.model,
             "messages": messages
         }
         
@@ -43,106 +284,657 @@ class DeepseekAPI:
         if json_mode:
             payload["response_format"] = {"type": "json_object"}
         
+        return payload
+    
+    def _cache_lookup(self, payload, use_cache):
+        """キャッシュを参照する
+        
+        Returns:
+            tuple: (キャッシュキー, キャッシュされたレスポンス)。キャッシュを使わない場合はキーもNone
+        """
+        if self.cache is None or not use_cache:
+            return None, None
+        key = make_cache_key(payload)
+        return key, self.cache.get(key)
+    
+    @staticmethod
+    def _parse_response(result):
+        """レスポンス（JSONデコード済み）から生成テキストを取り出す"""
         try:
-            response = requests.post(
+            return result["choices"][0]["message"]["content"]
+        except (KeyError, IndexError, TypeError) as e:
+            raise APIError(f"API呼び出しエラー: レスポンスの形式が不正です: {str(e)}")
+    
+    def _retry_delay(self, error, attempt):
+        """再試行までの待ち時間を求める
+        
+        指数バックオフにフルジッター（0〜上限の一様乱数）を適用し、同時に失敗した
+        リクエストが一斉に再送されないようにする。Retry-After がある場合はそれ以上待つ。
+        
+        Args:
+            error: 発生したエラー
+            attempt: 失敗した試行の番号（0始まり）
+            
+        Returns:
+            float | None: 待ち時間（秒）。再試行しない場合はNone
+        """
+        if not error.retryable or attempt >= self.max_retries:
+            return None
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if error.retry_after is not None:
+            if error.retry_after > self.backoff_max:
+                # 長時間の待機を指示された場合は待たずに失敗させる
+                return None
+            delay = max(delay, error.retry_after)
+        return delay
+    
+    def _check_circuit(self):
+        """サーキットブレーカーが開いている場合は送信せずに失敗させる"""
+        if self.circuit_breaker is not None and not self.circuit_breaker.allow():
+            raise APIError(
+                "API呼び出しエラー: エンドポイントでエラーが続いているため、一時的に呼び出しを停止しています"
+            )
+    
+    def _record_success(self, payload, elapsed, stream):
+        """送信の成功を記録（ストリーミングは応答開始までの時間のため応答時間に含めない）"""
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record_success()
+        if not stream:
+            self.latency_tracker.record(payload["model"], elapsed)
+    
+    def _record_error(self, error):
+        """送信の失敗を記録
+        
+        5xx・通信エラーのみをエンドポイントの障害として数える。429 や 4xx は
+        エンドポイントが応答している証拠なので、成功として扱う。
+        """
+        if self.circuit_breaker is None:
+            return
+        if error.retryable and error.status_code != 429:
+            self.circuit_breaker.record_failure()
+        else:
+            self.circuit_breaker.record_success()
+    
+    def _hedge_delay(self, model):
+        """2件目のリクエストを送るまでの待ち時間を求める
+        
+        Returns:
+            float | None: 待ち時間（秒）。ヘッジしない場合はNone
+        """
+        if not self.hedge:
+            return None
+        if self.circuit_breaker is not None and self.circuit_breaker.state != CircuitBreaker.CLOSED:
+            # 障害中のエンドポイントに負荷を上乗せしない
+            return None
+        observed = self.latency_tracker.percentile(model, API_HEDGE_PERCENTILE)
+        if observed is None:
+            return None
+        return max(observed, self.hedge_min_delay)
+    
+    def _new_call(self, payload, stream=False):
+        """API呼び出し1回分の計測記録を作成"""
+        return {
+            "type": "api_call",
+            "model": payload["model"],
+            "stream": stream,
+            "start": time.monotonic(),
+            "end": None,
+            "duration": None,
+            "timestamp": time.time(),
+            "queue_wait": 0.0,
+            "backoff": 0.0,
+            "retries": 0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "cached_tokens": 0,
+            "cache_hit": False,
+            "hedged": False,
+            "status": "ok",
+            "error": ""
+        }
+    
+    @staticmethod
+    def _apply_usage(call, usage):
+        """レスポンスの usage をトークン数として記録
+        
+        キャッシュヒットのトークン数は Deepseek（prompt_cache_hit_tokens）と
+        OpenAI互換（prompt_tokens_details.cached_tokens）の両方の形式に対応する。
+        """
+        if not usage:
+            return
+        call["prompt_tokens"] = usage.get("prompt_tokens") or 0
+        call["completion_tokens"] = usage.get("completion_tokens") or 0
+        cached = usage.get("prompt_cache_hit_tokens")
+        if cached is None:
+            cached = (usage.get("prompt_tokens_details") or {}).get("cached_tokens")
+        call["cached_tokens"] = cached or 0
+    
+    @staticmethod
+    def _finish_call(call, status="ok", error=None):
+        """計測記録を完了させて登録"""
+        call["end"] = time.monotonic()
+        call["duration"] = call["end"] - call["start"]
+        call["status"] = status
+        if error is not None:
+            call["error"] = str(error)
+        record_call(call)
+    
+    def _send(self, payload, stream=False, call=None, cancelled=None):
+        """レート制限とリトライを適用してリクエストを送信
+        
+        Args:
+            payload: リクエストペイロード
+            stream: Trueの場合はレスポンス本文を読み込まずに返す
+            call: 待ち時間・リトライ回数を記録する計測記録
+            cancelled: セットされると再試行を打ち切る threading.Event（ヘッジで不要になった側）
+            
+        Returns:
+            requests.Response: ステータスコード200のレスポンス
+            
+        Raises:
+            APIError: 再試行できないエラー、リトライ回数を超えた場合、または打ち切られた場合
+        """
+        call = call if call is not None else {}
+        tokens = estimate_tokens(payload)
+        attempt = 0
+        while True:
+            self._check_circuit()
+            if self.rate_limiter is not None:
+                call["queue_wait"] = call.get("queue_wait", 0.0) + self.rate_limiter.acquire(tokens)
+            started = time.monotonic()
+            try:
+                # 打ち切りがある場合は本文を読む前に閉じられるよう、ヘッダーの受信で返す
+                response = self.session.post(
+                    self.endpoint,
+                    headers=self.headers,
+                    json=payload,
+                    verify=False,  # 開発環境のみ
+                    timeout=(self.connect_timeout, self.timeout),
+                    stream=stream or cancelled is not None
+                )
+            except requests.RequestException as e:
+                error = APIError.from_exception(e, retryable=True)
+            else:
+                if response.status_code == 200:
+                    self._record_success(payload, time.monotonic() - started, stream)
+                    return response
+                error = APIError.from_response(response.status_code, response.headers, response.text)
+                response.close()
+            
+            self._record_error(error)
+            delay = self._retry_delay(error, attempt)
+            if delay is None or (cancelled is not None and cancelled.is_set()):
+                raise error
+            print(f"API呼び出しを{delay:.1f}秒後に再試行します（{attempt + 1}/{self.max_retries}）: {str(error)}")
+            call["retries"] = call.get("retries", 0) + 1
+            call["backoff"] = call.get("backoff", 0.0) + delay
+            if cancelled is not None:
+                if cancelled.wait(delay):
+                    raise error
+            else:
+                time.sleep(delay)
+            attempt += 1
+    
+    async def _asend(self, client, payload, stream=False, call=None):
+        """レート制限とリトライを適用してリクエストを非同期に送信（_send の非同期版）
+        
+        Args:
+            client: 使用する httpx.AsyncClient
+            payload: リクエストペイロード
+            stream: Trueの場合はレスポンス本文を読み込まずに返す（呼び出し側で aclose() すること）
+            call: 待ち時間・リトライ回数を記録する計測記録
+            
+        Returns:
+            httpx.Response: ステータスコード200のレスポンス
+        """
+        call = call if call is not None else {}
+        tokens = estimate_tokens(payload)
+        attempt = 0
+        while True:
+            self._check_circuit()
+            if self.rate_limiter is not None:
+                call["queue_wait"] = call.get("queue_wait", 0.0) + await self.rate_limiter.aacquire(tokens)
+            started = time.monotonic()
+            request = client.build_request(
+                "POST",
                 self.endpoint,
                 headers=self.headers,
                 json=payload,
-                verify=False,  # 開発環境のみ
-                timeout=self.timeout
+                timeout=httpx.Timeout(self.timeout, connect=self.connect_timeout)
             )
-            
-            if response.status_code == 200:
-                result = response.json()
-                return result["choices"][0]["message"]["content"]
+            try:
+                response = await client.send(request, stream=stream)
+            except httpx.HTTPError as e:
+                error = APIError.from_exception(e, retryable=True)
             else:
-                error_msg = f"APIエラー: ステータスコード {response.status_code}, レスポンス: {response.text}"
-                raise Exception(error_msg)
-                
-        except Exception as e:
-            raise Exception(f"API呼び出しエラー: {str(e)}")
-
-
-def initialize_client():
-    """APIクライアントを初期化して session_state に保存"""
+                if response.status_code == 200:
+                    self._record_success(payload, time.monotonic() - started, stream)
+                    return response
+                await response.aread()
+                error = APIError.from_response(response.status_code, response.headers, response.text)
+                await response.aclose()
+            
+            self._record_error(error)
+            delay = self._retry_delay(error, attempt)
+            if delay is None:
+                raise error
+            print(f"API呼び出しを{delay:.1f}秒後に再試行します（{attempt + 1}/{self.max_retries}）: {str(error)}")
+            call["retries"] = call.get("retries", 0) + 1
+            call["backoff"] = call.get("backoff", 0.0) + delay
+            await asyncio.sleep(delay)
+            attempt += 1
     
-    if 'api_client' not in st.session_state:
+    def _post(self, payload, call, cancelled=None):
+        """リクエストを1件送信して生成テキストを返す（usage は call に記録する）
+        
+        cancelled がセットされていれば、本文を読まずにレスポンスを閉じて APIError を送出する。
+        """
+        response = self._send(payload, call=call, cancelled=cancelled)
+        if cancelled is not None:
+            with response:
+                if cancelled.is_set():
+                    raise APIError("API呼び出しエラー: ヘッジした別のリクエストが先に完了したため破棄しました")
+                try:
+                    result = response.json()
+                except ValueError as e:
+                    raise APIError(f"API呼び出しエラー: {str(e)}")
+            content = self._parse_response(result)
+            self._apply_usage(call, result.get("usage"))
+            return content
         try:
-            # 環境変数からAPIキーを取得
-            api_key = os.getenv("DEEPSEEK_API_KEY")
-            
-            # 環境変数がない場合はエラーメッセージを表示
-            if not api_key:
-                st.sidebar.error("⚠️ DEEPSEEK_API_KEYが設定されていません。Streamlit Cloud設定で環境変数を設定してください。")
-                return
-            
-            # API エンドポイント
-            api_endpoint = os.getenv("API_ENDPOINT", "https://api.deepseek.com/chat/completions")
-            
-            # デフォルトモデルを設定
-            default_model = list(AVAILABLE_MODELS.keys())[0]
+            result = response.json()
+        except ValueError as e:
+            raise APIError(f"API呼び出しエラー: {str(e)}")
+        content = self._parse_response(result)
+        self._apply_usage(call, result.get("usage"))
+        return content
+    
+    async def _apost(self, client, limiter, payload, call):
+        """リクエストを1件非同期に送信して生成テキストを返す（_post の非同期版）"""
+        waiting = time.monotonic()
+        async with limiter:
+            call["queue_wait"] += time.monotonic() - waiting
+            response = await self._asend(client, payload, call=call)
+        try:
+            result = response.json()
+        except ValueError as e:
+            raise APIError(f"API呼び出しエラー: {str(e)}")
+        content = self._parse_response(result)
+        self._apply_usage(call, result.get("usage"))
+        return content
+    
+    def _hedge_leg(self, payload, call, cancelled, started, submitted):
+        """スレッドプール上でヘッジの1件を送信（プールの空き待ちを queue_wait に記録し、started をセットする）"""
+        call["queue_wait"] = call.get("queue_wait", 0.0) + time.monotonic() - submitted
+        started.set()
+        return self._post(payload, call, cancelled)
+    
+    def _hedged_post(self, payload, call):
+        """ヘッジ付きでリクエストを送信
+        
+        1件目の応答がこれまでの p95 応答時間を超えても返らない場合、同じリクエストを
+        もう1件送信し、先に成功した方の結果を使う。各リクエストはプロセス共有のスレッドプール
+        （get_hedge_executor）で実行する。遅れた方は、送信前なら取り消し、送信済みなら
+        再試行を打ち切ってヘッダーの受信時に本文を読まずにレスポンスを閉じる。
+        p95 と比べる待ち時間は1件目の実行が始まってから数える（プールの空き待ちで
+        ヘッジすると、混雑しているときほど負荷を倍にしてしまうため）。
+        """
+        delay = self._hedge_delay(payload["model"])
+        if delay is None:
+            return self._post(payload, call)
+        
+        # 各リクエストの usage は別々に記録し、採用した方を call に反映する
+        executor = get_hedge_executor(self.pool_size)
+        cancelled = threading.Event()
+        started = threading.Event()
+        primary_call = dict(call)
+        primary = executor.submit(self._hedge_leg, payload, primary_call, cancelled, started, time.monotonic())
+        started.wait()
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            call.update(primary_call)
+            return primary.result()
+        
+        backup_call = dict(call)
+        backup = executor.submit(self._hedge_leg, payload, backup_call, cancelled, threading.Event(), time.monotonic())
+        legs = {primary: primary_call, backup: backup_call}
+        pending = set(legs)
+        error = None
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        call.update(legs[future], hedged=True)
+                        return future.result()
+                    error = future.exception()
+            raise error
+        finally:
+            cancelled.set()
+            for future in pending:
+                future.cancel()
+    
+    async def _ahedged_post(self, client, limiter, payload, call):
+        """ヘッジ付きでリクエストを非同期に送信（_hedged_post の非同期版）
+        
+        先に成功した方の結果を使い、もう一方のリクエストはキャンセルして接続を閉じる。
+        """
+        delay = self._hedge_delay(payload["model"])
+        if delay is None:
+            return await self._apost(client, limiter, payload, call)
+        
+        primary_call = dict(call)
+        tasks = {asyncio.ensure_future(self._apost(client, limiter, payload, primary_call)): primary_call}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if done:
+                call.update(primary_call)
+                return done.pop().result()
             
-            # APIクライアントを初期化
-            st.session_state.api_client = DeepseekAPI(
-                api_key=api_key,
-                endpoint=api_endpoint,
-                model=default_model,
-                timeout=60
-            )
+            backup_call = dict(call)
+            tasks[asyncio.ensure_future(self._apost(client, limiter, payload, backup_call))] = backup_call
+            pending = set(tasks)
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        call.update(tasks[task], hedged=True)
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+    
+    @staticmethod
+    def _parse_stream_line(line):
+        """SSEの1行をチャンクとして解釈する
+        
+        Returns:
+            dict | None: チャンク（差分を含まない行は空の辞書、終端の場合はNone）
             
-            st.session_state.selected_model = default_model
+        Raises:
+            APIError: data 行がJSONとして解釈できない場合（途中で切れたチャンクなど）
+        """
+        if not line or not line.startswith("data:"):
+            # 空行やコメント（": keep-alive"）は無視する
+            return {}
+        data = line[len("data:"):].strip()
+        if data == "[DONE]":
+            return None
+        try:
+            return json.loads(data)
+        except ValueError as e:
+            raise APIError.from_exception(e, retryable=True) from e
+    
+    @staticmethod
+    def _chunk_delta(chunk):
+        """チャンクから生成テキストの差分を取り出す（差分がない場合は空文字列）"""
+        if not chunk.get("choices"):
+            return ""
+        return chunk["choices"][0].get("delta", {}).get("content") or ""
+    
+    def _iter_stream(self, payload, cache_key=None):
+        """ストリーミングレスポンスから生成テキストの差分を順に返す
+        
+        ジェネレーターを途中で close() するとレスポンスが閉じられ、生成も打ち切られる。
+        リトライは受信開始前のエラーのみが対象で、受信途中で切断された場合は再送しない。
+        最後まで受信できた場合のみ、結合したテキストを cache_key でキャッシュする。
+        """
+        call = self._new_call(payload, stream=True)
+        status, error = "cancelled", None
+        try:
+            response = self._send(payload, stream=True, call=call)
             
+            with response:
+                # text/event-stream は文字コードが指定されないことがあるため明示する
+                response.encoding = "utf-8"
+                parts = []
+                try:
+                    for line in response.iter_lines(decode_unicode=True):
+                        chunk = self._parse_stream_line(line)
+                        if chunk is None:
+                            break
+                        # usage は最後のチャンクに含まれる
+                        self._apply_usage(call, chunk.get("usage"))
+                        delta = self._chunk_delta(chunk)
+                        if delta:
+                            parts.append(delta)
+                            yield delta
+                except APIError as e:
+                    # 受信途中の不正なチャンクもエンドポイントの障害として数える
+                    self._record_error(e)
+                    raise
+            status = "ok"
         except Exception as e:
-            st.sidebar.error(f"❌ API接続エラー: {str(e)}")
+            status, error = "error", e
+            raise
+        finally:
+            self._finish_call(call, status, error)
+        
+        if cache_key is not None:
+            self.cache.set(cache_key, "".join(parts))
+    
+    def _cached_call(self, payload, stream=False):
+        """キャッシュから返した呼び出しを記録"""
+        call = self._new_call(payload, stream)
+        call["cache_hit"] = True
+        self._finish_call(call)
+    
+    def invoke(self, messages, json_mode=False, stream=False, use_cache=True, model=None, cancelled=None):
+        """メッセージを送信してレスポンスを取得
+        
+        Args:
+            messages: 会話メッセージの配列
+            json_mode: JSONフォーマットのレスポンスを要求する場合はTrue
+            stream: Trueの場合、生成テキストの差分を順に返すイテレーターを返す
+            use_cache: Falseの場合はキャッシュを参照・更新しない（毎回新しい生成を得たい場合）
+            model: この呼び出しで使用するモデル名（省略時はクライアントの既定のモデル）
+            cancelled: セットされると再試行を打ち切り、ヘッダーの受信時に本文を読まずに
+                APIError を送出する threading.Event（ストリーミング以外のみ。指定した場合はヘッジしない）
             
-            st.session_state.selected_model = default_model
+        ストリーミング以外の呼び出しは、応答が遅い場合にヘッジ（同じリクエストの追加送信）される。
+        呼び出しごとの所要時間・待ち時間・トークン数・リトライ回数は utils.metrics に記録される。
             
-        except Exception as e:
-            st.sidebar.error(f"❌ API接続エラー: {str(e)}")
-            if "APIエラー" in str(e):
-                st.sidebar.warning(f"API呼び出しでエラーが発生しました。詳細: {str(e)}")
+        Raises:
+            APIError: 再試行できないエラー、またはリトライ回数を超えた場合
+        """
+        payload = self._build_payload(messages, json_mode, model)
+        cache_key, cached = self._cache_lookup(payload, use_cache)
+        
+        if stream:
+            if cached is not None:
+                self._cached_call(payload, stream=True)
+                return iter([cached])
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
+            return self._iter_stream(payload, cache_key)
+        
+        if cached is not None:
+            self._cached_call(payload)
+            return cached
+        
+        call = self._new_call(payload)
+        try:
+            if cancelled is not None:
+                content = self._post(payload, call, cancelled)
             else:
-                st.sidebar.warning("予期せぬエラーが発生しました。詳細はログを確認してください。")
-            raise e
+                content = self._hedged_post(payload, call)
+        except Exception as e:
+            self._finish_call(call, "error", e)
+            raise
+        self._finish_call(call)
+        
+        if cache_key is not None:
+            self.cache.set(cache_key, content)
+        return content
+    
+    async def ainvoke(self, messages, json_mode=False, use_cache=True, model=None):
+        """メッセージを非同期に送信してレスポンスを取得
+        
+        invoke の非同期版。イベントループ単位で共有するコネクションプールを使用し、
+        同時に送信中のリクエスト数はプロセス共通のセマフォで制限される。
+        
+        Args:
+            messages: 会話メッセージの配列
+            json_mode: JSONフォーマットのレスポンスを要求する場合はTrue
+            use_cache: Falseの場合はキャッシュを参照・更新しない
+            model: この呼び出しで使用するモデル名（省略時はクライアントの既定のモデル）
+        """
+        payload = self._build_payload(messages, json_mode, model)
+        cache_key, cached = self._cache_lookup(payload, use_cache)
+        if cached is not None:
+            self._cached_call(payload)
+            return cached
+        client, limiter = get_async_transport(self.max_concurrency)
+        
+        call = self._new_call(payload)
+        try:
+            content = await self._ahedged_post(client, limiter, payload, call)
+        except BaseException as e:
+            # キャンセル（asyncio.CancelledError）も記録してから伝播させる
+            self._finish_call(call, "error" if isinstance(e, Exception) else "cancelled", e)
+            raise
+        self._finish_call(call)
+        
+        if cache_key is not None:
+            self.cache.set(cache_key, content)
+        return content
+    
+    async def astream(self, messages, json_mode=False, use_cache=True, model=None):
+        """メッセージを非同期に送信し、生成テキストの差分を順に返す（invoke(stream=True) の非同期版）
+        
+        Args:
+            messages: 会話メッセージの配列
+            json_mode: JSONフォーマットのレスポンスを要求する場合はTrue
+            use_cache: Falseの場合はキャッシュを参照・更新しない
+            model: この呼び出しで使用するモデル名（省略時はクライアントの既定のモデル）
+        """
+        payload = self._build_payload(messages, json_mode, model)
+        cache_key, cached = self._cache_lookup(payload, use_cache)
+        if cached is not None:
+            self._cached_call(payload, stream=True)
+            yield cached
+            return
+        payload["stream"] = True
+        payload["stream_options"] = {"include_usage": True}
+        parts = []
+        client, limiter = get_async_transport(self.max_concurrency)
+        
+        call = self._new_call(payload, stream=True)
+        status, error = "cancelled", None
+        try:
+            waiting = time.monotonic()
+            async with limiter:
+                call["queue_wait"] += time.monotonic() - waiting
+                response = await self._asend(client, payload, stream=True, call=call)
+                try:
+                    async for line in response.aiter_lines():
+                        chunk = self._parse_stream_line(line)
+                        if chunk is None:
+                            break
+                        self._apply_usage(call, chunk.get("usage"))
+                        delta = self._chunk_delta(chunk)
+                        if delta:
+                            parts.append(delta)
+                            yield delta
+                except APIError as e:
+                    self._record_error(e)
+                    raise
+                except httpx.HTTPError as e:
+                    raise APIError.from_exception(e)
+                finally:
+                    await response.aclose()
+            status = "ok"
+        except Exception as e:
+            status, error = "error", e
+            raise
+        finally:
+            self._finish_call(call, status, error)
+        
+        if cache_key is not None:
+            self.cache.set(cache_key, "".join(parts))
 
 
-def update_model(model_name):
-    """使用するモデルを更新"""
-    if 'api_client' in st.session_state:
-        st.session_state.api_client.model = model_name
-        st.session_state.selected_model = model_name
-        return True
-    return False
+def prewarm_connections(client, connections=HTTP_PREWARM_CONNECTIONS):
+    """
+    プロセス起動時に一度だけバックグラウンドでコネクションを事前確立
+    
+    Args:
+        client: 事前確立に使用するAPIクライアント
+        connections: 確立するコネクション数
+    """
+    global _prewarm_started
+    with _http_session_lock:
+        if _prewarm_started:
+            return
+        _prewarm_started = True
+    
+    thread = threading.Thread(target=client.prewarm, args=(connections,), daemon=True)
+    thread.start()
 
 
-def get_client():
-    """現在のAPIクライアントを取得"""
-    if 'api_client' not in st.session_state:
-        initialize_client()
-    return st.session_state.api_client
+def create_client(model=None, use_cache=LLM_CACHE_ENABLED):
+    """
+    環境変数の設定からAPIクライアントを作成（Streamlitのセッションを必要としない）
+    
+    Args:
+        model: 使用するモデル名（省略時は既定のモデル）
+        use_cache: プロセス共有のレスポンスキャッシュを使用するかどうか
+        
+    Returns:
+        DeepseekAPI: 作成したクライアント
+        
+    Raises:
+        ValueError: DEEPSEEK_API_KEY が設定されていない場合
+    """
+    api_key = os.getenv("DEEPSEEK_API_KEY")
+    if not api_key:
+        raise ValueError("DEEPSEEK_API_KEYが設定されていません。")
+    
+    endpoint = os.getenv("API_ENDPOINT", DEFAULT_API_ENDPOINT)
+    return DeepseekAPI(
+        api_key=api_key,
+        endpoint=endpoint,
+        model=model or list(AVAILABLE_MODELS.keys())[0],
+        timeout=int(os.getenv("API_READ_TIMEOUT", DEFAULT_TIMEOUT)),
+        connect_timeout=int(os.getenv("API_CONNECT_TIMEOUT", DEFAULT_CONNECT_TIMEOUT)),
+        pool_size=int(os.getenv("HTTP_POOL_SIZE", HTTP_POOL_SIZE)),
+        max_concurrency=int(os.getenv("ASYNC_MAX_CONCURRENCY", ASYNC_MAX_CONCURRENCY)),
+        cache=get_llm_cache() if use_cache else None,
+        max_retries=int(os.getenv("API_MAX_RETRIES", API_MAX_RETRIES)),
+        rate_limiter=get_rate_limiter(),
+        hedge=os.getenv("API_HEDGE_ENABLED", str(API_HEDGE_ENABLED)).lower() in ("1", "true", "yes"),
+        latency_tracker=get_latency_tracker(),
+        circuit_breaker=get_circuit_breaker(endpoint)
+    )
 
 
-def get_available_models():
-    """利用可能なモデルのリストを取得"""
-    return AVAILABLE_MODELS
+# プロセス全体で共有するクライアント（モデルは呼び出しごとに指定する）
+_shared_client = None
+_shared_client_lock = threading.Lock()
 
 
-def get_selected_model():
-    """現在選択されているモデルを取得"""
-    if 'selected_model' not in st.session_state:
-        st.session_state.selected_model = list(AVAILABLE_MODELS.keys())[0]
-    return st.session_state.selected_model
+def get_shared_client():
+    """
+    プロセス共有のAPIクライアントを取得（初回のみ作成）
+    
+    すべてのセッション・スレッドが同じクライアント（コネクションプール・キャッシュ・レートリミッター）を使う。
+    クライアントの状態は書き換えず、セッションごとのモデルは invoke などの model 引数で渡す。
+    
+    Raises:
+        ValueError: DEEPSEEK_API_KEY が設定されていない場合
+    """
+    global _shared_client
+    if _shared_client is None:
+        with _shared_client_lock:
+            if _shared_client is None:
+                _shared_client = create_client()
+    return _shared_client
 
 
-def test_api_connection():
-    """API接続をテストする"""
-    client = get_client()
-    try:
-        test_message = [
-            {"role": "system", "content": "You are a helpful assistant"},
-            {"role": "user", "content": "こんにちは、簡単な返事を返してください"}
-        ]
-        test_response = client.invoke(test_message)
-        return True, test_response
-    except Exception as e:
-        return False, str(e)
\ No newline at end of file
+def get_available_models():
+    """利用可能なモデルのリストを取得"""
+    return AVAILABLE_MODELS
@@ -0,0 +1,506 @@
+import os
+import time
+import random
+import sqlite3
+import uuid
+import hashlib
+import threading
+from typing import Dict, Any, Optional, Iterator, AsyncIterator, Sequence, Tuple
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata
+)
+from langgraph.checkpoint.serde.types import TASKS, ChannelProtocol
+from config.settings import (
+    CHECKPOINT_ENABLED, CHECKPOINT_PATH, CHECKPOINT_TTL, CHECKPOINT_KEEP_PER_THREAD, CHECKPOINT_PRUNE_INTERVAL,
+    CHECKPOINT_LEASE
+)
+
+
+def make_run_key(input_text: str, model: str, prompt_version: str) -> str:
+    """
+    中断した実行を探すためのキーを入力・モデル・プロンプトから作成
+
+    スレッドIDは実行ごとに発行し（SqliteCheckpointer.claim_run）、このキーは
+    同じ入力を再実行したときに中断した実行のスレッドを見つけるためだけに使う。
+    """
+    key = f"{model}\n{prompt_version}\n{input_text}"
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+class SqliteCheckpointer(BaseCheckpointSaver[str]):
+    """
+    LangGraph のチェックポイントをSQLiteファイルに保存するチェックポインター
+
+    ノードが完了するたびに状態が保存されるため、プロセスの再起動やブラウザの切断で
+    中断した実行を、最後に完了したノードの次から再開できる。
+    接続はロックで保護したうえでスレッド間で共有し、非同期版のメソッドも同じ接続を使う
+    （ローカルファイルへの短い書き込みのため、イベントループを長く止めることはない）。
+
+    スレッドは実行ごとに別のものを使い、runs テーブルで入力のキーと対応付ける。
+    再開する実行は期限付きで占有するため、同じ入力の実行が同時にあっても
+    1つのスレッドを共有することはない。占有はバックグラウンドのスレッドが lease の 1/3 ごとに
+    延長するため、長く掛かるノードの実行中に期限が切れることはない。
+    """
+
+    def __init__(
+        self,
+        path: str = CHECKPOINT_PATH,
+        ttl: float = CHECKPOINT_TTL,
+        keep_per_thread: int = CHECKPOINT_KEEP_PER_THREAD,
+        prune_interval: float = CHECKPOINT_PRUNE_INTERVAL,
+        lease: float = CHECKPOINT_LEASE
+    ):
+        """
+        初期化
+
+        Args:
+            path: SQLiteファイルのパス
+            ttl: 最後の更新からスレッドを保持する期間（秒）
+            keep_per_thread: スレッドごとに残す最新のチェックポイント数
+            prune_interval: 古いチェックポイントを削除する間隔（秒）
+            lease: 実行中のスレッドを占有する期間（秒、実行中は定期的に延長）
+        """
+        super().__init__()
+        self.ttl = ttl
+        self.keep_per_thread = max(keep_per_thread, 2)  # 再開には直前のチェックポイントの書き込みも必要
+        self.prune_interval = prune_interval
+        self.lease = lease
+        self._lock = threading.Lock()
+        self._active_runs: Dict[str, str] = {}  # このプロセスが占有しているスレッドID -> トークン
+        self._renewer: Optional[threading.Thread] = None
+        self._last_pruned = 0.0
+        self._conn = self._open(path)
+
+    @staticmethod
+    def _open(path: str) -> sqlite3.Connection:
+        """SQLiteファイルを開いてテーブルを作成"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            " thread_id TEXT NOT NULL,"
+            " checkpoint_ns TEXT NOT NULL DEFAULT '',"
+            " checkpoint_id TEXT NOT NULL,"
+            " parent_checkpoint_id TEXT,"
+            " type TEXT,"
+            " checkpoint BLOB,"
+            " metadata_type TEXT,"
+            " metadata BLOB,"
+            " created_at REAL NOT NULL,"
+            " PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS writes ("
+            " thread_id TEXT NOT NULL,"
+            " checkpoint_ns TEXT NOT NULL DEFAULT '',"
+            " checkpoint_id TEXT NOT NULL,"
+            " task_id TEXT NOT NULL,"
+            " idx INTEGER NOT NULL,"
+            " channel TEXT NOT NULL,"
+            " type TEXT,"
+            " value BLOB,"
+            " task_path TEXT NOT NULL DEFAULT '',"
+            " PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS runs ("
+            " thread_id TEXT PRIMARY KEY,"
+            " run_key TEXT NOT NULL,"
+            " lease_token TEXT,"
+            " lease_expires REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_checkpoints_created_at ON checkpoints(created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_runs_run_key ON runs(run_key)")
+        conn.commit()
+        return conn
+
+    @staticmethod
+    def _config(thread_id: str, checkpoint_ns: str, checkpoint_id: str) -> RunnableConfig:
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns, "checkpoint_id": checkpoint_id}}
+
+    def _load_tuple(self, row: Tuple) -> CheckpointTuple:
+        """checkpoints テーブルの1行からチェックポイントを復元（ロック取得済みで呼ぶ）"""
+        thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type_, checkpoint, metadata_type, metadata = row
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id)
+        ).fetchall()
+        sends = []
+        if parent_checkpoint_id:
+            # 直前のステップで送られた Send（並列ノードへの送信）
+            sends = self._conn.execute(
+                "SELECT type, value FROM writes "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? AND channel = ? "
+                "ORDER BY task_path, task_id, idx",
+                (thread_id, checkpoint_ns, parent_checkpoint_id, TASKS)
+            ).fetchall()
+        return CheckpointTuple(
+            config=self._config(thread_id, checkpoint_ns, checkpoint_id),
+            checkpoint={
+                **self.serde.loads_typed((type_, checkpoint)),
+                "pending_sends": [self.serde.loads_typed(send) for send in sends]
+            },
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=(
+                self._config(thread_id, checkpoint_ns, parent_checkpoint_id)
+                if parent_checkpoint_id else None
+            ),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, channel, value_type, value in writes
+            ]
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """
+        チェックポイントを取得（checkpoint_id の指定がなければスレッドの最新のもの）
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        columns = "thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata"
+        with self._lock:
+            if checkpoint_id := get_checkpoint_id(config):
+                row = self._conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id)
+                ).fetchone()
+            else:
+                # チェックポイントIDは時刻順に並ぶため、最大のものが最新
+                row = self._conn.execute(
+                    f"SELECT {columns} FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns)
+                ).fetchone()
+            if row is None:
+                return None
+            return self._load_tuple(row)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None
+    ) -> Iterator[CheckpointTuple]:
+        """
+        チェックポイントを新しい順に列挙
+        """
+        conditions = []
+        params = []
+        if config is not None:
+            conditions.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            checkpoint_ns = config["configurable"].get("checkpoint_ns")
+            if checkpoint_ns is not None:
+                conditions.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            if checkpoint_id := get_checkpoint_id(config):
+                conditions.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        if before is not None and (before_id := get_checkpoint_id(before)):
+            conditions.append("checkpoint_id < ?")
+            params.append(before_id)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata "
+                f"FROM checkpoints {where}ORDER BY checkpoint_id DESC",
+                params
+            ).fetchall()
+        count = 0
+        for row in rows:
+            if limit is not None and count >= limit:
+                break
+            with self._lock:
+                checkpoint_tuple = self._load_tuple(row)
+            if filter and not all(checkpoint_tuple.metadata.get(key) == value for key, value in filter.items()):
+                continue
+            count += 1
+            yield checkpoint_tuple
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions
+    ) -> RunnableConfig:
+        """
+        チェックポイントを保存
+        """
+        saved = checkpoint.copy()
+        saved.pop("pending_sends", None)  # 直前のチェックポイントの書き込みから復元する
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        type_, serialized = self.serde.dumps_typed(saved)
+        metadata_type, serialized_metadata = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints "
+                "(thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id, checkpoint_ns, checkpoint["id"], config["configurable"].get("checkpoint_id"),
+                    type_, serialized, metadata_type, serialized_metadata, now
+                )
+            )
+            if now - self._last_pruned >= self.prune_interval:
+                self._prune(now)
+                self._last_pruned = now
+            self._conn.commit()
+        return self._config(thread_id, checkpoint_ns, checkpoint["id"])
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = ""
+    ) -> None:
+        """
+        ノードの書き込み（並列ノードの途中結果を含む）を保存
+
+        同じステップの並列ノードのうち完了したものの結果が残るため、再開時は未完了のノードだけが実行される。
+        """
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            type_, serialized = self.serde.dumps_typed(value)
+            rows.append((
+                WRITES_IDX_MAP.get(channel, idx),
+                (thread_id, checkpoint_ns, checkpoint_id, task_id, WRITES_IDX_MAP.get(channel, idx), channel, type_, serialized, task_path)
+            ))
+        with self._lock:
+            for write_idx, row in rows:
+                # 通常の書き込みは最初の1回だけを残し、エラーなどの特殊な書き込みは上書きする
+                verb = "INSERT OR IGNORE" if write_idx >= 0 else "INSERT OR REPLACE"
+                self._conn.execute(
+                    f"{verb} INTO writes "
+                    "(thread_id, checkpoint_ns, checkpoint_id, task_id, idx, channel, type, value, task_path) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    row
+                )
+            self._conn.commit()
+
+    def _renew_leases(self) -> None:
+        """このプロセスが占有している実行の期限を lease の 1/3 ごとに延長し続ける（デーモンスレッドで実行）"""
+        while True:
+            time.sleep(self.lease / 3)
+            with self._lock:
+                if not self._active_runs:
+                    continue
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE runs SET lease_expires = ?, updated_at = ? WHERE thread_id = ? AND lease_token = ?",
+                    [(now + self.lease, now, thread_id, token) for thread_id, token in self._active_runs.items()]
+                )
+                self._conn.commit()
+
+    def _hold(self, thread_id: str, token: str) -> None:
+        """占有した実行を延長の対象に加える（ロック取得済みで呼ぶ）"""
+        self._active_runs[thread_id] = token
+        if self._renewer is None:
+            self._renewer = threading.Thread(target=self._renew_leases, name="checkpoint-lease", daemon=True)
+            self._renewer.start()
+
+    def claim_run(self, run_key: str) -> Tuple[str, str, bool]:
+        """
+        実行に使うスレッドを確保
+
+        同じキーで中断した実行（占有されていないもの）があればそのスレッドを占有して返し、
+        なければ新しいスレッドIDを発行する。占有は条件付きの UPDATE で行うため、
+        同じファイルを使う別のプロセスと同時に確保しても同じスレッドを取ることはない。
+
+        Args:
+            run_key: 入力・モデル・プロンプトから作成したキー（make_run_key）
+
+        Returns:
+            Tuple[str, str, bool]: スレッドID、占有の解放に使うトークン、中断した実行を再開するかどうか
+        """
+        token = uuid.uuid4().hex
+        now = time.time()
+        with self._lock:
+            candidates = self._conn.execute(
+                "SELECT thread_id FROM runs WHERE run_key = ? AND lease_expires < ? ORDER BY updated_at DESC",
+                (run_key, now)
+            ).fetchall()
+            for (thread_id,) in candidates:
+                claimed = self._conn.execute(
+                    "UPDATE runs SET lease_token = ?, lease_expires = ?, updated_at = ? "
+                    "WHERE thread_id = ? AND lease_expires < ?",
+                    (token, now + self.lease, now, thread_id, now)
+                ).rowcount
+                if claimed:
+                    self._conn.commit()
+                    self._hold(thread_id, token)
+                    return thread_id, token, True
+            thread_id = uuid.uuid4().hex
+            self._conn.execute(
+                "INSERT INTO runs (thread_id, run_key, lease_token, lease_expires, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (thread_id, run_key, token, now + self.lease, now)
+            )
+            self._conn.commit()
+            self._hold(thread_id, token)
+        return thread_id, token, False
+
+    def release_run(self, thread_id: str, token: str, finished: bool) -> None:
+        """
+        claim_run で確保したスレッドを解放
+
+        完了した実行はスレッドごと削除し、中断した実行は同じキーの次の実行が再開できるよう占有だけを外す。
+        占有の期限が切れて別の実行に確保されている場合は何もしない。
+
+        Args:
+            thread_id: スレッドID
+            token: claim_run が返したトークン
+            finished: 実行が最後まで完了したかどうか
+        """
+        with self._lock:
+            if self._active_runs.get(thread_id) == token:
+                del self._active_runs[thread_id]
+            if finished:
+                if self._conn.execute(
+                    "DELETE FROM runs WHERE thread_id = ? AND lease_token = ?", (thread_id, token)
+                ).rowcount:
+                    self._conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+                    self._conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+            else:
+                self._conn.execute(
+                    "UPDATE runs SET lease_token = NULL, lease_expires = 0, updated_at = ? "
+                    "WHERE thread_id = ? AND lease_token = ?",
+                    (time.time(), thread_id, token)
+                )
+            self._conn.commit()
+
+    def _prune(self, now: float) -> None:
+        """期限切れのスレッドと、スレッドごとに古いチェックポイントを削除（ロック取得済みで呼ぶ）"""
+        # 最後の更新から ttl を過ぎたスレッドは丸ごと削除
+        self._conn.execute(
+            "DELETE FROM checkpoints WHERE thread_id IN "
+            "(SELECT thread_id FROM checkpoints GROUP BY thread_id HAVING MAX(created_at) < ?)",
+            (now - self.ttl,)
+        )
+        # スレッドごとに最新の keep_per_thread 件だけを残す
+        self._conn.execute(
+            "DELETE FROM checkpoints WHERE (thread_id, checkpoint_ns, checkpoint_id) IN ("
+            " SELECT thread_id, checkpoint_ns, checkpoint_id FROM ("
+            "  SELECT thread_id, checkpoint_ns, checkpoint_id, ROW_NUMBER() OVER ("
+            "   PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC) AS rank"
+            "  FROM checkpoints)"
+            " WHERE rank > ?)",
+            (self.keep_per_thread,)
+        )
+        # チェックポイントが削除された書き込みを削除
+        self._conn.execute(
+            "DELETE FROM writes WHERE NOT EXISTS ("
+            " SELECT 1 FROM checkpoints c WHERE c.thread_id = writes.thread_id"
+            " AND c.checkpoint_ns = writes.checkpoint_ns AND c.checkpoint_id = writes.checkpoint_id)"
+        )
+        # 占有が切れていてチェックポイントも残っていない実行を削除
+        self._conn.execute(
+            "DELETE FROM runs WHERE lease_expires < ? AND NOT EXISTS ("
+            " SELECT 1 FROM checkpoints c WHERE c.thread_id = runs.thread_id)",
+            (now,)
+        )
+
+    def prune(self) -> None:
+        """古いチェックポイントを今すぐ削除"""
+        now = time.time()
+        with self._lock:
+            self._prune(now)
+            self._last_pruned = now
+            self._conn.commit()
+
+    def delete_thread(self, thread_id: str) -> None:
+        """スレッドのチェックポイントと書き込みを全て削除"""
+        with self._lock:
+            self._conn.execute("DELETE FROM runs WHERE thread_id = ?", (thread_id,))
+            self._conn.execute("DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            self._conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+            self._conn.commit()
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """get_tuple の非同期版"""
+        return self.get_tuple(config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None
+    ) -> AsyncIterator[CheckpointTuple]:
+        """list の非同期版"""
+        for checkpoint_tuple in self.list(config, filter=filter, before=before, limit=limit):
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions
+    ) -> RunnableConfig:
+        """put の非同期版"""
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = ""
+    ) -> None:
+        """put_writes の非同期版"""
+        self.put_writes(config, writes, task_id, task_path)
+
+    def get_next_version(self, current: Optional[str], channel: ChannelProtocol) -> str:
+        """チャネルの次のバージョン（整数部で順序付けし、小数部で衝突を避ける）"""
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+
+# プロセス全体で共有するチェックポインター
+_shared_checkpointer = None
+_shared_checkpointer_lock = threading.Lock()
+
+
+def get_checkpointer() -> Optional[SqliteCheckpointer]:
+    """
+    プロセス共有のチェックポインターを取得
+
+    環境変数 CHECKPOINT_ENABLED（または設定値）が無効の場合はNoneを返す。
+    """
+    global _shared_checkpointer
+    if os.getenv("CHECKPOINT_ENABLED", str(CHECKPOINT_ENABLED)).lower() not in ("1", "true", "yes"):
+        return None
+    if _shared_checkpointer is None:
+        with _shared_checkpointer_lock:
+            if _shared_checkpointer is None:
+                _shared_checkpointer = SqliteCheckpointer(path=os.getenv("CHECKPOINT_PATH", CHECKPOINT_PATH))
+    return _shared_checkpointer
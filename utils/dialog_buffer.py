@@ -0,0 +1,113 @@
+"""
+画面側のセッションが保持する対話履歴のリングバッファ
+
+メモリに置くメッセージの件数に上限を設け、あふれた古いメッセージはディスク（JSONL）に書き出す。
+書き出したメッセージは「以前のメッセージ」を展開したときだけ読み戻す。
+"""
+import os
+import json
+import uuid
+import threading
+from collections import deque
+from typing import Deque, Dict, Iterator, List, Optional
+from config.settings import DIALOG_HISTORY_CAPACITY, DIALOG_SPILL_DIR
+from utils.state import DialogMessage
+
+
+class DialogBuffer:
+    """件数に上限のある対話履歴（IDで置き換え・差分の追加ができる）"""
+
+    def __init__(self, capacity: int = DIALOG_HISTORY_CAPACITY, spill_dir: Optional[str] = DIALOG_SPILL_DIR):
+        """
+        初期化
+
+        Args:
+            capacity: メモリに保持するメッセージの最大件数
+            spill_dir: あふれたメッセージを書き出すディレクトリ（Noneの場合は書き出さずに捨てる）
+        """
+        self.capacity = capacity
+        self.spill_dir = spill_dir
+        self.spilled = 0  # ディスクに書き出したメッセージの件数
+        self._messages: Deque[DialogMessage] = deque()
+        self._index: Dict[str, DialogMessage] = {}
+        self._spill_path: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def __iter__(self) -> Iterator[DialogMessage]:
+        return iter(list(self._messages))
+
+    def __bool__(self) -> bool:
+        return bool(self._messages) or self.spilled > 0
+
+    def messages(self) -> List[DialogMessage]:
+        """メモリ上のメッセージ（古い順）"""
+        return list(self._messages)
+
+    def upsert(self, message: DialogMessage) -> None:
+        """メッセージを追加（同じIDのメッセージがあれば置き換える）"""
+        with self._lock:
+            existing = self._index.get(message.id)
+            if existing is not None:
+                self._messages[self._messages.index(existing)] = message
+                self._index[message.id] = message
+                return
+            self._messages.append(message)
+            self._index[message.id] = message
+            while len(self._messages) > self.capacity:
+                self._spill(self._messages.popleft())
+
+    def append_text(self, message_id: str, text: str) -> None:
+        """ストリーミング中のメッセージに差分を追加（あふれて書き出し済みのメッセージは無視する）"""
+        message = self._index.get(message_id)
+        if message is not None:
+            message.body += text
+
+    def _spill(self, message: DialogMessage) -> None:
+        """あふれたメッセージをディスクに書き出す（ロック取得済みで呼ぶ）"""
+        del self._index[message.id]
+        if self.spill_dir is None:
+            return
+        try:
+            if self._spill_path is None:
+                os.makedirs(self.spill_dir, exist_ok=True)
+                self._spill_path = os.path.join(self.spill_dir, f"{uuid.uuid4().hex}.jsonl")
+            with open(self._spill_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(message.to_dict(), ensure_ascii=False) + "\n")
+            self.spilled += 1
+        except OSError as e:
+            print(f"対話履歴の書き出しに失敗: {str(e)}")
+
+    def load_spilled(self) -> List[DialogMessage]:
+        """ディスクに書き出したメッセージを読み戻す（古い順）"""
+        if self._spill_path is None:
+            return []
+        try:
+            with open(self._spill_path, encoding="utf-8") as f:
+                return [DialogMessage.from_dict(json.loads(line)) for line in f if line.strip()]
+        except (OSError, ValueError) as e:
+            print(f"対話履歴の読み込みに失敗: {str(e)}")
+            return []
+
+    def clear(self) -> None:
+        """すべてのメッセージを捨てる（書き出したファイルも削除する）"""
+        with self._lock:
+            self._messages.clear()
+            self._index.clear()
+            if self._spill_path is not None:
+                try:
+                    os.remove(self._spill_path)
+                except OSError:
+                    pass
+            self._spill_path = None
+            self.spilled = 0
+
+    def __del__(self):
+        # セッションの終了時に書き出したファイルを残さない
+        if self._spill_path is not None:
+            try:
+                os.remove(self._spill_path)
+            except OSError:
+                pass
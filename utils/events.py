@@ -0,0 +1,154 @@
+"""
+ワークフローの実行スレッドから画面側へ進捗を伝えるイベントチャネル
+
+実行スレッドは小さな不変のイベントをキューに積むだけで、画面側の状態（session_state）には触れない。
+画面側は再描画のたびにキューをまとめて取り出して自分の状態に反映する。
+グラフのノードも同じ種類のイベントを custom ストリームに送る（graph.nodes.emit_event）。
+"""
+import time
+import queue
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Dict, Any, List, Optional, Mapping, Iterable, Iterator, Callable
+from utils.state import DialogMessage
+
+# イベントの種類
+NODE = "node"  # 実行中のノードが変わった（node, description, progress）
+MESSAGE = "message"  # 対話履歴のメッセージを追加・置き換え（message。同じIDのメッセージは置き換える）
+DELTA = "delta"  # ストリーミング中のメッセージに差分を追加（message_id, text）
+STATE = "state"  # ワークフローの状態（対話履歴以外）のスナップショット（data）
+ERROR = "error"  # 処理中のエラー（text）
+DONE = "done"  # 処理の終了（停止・エラー時も送る）
+
+
+@dataclass(frozen=True)
+class ProgressEvent:
+    """実行スレッドから画面側へ送る進捗イベント（不変）"""
+    kind: str
+    elapsed: float  # 実行開始からの経過時間（秒）
+    node: str = ""
+    description: str = ""
+    progress: Optional[int] = None
+    message: Optional[DialogMessage] = None  # 送信時点のコピー（受け手がそのまま保持してよい）
+    message_id: str = ""
+    text: str = ""
+    data: Optional[Mapping[str, Any]] = None
+
+
+def _copy_containers(value: Any) -> Any:
+    """リスト・辞書・集合を中身まで辿ってコピーする（文字列などの不変な値や、それ以外のオブジェクトはそのまま共有する）"""
+    if isinstance(value, list):
+        return [_copy_containers(item) for item in value]
+    if isinstance(value, tuple):
+        return tuple(_copy_containers(item) for item in value)
+    if isinstance(value, dict):
+        return {key: _copy_containers(item) for key, item in value.items()}
+    if isinstance(value, (set, frozenset)):
+        return type(value)(value)
+    return value
+
+
+def freeze(values: Dict[str, Any]) -> Mapping[str, Any]:
+    """
+    辞書のコピーを読み取り専用にする
+
+    metrics などのリストは送り手が追記し続けるため、入れ子のコンテナもコピーして
+    イベントに載せた後で送り手が書き換えても影響しないようにする。
+    """
+    return MappingProxyType(_copy_containers(values))
+
+
+def message_fields(entry: DialogMessage) -> Dict[str, Any]:
+    """対話履歴のメッセージを MESSAGE イベントの項目にする（送った後で送り手が書き換えても影響しないようコピーする）"""
+    return {"message": entry.copy(), "progress": entry.progress}
+
+
+def forward_deltas(
+    emit: Callable[..., Any],
+    state: Dict[str, Any],
+    deltas: Iterable[str]
+) -> Iterator[str]:
+    """
+    stream_to_dialog_history に渡す差分のイテレーターを包み、差分を DELTA イベントとして送る
+
+    stream_to_dialog_history は差分を読み始める前にメッセージを追加するため、
+    最初の差分の時点で対話履歴の末尾がストリーミング中のメッセージになっている。
+
+    Args:
+        emit: イベントの送信先（emit(kind, **fields) の形で呼ぶ）
+        state: 対話履歴を持つ状態
+        deltas: 生成テキストの差分のイテレーター
+    """
+    iterator = iter(deltas)
+    try:
+        entry = None
+        for delta in iterator:
+            if entry is None:
+                entry = state["dialog_history"][-1]
+                emit(MESSAGE, **message_fields(entry))
+            emit(DELTA, message_id=entry.id, text=delta)
+            yield delta
+    finally:
+        # 途中で閉じられた場合も元のイテレーターを閉じてHTTPレスポンスを解放する
+        close = getattr(iterator, "close", None)
+        if close is not None:
+            close()
+
+
+class EventChannel:
+    """
+    1回のワークフロー実行ごとのイベントチャネル
+
+    送り手（実行スレッド）は push で積み、受け手（画面側）は drain でまとめて取り出す。
+    停止要求は受け手から送り手への向きで、request_stop / stop_requested で伝える。
+    """
+
+    def __init__(self):
+        self._queue: "queue.SimpleQueue[ProgressEvent]" = queue.SimpleQueue()
+        self._stop = threading.Event()
+        self._started = time.monotonic()
+
+    def push(self, kind: str, **fields) -> ProgressEvent:
+        """イベントを作成してキューに積む"""
+        event = ProgressEvent(kind=kind, elapsed=time.monotonic() - self._started, **fields)
+        self._queue.put(event)
+        return event
+
+    def drain(self, max_events: Optional[int] = None) -> List[ProgressEvent]:
+        """
+        積まれているイベントを待たずにまとめて取り出す
+
+        Args:
+            max_events: 1回に取り出す最大件数（省略時は全件）
+
+        Returns:
+            List[ProgressEvent]: 積まれた順のイベント
+        """
+        events = []
+        while max_events is None or len(events) < max_events:
+            try:
+                events.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return events
+
+    def request_stop(self) -> None:
+        """実行スレッドに処理の停止を要求"""
+        self._stop.set()
+
+    def stop_requested(self) -> bool:
+        """処理の停止が要求されたかどうか"""
+        return self._stop.is_set()
+
+    def node(self, node: str, description: str, progress: Optional[int] = None) -> None:
+        """実行中のノードを通知"""
+        self.push(NODE, node=node, description=description, progress=progress)
+
+    def message(self, entry: DialogMessage) -> None:
+        """対話履歴のメッセージ（追加または更新後の内容）を通知"""
+        self.push(MESSAGE, **message_fields(entry))
+
+    def state(self, state: Dict[str, Any]) -> None:
+        """ワークフローの状態を通知（対話履歴は MESSAGE で送るため除く）"""
+        self.push(STATE, data=freeze({key: value for key, value in state.items() if key != "dialog_history"}))
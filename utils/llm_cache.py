@@ -0,0 +1,237 @@
+import os
+import json
+import time
+import sqlite3
+import atexit
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+from config.settings import (
+    LLM_CACHE_PATH, LLM_CACHE_MEMORY_ENTRIES, LLM_CACHE_DISK_ENTRIES, LLM_CACHE_TTL
+)
+
+
+def make_cache_key(payload: Dict[str, Any]) -> str:
+    """
+    リクエストペイロードから安定したキャッシュキーを作成
+
+    キーの順序や空白の違いに影響されないよう、正規化したJSONのSHA-256を使用する。
+
+    Args:
+        payload: APIに送信するペイロード（model, messages, response_format）
+
+    Returns:
+        str: 16進数のハッシュ文字列
+    """
+    canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """
+    メモリ（LRU）とSQLiteの2階層でAPIレスポンスを保持するキャッシュ
+
+    ヒット数と最終アクセス時刻はメモリ上で集計し、set・close の際にまとめてSQLiteに書き込む
+    （ヒットのたびにディスクへ書き込んでロックを保持し続けないようにする）。
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = LLM_CACHE_PATH,
+        max_memory_entries: int = LLM_CACHE_MEMORY_ENTRIES,
+        max_disk_entries: int = LLM_CACHE_DISK_ENTRIES,
+        ttl: float = LLM_CACHE_TTL
+    ):
+        """
+        初期化
+
+        Args:
+            path: SQLiteファイルのパス（Noneの場合はメモリ階層のみ）
+            max_memory_entries: メモリ階層に保持する最大件数
+            max_disk_entries: ディスク階層に保持する最大件数
+            ttl: エントリの有効期間（秒）
+        """
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()  # key -> (value, created_at)
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._pending_hits = {}  # key -> (未書き込みのヒット数, 最終アクセス時刻)
+        self._conn = None
+        if path:
+            self._conn = self._open(path)
+
+    @staticmethod
+    def _open(path: str) -> sqlite3.Connection:
+        """SQLiteファイルを開いてテーブルを作成"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 接続はロックで保護したうえでスレッド間で共有する
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " created_at REAL NOT NULL,"
+            " last_access REAL NOT NULL,"
+            " hits INTEGER NOT NULL DEFAULT 0)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache(last_access)")
+        conn.commit()
+        return conn
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return now - created_at > self.ttl
+
+    def _remember(self, key: str, value: str, created_at: float) -> None:
+        """メモリ階層に格納し、上限を超えた分を古い順に追い出す（ロック取得済みで呼ぶ）"""
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _record_hit(self, key: str, now: float) -> None:
+        """ヒット数と最終アクセス時刻をメモリ上に記録（ロック取得済みで呼ぶ）"""
+        if self._conn is not None:
+            hits, _ = self._pending_hits.get(key, (0, now))
+            self._pending_hits[key] = (hits + 1, now)
+
+    def _flush_hits(self) -> None:
+        """記録したヒット数と最終アクセス時刻をまとめて書き込む（ロック取得済みで呼び、コミットは呼び出し側で行う）"""
+        if self._pending_hits:
+            self._conn.executemany(
+                "UPDATE llm_cache SET hits = hits + ?, last_access = MAX(last_access, ?) WHERE key = ?",
+                [(hits, last_access, key) for key, (hits, last_access) in self._pending_hits.items()]
+            )
+            self._pending_hits.clear()
+
+    def get(self, key: str) -> Optional[str]:
+        """
+        キャッシュからレスポンスを取得
+
+        Args:
+            key: make_cache_key で作成したキー
+
+        Returns:
+            Optional[str]: キャッシュされたレスポンス（存在しない・期限切れの場合はNone）
+        """
+        now = time.time()
+        with self._lock:
+            # メモリ階層
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if not self._is_expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    self._record_hit(key, now)
+                    return value
+                del self._memory[key]
+
+            # ディスク階層
+            if self._conn is not None:
+                row = self._conn.execute(
+                    "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    value, created_at = row
+                    if not self._is_expired(created_at, now):
+                        self._record_hit(key, now)
+                        self._remember(key, value, created_at)
+                        self._stats["disk_hits"] += 1
+                        return value
+                    self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    self._conn.commit()
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        """
+        レスポンスをキャッシュに格納
+
+        Args:
+            key: make_cache_key で作成したキー
+            value: APIのレスポンス
+        """
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT INTO llm_cache (key, value, created_at, last_access, hits) VALUES (?, ?, ?, ?, 0) "
+                    "ON CONFLICT(key) DO UPDATE SET value = excluded.value, "
+                    "created_at = excluded.created_at, last_access = excluded.last_access",
+                    (key, value, now, now)
+                )
+                # 最終アクセスの古い順に削除するため、先にヒットの記録を書き込む
+                self._flush_hits()
+                self._evict(now)
+                self._conn.commit()
+
+    def _evict(self, now: float) -> None:
+        """期限切れのエントリと、上限を超えた最終アクセスの古いエントリを削除（ロック取得済みで呼ぶ）"""
+        self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+        count = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        overflow = count - self.max_disk_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN "
+                "(SELECT key FROM llm_cache ORDER BY last_access ASC LIMIT ?)",
+                (overflow,)
+            )
+
+    def clear(self) -> None:
+        """全てのエントリと統計情報を削除"""
+        with self._lock:
+            self._memory.clear()
+            self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+            self._pending_hits.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM llm_cache")
+                self._conn.commit()
+
+    def close(self) -> None:
+        """記録したヒットを書き込んでSQLiteファイルを閉じる"""
+        with self._lock:
+            if self._conn is not None:
+                self._flush_hits()
+                self._conn.commit()
+                self._conn.close()
+                self._conn = None
+
+    def stats(self) -> Dict[str, int]:
+        """
+        キャッシュの統計情報を取得
+
+        Returns:
+            Dict[str, int]: 階層別のヒット数、ミス数、格納件数
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            if self._conn is not None:
+                stats["disk_entries"] = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        return stats
+
+
+# プロセス全体で共有するキャッシュ
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> LLMCache:
+    """プロセス共有のLLMレスポンスキャッシュを取得"""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = LLMCache(path=os.getenv("LLM_CACHE_PATH", LLM_CACHE_PATH))
+                # 終了時に未書き込みのヒット数を保存する
+                atexit.register(_shared_cache.close)
+    return _shared_cache
@@ -0,0 +1,190 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Any, List, Optional, Callable, Iterator
+from config.settings import METRICS_LOG_PATH
+
+# 計測記録を受け取る関数（記録の辞書を1件ずつ受け取る）
+MetricsSink = Callable[[Dict[str, Any]], None]
+
+# ノード実行中のAPI呼び出しの記録先（ノードごと・スレッドやタスクごとに独立）
+_current_calls: ContextVar[Optional[List[Dict[str, Any]]]] = ContextVar("current_calls", default=None)
+
+_sinks: List[MetricsSink] = []
+_sinks_lock = threading.Lock()
+_default_sinks_loaded = False
+
+
+class JsonlMetricsSink:
+    """計測記録をJSONLファイルに追記するシンク"""
+
+    def __init__(self, path: str):
+        """
+        初期化
+
+        Args:
+            path: 出力先のファイルパス
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, record: Dict[str, Any]) -> None:
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+def add_metrics_sink(sink: MetricsSink) -> None:
+    """計測記録のシンクを登録"""
+    with _sinks_lock:
+        _sinks.append(sink)
+
+
+def remove_metrics_sink(sink: MetricsSink) -> None:
+    """登録済みのシンクを解除"""
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+
+
+def _load_default_sinks() -> None:
+    """環境変数 METRICS_LOG_PATH（または設定値）が指定されていればJSONLシンクを登録"""
+    global _default_sinks_loaded
+    with _sinks_lock:
+        if _default_sinks_loaded:
+            return
+        _default_sinks_loaded = True
+        path = os.getenv("METRICS_LOG_PATH", METRICS_LOG_PATH or "")
+        if path:
+            _sinks.append(JsonlMetricsSink(path))
+
+
+def emit(record: Dict[str, Any]) -> None:
+    """
+    計測記録を全てのシンクに送る
+
+    シンクの例外は計測対象の処理に影響させないよう、ログに出して無視する。
+    """
+    _load_default_sinks()
+    with _sinks_lock:
+        sinks = list(_sinks)
+    for sink in sinks:
+        try:
+            sink(record)
+        except Exception as e:
+            print(f"計測記録の出力に失敗: {str(e)}")
+
+
+def record_call(record: Dict[str, Any]) -> None:
+    """
+    API呼び出し1回分の記録を登録
+
+    ノードの実行中（collect_calls の内側）であればノードの記録にまとめ、
+    ノード外の呼び出しであれば単独の記録としてシンクに送る。
+    """
+    calls = _current_calls.get()
+    if calls is not None:
+        calls.append(record)
+    else:
+        emit(record)
+
+
+@contextmanager
+def collect_calls(calls: Optional[List[Dict[str, Any]]] = None) -> Iterator[List[Dict[str, Any]]]:
+    """
+    ブロック内で行われたAPI呼び出しの記録を集める
+
+    Args:
+        calls: 記録を追加するリスト（省略時は新しいリスト）
+
+    使用例:
+        with collect_calls() as calls:
+            summary = agent.call(input_text)
+    """
+    calls = calls if calls is not None else []
+    token = _current_calls.set(calls)
+    try:
+        yield calls
+    finally:
+        _current_calls.reset(token)
+
+
+def record_node(
+    state: Dict[str, Any],
+    node: str,
+    started: float,
+    calls: List[Dict[str, Any]],
+    error: str = ""
+) -> Dict[str, Any]:
+    """
+    ノード1回分の実行記録を state["metrics"] に追加し、シンクに送る
+
+    Args:
+        state: ワークフローの状態
+        node: ノード名
+        started: ノード開始時の time.monotonic()
+        calls: ノード内のAPI呼び出しの記録
+        error: ノードで発生したエラー
+
+    Returns:
+        Dict[str, Any]: 追加した記録
+    """
+    ended = time.monotonic()
+    record = {
+        "type": "node",
+        "run_id": state.get("run_id", ""),
+        "node": node,
+        "revision": state.get("revision_count", 0),
+        "start": started,
+        "end": ended,
+        "duration": ended - started,
+        "timestamp": time.time(),
+        "calls": calls,
+        "error": error
+    }
+    state.setdefault("metrics", []).append(record)
+    emit(record)
+    return record
+
+
+def summarize_metrics(metrics: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    ノードの記録を集計（API呼び出し数、トークン数、リトライ数、ノード別の所要時間）
+
+    cached_ratio はプロンプトのトークンのうち、APIのコンテキストキャッシュ（usage の
+    prompt_cache_hit_tokens）に一致した割合。
+
+    Returns:
+        Dict[str, Any]: 集計結果
+    """
+    summary = {
+        "api_calls": 0,
+        "cache_hits": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "cached_tokens": 0,
+        "retries": 0,
+        "queue_wait_sec": 0.0,
+        "node_sec": {}
+    }
+    for record in metrics or []:
+        node_sec = summary["node_sec"]
+        node_sec[record["node"]] = round(node_sec.get(record["node"], 0.0) + record["duration"], 4)
+        for call in record.get("calls", []):
+            summary["api_calls"] += 1
+            summary["cache_hits"] += int(call.get("cache_hit", False))
+            summary["prompt_tokens"] += call.get("prompt_tokens", 0)
+            summary["completion_tokens"] += call.get("completion_tokens", 0)
+            summary["cached_tokens"] += call.get("cached_tokens", 0)
+            summary["retries"] += call.get("retries", 0)
+            summary["queue_wait_sec"] += call.get("queue_wait", 0.0)
+    summary["queue_wait_sec"] = round(summary["queue_wait_sec"], 4)
+    summary["cached_ratio"] = round(summary["cached_tokens"] / summary["prompt_tokens"], 4) if summary["prompt_tokens"] else 0.0
+    return summary
@@ -0,0 +1,130 @@
+import os
+import math
+import time
+import asyncio
+import threading
+from typing import Dict, Any
+from config.settings import (
+    RATE_LIMIT_REQUESTS_PER_SEC, RATE_LIMIT_TOKENS_PER_MIN, RATE_LIMIT_COMPLETION_TOKENS
+)
+
+
+class TokenBucket:
+    """スレッドセーフなトークンバケット（予約方式）"""
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        初期化
+
+        Args:
+            rate: 1秒あたりに補充されるトークン数
+            capacity: バケットの容量（許容するバースト量）
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float = 1) -> float:
+        """
+        トークンを予約し、使用可能になるまでの待ち時間を返す
+
+        残量が足りない場合も先に差し引いて（負の残量として）予約するため、
+        待機中の呼び出しの後ろに並ぶ形で順番に送信時刻が割り当てられる。
+
+        Returns:
+            float: 待機すべき秒数（すぐに使用できる場合は0）
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+
+def estimate_tokens(payload: Dict[str, Any], completion_tokens: int = RATE_LIMIT_COMPLETION_TOKENS) -> int:
+    """
+    リクエストが消費するトークン数を見積もる
+
+    日本語は概ね1文字1トークン以下、英数字は4文字で1トークン程度のため、
+    多めに見積もる側で近似し、想定される出力トークン数を加える。
+    """
+    ascii_chars = 0
+    other_chars = 0
+    for message in payload.get("messages", []):
+        content = message.get("content") or ""
+        ascii_count = sum(1 for ch in content if ord(ch) < 128)
+        ascii_chars += ascii_count
+        other_chars += len(content) - ascii_count
+    return math.ceil(ascii_chars / 4) + other_chars + completion_tokens
+
+
+class RateLimiter:
+    """リクエスト数/秒とトークン数/分の両方を制限するクライアント側のレートリミッター"""
+
+    def __init__(
+        self,
+        requests_per_sec: float = RATE_LIMIT_REQUESTS_PER_SEC,
+        tokens_per_min: float = RATE_LIMIT_TOKENS_PER_MIN
+    ):
+        """
+        初期化
+
+        Args:
+            requests_per_sec: 1秒あたりの最大リクエスト数（0以下で無制限）
+            tokens_per_min: 1分あたりの最大トークン数（0以下で無制限）
+        """
+        self._requests = TokenBucket(requests_per_sec, max(requests_per_sec, 1)) if requests_per_sec > 0 else None
+        self._tokens = TokenBucket(tokens_per_min / 60, tokens_per_min) if tokens_per_min > 0 else None
+
+    def _reserve(self, tokens: int) -> float:
+        wait = 0.0
+        if self._requests is not None:
+            wait = max(wait, self._requests.reserve(1))
+        if self._tokens is not None:
+            wait = max(wait, self._tokens.reserve(tokens))
+        return wait
+
+    def acquire(self, tokens: int = 0) -> float:
+        """
+        送信枠を確保するまで待機
+
+        Args:
+            tokens: このリクエストで消費する見込みのトークン数
+
+        Returns:
+            float: 待機した秒数
+        """
+        wait = self._reserve(tokens)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, tokens: int = 0) -> float:
+        """送信枠を確保するまで待機（acquire の非同期版）"""
+        wait = self._reserve(tokens)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+
+# プロセス全体（全セッション）で共有するレートリミッター
+_shared_limiter = None
+_shared_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """プロセス共有のレートリミッターを取得"""
+    global _shared_limiter
+    if _shared_limiter is None:
+        with _shared_limiter_lock:
+            if _shared_limiter is None:
+                _shared_limiter = RateLimiter(
+                    requests_per_sec=float(os.getenv("RATE_LIMIT_REQUESTS_PER_SEC", RATE_LIMIT_REQUESTS_PER_SEC)),
+                    tokens_per_min=float(os.getenv("RATE_LIMIT_TOKENS_PER_MIN", RATE_LIMIT_TOKENS_PER_MIN))
+                )
+    return _shared_limiter
@@ -0,0 +1,141 @@
+import math
+import time
+import threading
+from collections import deque
+from typing import Dict, Optional
+from config.settings import (
+    API_HEDGE_MIN_SAMPLES, CIRCUIT_BREAKER_FAILURE_THRESHOLD, CIRCUIT_BREAKER_RESET_TIMEOUT
+)
+
+
+class LatencyTracker:
+    """モデルごとに直近のAPI応答時間を記録し、百分位数を求めるクラス"""
+
+    def __init__(self, window: int = 200, min_samples: int = API_HEDGE_MIN_SAMPLES):
+        """
+        初期化
+
+        Args:
+            window: モデルごとに保持する直近のサンプル数
+            min_samples: 百分位数を返すのに必要な最小サンプル数
+        """
+        self.window = window
+        self.min_samples = min_samples
+        self._samples: Dict[str, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, seconds: float) -> None:
+        """応答時間を記録"""
+        with self._lock:
+            samples = self._samples.get(model)
+            if samples is None:
+                samples = self._samples[model] = deque(maxlen=self.window)
+            samples.append(seconds)
+
+    def percentile(self, model: str, q: float) -> Optional[float]:
+        """
+        記録済みの応答時間の百分位数を求める（最近傍法）
+
+        Returns:
+            Optional[float]: 百分位数（秒）。サンプルが不足している場合はNone
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(model, ()))
+        if len(samples) < self.min_samples:
+            return None
+        rank = math.ceil(q / 100 * len(samples))
+        return samples[min(len(samples), max(rank, 1)) - 1]
+
+
+class CircuitBreaker:
+    """
+    エンドポイントの連続失敗を検知して呼び出しを一時停止するサーキットブレーカー
+
+    closed: 通常どおり呼び出す
+    open: 連続失敗が閾値に達した状態。reset_timeout の間は呼び出さずに即座に失敗させる
+    half_open: reset_timeout 経過後、1件だけ試行して成功すれば closed に戻す
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        failure_threshold: int = CIRCUIT_BREAKER_FAILURE_THRESHOLD,
+        reset_timeout: float = CIRCUIT_BREAKER_RESET_TIMEOUT
+    ):
+        """
+        初期化
+
+        Args:
+            failure_threshold: open に移行する連続失敗回数
+            reset_timeout: open から試行を再開するまでの時間（秒）
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started_at = None
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """呼び出してよいかどうかを判定（half_open では試行を1件だけ通す）"""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if now - self._opened_at < self.reset_timeout:
+                    return False
+                self.state = self.HALF_OPEN
+                self._probe_started_at = now
+                return True
+            # 試行中の呼び出しが結果を報告しないまま（キャンセルなどで）終わった場合に備え、
+            # 一定時間経過したら次の試行を通す
+            if self._probe_started_at is None or now - self._probe_started_at >= self.reset_timeout:
+                self._probe_started_at = now
+                return True
+            return False
+
+    def record_success(self) -> None:
+        """呼び出しの成功を記録"""
+        with self._lock:
+            self._failures = 0
+            self.state = self.CLOSED
+            self._probe_started_at = None
+
+    def record_failure(self) -> None:
+        """呼び出しの失敗を記録"""
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_started_at = None
+
+
+# プロセス全体で共有する応答時間の記録とサーキットブレーカー
+_shared_tracker = None
+_shared_breakers: Dict[str, CircuitBreaker] = {}
+_shared_lock = threading.Lock()
+
+
+def get_latency_tracker() -> LatencyTracker:
+    """プロセス共有の応答時間トラッカーを取得"""
+    global _shared_tracker
+    if _shared_tracker is None:
+        with _shared_lock:
+            if _shared_tracker is None:
+                _shared_tracker = LatencyTracker()
+    return _shared_tracker
+
+
+def get_circuit_breaker(endpoint: str) -> CircuitBreaker:
+    """エンドポイントごとのプロセス共有サーキットブレーカーを取得"""
+    with _shared_lock:
+        breaker = _shared_breakers.get(endpoint)
+        if breaker is None:
+            breaker = _shared_breakers[endpoint] = CircuitBreaker()
+        return breaker
@@ -0,0 +1,127 @@
+import os
+import re
+import json
+import hashlib
+import threading
+import unicodedata
+from typing import Dict, Any, List, Optional
+from config.settings import RESULT_CACHE_PATH, RESULT_CACHE_ENTRIES, RESULT_CACHE_TTL
+from utils.llm_cache import LLMCache
+from utils.state import DialogMessage
+
+
+def normalize_input_text(input_text: str) -> str:
+    """
+    キャッシュキー用に入力テキストを正規化
+
+    全角・半角の揺れ（NFKC）と前後・連続する空白の違いを吸収する。
+    """
+    text = unicodedata.normalize("NFKC", input_text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def compact_dialog_history(dialog_history: List[DialogMessage]) -> List[Dict[str, Any]]:
+    """
+    対話履歴から結果を表すメッセージ（【要約】【フィードバック】【判定】【生成タイトル】など）のみを
+    JSONに保存する形式で残す
+
+    「...中」などの進捗表示用メッセージは再表示には不要なため除外する。
+    """
+    return [
+        {
+            "agent_type": dialog.agent_type,
+            "content": dialog.content,
+            "timestamp": dialog.timestamp
+        }
+        for dialog in dialog_history
+        if dialog.content.startswith("【")
+    ]
+
+
+class WorkflowResultCache:
+    """入力テキストごとにワークフローの最終結果を保持するキャッシュ"""
+
+    def __init__(
+        self,
+        path: Optional[str] = RESULT_CACHE_PATH,
+        max_entries: int = RESULT_CACHE_ENTRIES,
+        ttl: float = RESULT_CACHE_TTL
+    ):
+        """
+        初期化
+
+        Args:
+            path: SQLiteファイルのパス（Noneの場合はメモリのみ）
+            max_entries: 保持する最大件数
+            ttl: エントリの有効期間（秒）
+        """
+        # 保存形式はJSON文字列なので、LLMレスポンス用の2階層キャッシュをそのまま利用する
+        self._store = LLMCache(
+            path=path,
+            max_memory_entries=max_entries,
+            max_disk_entries=max_entries,
+            ttl=ttl
+        )
+
+    @staticmethod
+    def make_key(input_text: str, model: str, prompt_version: str) -> str:
+        """正規化した入力テキスト・モデル・プロンプト版数からキーを作成"""
+        material = "\x00".join([normalize_input_text(input_text), model, prompt_version])
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, input_text: str, model: str, prompt_version: str) -> Optional[Dict[str, Any]]:
+        """
+        キャッシュされた結果を取得
+
+        Returns:
+            Optional[Dict[str, Any]]: title, final_summary, dialog_history（DialogMessage のリスト）などを含む結果
+                （存在しない場合はNone）
+        """
+        value = self._store.get(self.make_key(input_text, model, prompt_version))
+        if value is None:
+            return None
+        result = json.loads(value)
+        result["dialog_history"] = [DialogMessage.from_dict(dialog) for dialog in result.get("dialog_history", [])]
+        return result
+
+    def set(self, input_text: str, model: str, prompt_version: str, state: Dict[str, Any]) -> None:
+        """
+        完了したワークフローの状態から結果を保存
+
+        Args:
+            input_text: 入力テキスト
+            model: 使用したモデル名
+            prompt_version: プロンプトの版数
+            state: ワークフロー完了時の状態
+        """
+        result = {
+            "title": state.get("title", ""),
+            "final_summary": state.get("final_summary", ""),
+            "summary": state.get("summary", ""),
+            "revision_count": state.get("revision_count", 0),
+            "approved": state.get("approved", False),
+            "dialog_history": compact_dialog_history(state.get("dialog_history", []))
+        }
+        self._store.set(
+            self.make_key(input_text, model, prompt_version),
+            json.dumps(result, ensure_ascii=False)
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """キャッシュの統計情報を取得"""
+        return self._store.stats()
+
+
+# プロセス全体で共有するキャッシュ
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_result_cache() -> WorkflowResultCache:
+    """プロセス共有のワークフロー結果キャッシュを取得"""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = WorkflowResultCache(path=os.getenv("RESULT_CACHE_PATH", RESULT_CACHE_PATH))
+    return _shared_cache
@@ -0,0 +1,232 @@
+"""
+プロセス全体で共有するワークフローの実行スケジューラー
+
+決まった数のワーカースレッドでワークフローを実行し、待ち行列の長さに上限を設ける。
+待ち行列はユーザーごとに分かれており、ワーカーはユーザーを順番に巡回して1件ずつ取り出す
+（1人のユーザーが大量に投入しても、他のユーザーの実行が後回しにされ続けない）。
+"""
+import os
+import time
+import threading
+import itertools
+from collections import OrderedDict, deque
+from typing import Dict, Any, Callable, Deque, List, Optional
+from config.settings import SCHEDULER_WORKERS, SCHEDULER_MAX_QUEUE
+from utils.metrics import emit
+
+QUEUED = "queued"
+RUNNING = "running"
+FINISHED = "finished"
+CANCELLED = "cancelled"
+
+
+class SchedulerFullError(Exception):
+    """待ち行列が上限に達しているため受け付けられない"""
+
+
+class Ticket:
+    """スケジューラーに投入した1件の実行"""
+
+    def __init__(self, scheduler: "WorkflowScheduler", ticket_id: int, user: str, func: Callable[..., Any], args: tuple):
+        self.id = ticket_id
+        self.user = user
+        self.status = QUEUED
+        self.submitted_at = time.monotonic()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.error = ""
+        self._scheduler = scheduler
+        self._func = func
+        self._args = args
+
+    def position(self) -> int:
+        """実行が始まるまでの待ち順（1始まり。実行中・終了後は0）"""
+        return self._scheduler.position(self)
+
+    def cancel(self) -> bool:
+        """
+        待ち行列から取り除く（実行が始まった後は取り消せない）
+
+        Returns:
+            bool: 取り消せたかどうか
+        """
+        return self._scheduler.cancel(self)
+
+    @property
+    def wait_time(self) -> float:
+        """待ち行列に入ってから実行が始まるまでの時間（秒。未開始の場合は現在までの時間）"""
+        return (self.started_at or time.monotonic()) - self.submitted_at
+
+
+class WorkflowScheduler:
+    """
+    ワーカー数と待ち行列の長さに上限を持つ、ユーザー間で公平なスケジューラー
+    """
+
+    def __init__(self, workers: int = SCHEDULER_WORKERS, max_queue: int = SCHEDULER_MAX_QUEUE):
+        """
+        初期化
+
+        Args:
+            workers: 同時に実行するワークフローの数
+            max_queue: 実行待ちにできる件数の上限（超えた投入は SchedulerFullError）
+        """
+        self.workers = workers
+        self.max_queue = max_queue
+        self._queues: "OrderedDict[str, Deque[Ticket]]" = OrderedDict()  # 巡回順（先頭が次に取り出すユーザー）
+        self._queued = 0
+        self._running = 0
+        self._ids = itertools.count(1)
+        self._condition = threading.Condition()
+        self._stats = {"submitted": 0, "rejected": 0, "cancelled": 0, "completed": 0, "failed": 0}
+        self._wait_times: Deque[float] = deque(maxlen=200)
+        self._threads: List[threading.Thread] = []
+
+    def _ensure_workers(self) -> None:
+        """ワーカースレッドを必要になった時点で起動（ロック取得済みで呼ぶ）"""
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, name=f"workflow-worker-{len(self._threads)}", daemon=True)
+            self._threads.append(thread)
+            thread.start()
+
+    def submit(self, user: str, func: Callable[..., Any], *args) -> Ticket:
+        """
+        実行を投入
+
+        Args:
+            user: 公平性の単位となるユーザー名
+            func: ワーカースレッドで実行する関数
+            *args: func に渡す引数
+
+        Returns:
+            Ticket: 投入した実行
+
+        Raises:
+            SchedulerFullError: 待ち行列が上限に達している場合
+        """
+        with self._condition:
+            if self._queued >= self.max_queue:
+                self._stats["rejected"] += 1
+                raise SchedulerFullError(f"実行待ちが上限（{self.max_queue}件）に達しています。")
+            ticket = Ticket(self, next(self._ids), user, func, args)
+            self._queues.setdefault(user, deque()).append(ticket)
+            self._queued += 1
+            self._stats["submitted"] += 1
+            self._ensure_workers()
+            self._condition.notify()
+        return ticket
+
+    def _next_ticket(self) -> Ticket:
+        """巡回順で次のユーザーの先頭を取り出す（ロック取得済みで呼ぶ）"""
+        user, queue = next(iter(self._queues.items()))
+        ticket = queue.popleft()
+        # 取り出したユーザーを巡回順の末尾へ回す（待ちがなければ外す）
+        del self._queues[user]
+        if queue:
+            self._queues[user] = queue
+        self._queued -= 1
+        return ticket
+
+    def _work(self) -> None:
+        """ワーカースレッドの本体"""
+        while True:
+            with self._condition:
+                while not self._queued:
+                    self._condition.wait()
+                ticket = self._next_ticket()
+                ticket.status = RUNNING
+                ticket.started_at = time.monotonic()
+                self._running += 1
+                self._wait_times.append(ticket.wait_time)
+                depth = self._queued
+
+            emit({
+                "type": "scheduler",
+                "user": ticket.user,
+                "wait": ticket.wait_time,
+                "queue_depth": depth,
+                "timestamp": time.time()
+            })
+            try:
+                ticket._func(*ticket._args)
+                outcome = "completed"
+            except Exception as e:
+                ticket.error = str(e)
+                outcome = "failed"
+                print(f"ワークフローの実行に失敗: {str(e)}")
+            with self._condition:
+                ticket.status = FINISHED
+                ticket.finished_at = time.monotonic()
+                self._running -= 1
+                self._stats[outcome] += 1
+
+    def position(self, ticket: Ticket) -> int:
+        """巡回順で取り出したときに ticket が何番目になるか（1始まり。待ち行列にない場合は0）"""
+        with self._condition:
+            if ticket.status != QUEUED:
+                return 0
+            position = 0
+            queues = [list(queue) for queue in self._queues.values()]
+            for depth in range(max((len(queue) for queue in queues), default=0)):
+                for queue in queues:
+                    if depth < len(queue):
+                        position += 1
+                        if queue[depth] is ticket:
+                            return position
+            return 0
+
+    def cancel(self, ticket: Ticket) -> bool:
+        """待ち行列から ticket を取り除く"""
+        with self._condition:
+            queue = self._queues.get(ticket.user)
+            if ticket.status != QUEUED or queue is None or ticket not in queue:
+                return False
+            queue.remove(ticket)
+            if not queue:
+                del self._queues[ticket.user]
+            self._queued -= 1
+            ticket.status = CANCELLED
+            self._stats["cancelled"] += 1
+            return True
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        スケジューラーの統計情報を取得
+
+        Returns:
+            Dict[str, Any]: 待ち件数、実行中の件数、ユーザー別の待ち件数、待ち時間の p50/p95（秒）など
+        """
+        with self._condition:
+            waits = sorted(self._wait_times)
+            stats = dict(self._stats)
+            stats.update({
+                "workers": self.workers,
+                "queue_depth": self._queued,
+                "running": self._running,
+                "queued_by_user": {user: len(queue) for user, queue in self._queues.items()}
+            })
+
+        def _percentile(q: float) -> float:
+            return round(waits[min(len(waits) - 1, int(len(waits) * q / 100))], 4) if waits else 0.0
+
+        stats["wait_p50_sec"] = _percentile(50)
+        stats["wait_p95_sec"] = _percentile(95)
+        return stats
+
+
+# プロセス全体で共有するスケジューラー
+_shared_scheduler = None
+_shared_scheduler_lock = threading.Lock()
+
+
+def get_scheduler() -> WorkflowScheduler:
+    """プロセス共有のスケジューラーを取得（環境変数 SCHEDULER_WORKERS / SCHEDULER_MAX_QUEUE で上書き可能）"""
+    global _shared_scheduler
+    if _shared_scheduler is None:
+        with _shared_scheduler_lock:
+            if _shared_scheduler is None:
+                _shared_scheduler = WorkflowScheduler(
+                    workers=int(os.getenv("SCHEDULER_WORKERS", SCHEDULER_WORKERS)),
+                    max_queue=int(os.getenv("SCHEDULER_MAX_QUEUE", SCHEDULER_MAX_QUEUE))
+                )
+    return _shared_scheduler
@@ -0,0 +1,89 @@
+"""
+StreamlitのセッションとAPIクライアントを結びつけるUI側のアダプター
+
+エンジン（agents, graph, utils.api_client）は Streamlit に依存しないため、
+session_state を扱う処理はこのモジュールに集約する。
+"""
+import os
+import streamlit as st
+from utils.api_client import AVAILABLE_MODELS, get_shared_client, prewarm_connections
+
+
+def initialize_client():
+    """
+    プロセス共有のAPIクライアントを用意し、セッションの選択モデルを初期化
+    
+    クライアント（コネクションプール）はすべてのセッションで共有し、セッションには
+    選択中のモデル名だけを保存する。
+    
+    Returns:
+        DeepseekAPI: 共有クライアント（DEEPSEEK_API_KEY がない場合などはNone）
+    """
+    if 'selected_model' not in st.session_state:
+        # デフォルトモデルを設定
+        st.session_state.selected_model = list(AVAILABLE_MODELS.keys())[0]
+    
+    # 環境変数がない場合はエラーメッセージを表示
+    if not os.getenv("DEEPSEEK_API_KEY"):
+        st.sidebar.error("⚠️ DEEPSEEK_API_KEYが設定されていません。Streamlit Cloud設定で環境変数を設定してください。")
+        return None
+    
+    try:
+        client = get_shared_client()
+        
+        # 初回のAPI呼び出し前にコネクションを確立しておく（プロセスにつき一度だけ）
+        prewarm_connections(client)
+        return client
+        
+    except Exception as e:
+        st.sidebar.error(f"❌ API接続エラー: {str(e)}")
+        if "APIエラー" in str(e):
+            st.sidebar.warning(f"API呼び出しでエラーが発生しました。詳細: {str(e)}")
+        else:
+            st.sidebar.warning("予期せぬエラーが発生しました。詳細はログを確認してください。")
+        return None
+
+
+def update_model(model_name):
+    """
+    セッションで使用するモデルを更新
+    
+    共有クライアントは書き換えず、以降の実行で呼び出しごとに渡すモデル名だけを変更する
+    （実行中のワークフローは開始時のモデルのまま最後まで進む）。
+    """
+    st.session_state.selected_model = model_name
+    return True
+
+
+def get_client():
+    """プロセス共有のAPIクライアントを取得"""
+    return get_shared_client()
+
+
+def get_selected_model():
+    """現在選択されているモデルを取得"""
+    if 'selected_model' not in st.session_state:
+        st.session_state.selected_model = list(AVAILABLE_MODELS.keys())[0]
+    return st.session_state.selected_model
+
+
+def test_api_connection():
+    """API接続をテストする"""
+    client = get_client()
+    try:
+        test_message = [
+            {"role": "system", "content": "You are a helpful assistant"},
+            {"role": "user", "content": "こんにちは、簡単な返事を返してください"}
+        ]
+        test_response = client.invoke(test_message, use_cache=False, model=get_selected_model())
+        return True, test_response
+    except Exception as e:
+        return False, str(e)
+
+
+def reset_state() -> None:
+    """
+    ワークフローの状態をリセット
+    """
+    if 'workflow_state' in st.session_state:
+        del st.session_state.workflow_state
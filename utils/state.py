@@ -1,8 +1,110 @@
-from typing import TypedDict, List, Dict, Any, Optional
-import streamlit as st
+import sys
+import time
+import uuid
+from datetime import datetime
+from typing import TypedDict, Annotated, List, Dict, Any, Optional, Iterable, Callable, Union
+
+
+def merge_partial_summaries(
+    current: Optional[List[Dict[str, Any]]],
+    update: Optional[List[Dict[str, Any]]]
+) -> List[Dict[str, Any]]:
+    """
+    部分要約のリストを (level, index) ごとにマージする
+
+    並列に実行された部分要約ノードの結果を集めるためのリデューサー。
+    ノードが状態全体を返しても要素が重複しないよう、同じ位置の要素は後の値で置き換える。
+    """
+    merged = {(item["level"], item["index"]): item for item in current or []}
+    for item in update or []:
+        merged[(item["level"], item["index"])] = item
+    return sorted(merged.values(), key=lambda item: (item["level"], item["index"]))
+
+
+def new_message_id() -> str:
+    """対話履歴のメッセージID（表示用HTMLのキャッシュのキーに使う）"""
+    return uuid.uuid4().hex[:16]
+
+
+def format_timestamp(timestamp: Union[float, str, None]) -> str:
+    """メッセージの時刻を表示用の文字列（時:分:秒）にする（文字列で保存された古い形式はそのまま返す）"""
+    if isinstance(timestamp, (int, float)):
+        return datetime.fromtimestamp(timestamp).strftime("%H:%M:%S")
+    return timestamp or ""
+
+
+class DialogMessage:
+    """
+    対話履歴のメッセージ1件
+
+    __slots__ で属性辞書を持たず、エージェント種別と見出しは intern して全メッセージで共有する。
+    見出し（【要約 第1版】など）と本文を分けて持ち、本文には状態の summary / feedback と
+    同じ文字列オブジェクトを入れるため、長いテキストが状態と対話履歴で二重に保持されない。
+    時刻は float（UNIX時間）で持ち、表示するときに format_timestamp で文字列にする。
+    """
+    __slots__ = ("id", "agent_type", "header", "body", "timestamp", "progress", "streaming")
+
+    def __init__(
+        self,
+        agent_type: str,
+        body: str = "",
+        header: str = "",
+        progress: Optional[int] = None,
+        streaming: bool = False,
+        id: Optional[str] = None,
+        timestamp: Union[float, str, None] = None
+    ):
+        self.id = id or new_message_id()
+        self.agent_type = sys.intern(agent_type)
+        self.header = sys.intern(header)
+        self.body = body
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.progress = progress
+        self.streaming = streaming
+
+    @property
+    def content(self) -> str:
+        """見出しを含む表示用のテキスト"""
+        return self.header + self.body if self.header else self.body
+
+    def copy(self) -> "DialogMessage":
+        """浅いコピー（文字列は共有する）"""
+        return DialogMessage(
+            self.agent_type, self.body, self.header, self.progress, self.streaming, self.id, self.timestamp
+        )
+
+    def _asdict(self) -> Dict[str, Any]:
+        """コンストラクタの引数の辞書（チェックポイントの保存・復元に使われる）"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def to_dict(self) -> Dict[str, Any]:
+        """JSONに保存する形式（見出しと本文を連結した content を持つ）"""
+        return {
+            "id": self.id,
+            "agent_type": self.agent_type,
+            "content": self.content,
+            "timestamp": self.timestamp,
+            "progress": self.progress
+        }
+
+    @classmethod
+    def from_dict(cls, values: Dict[str, Any]) -> "DialogMessage":
+        """to_dict の形式（または以前の辞書形式）からメッセージを作成"""
+        return cls(
+            values.get("agent_type", "unknown"),
+            values.get("content", ""),
+            progress=values.get("progress"),
+            id=values.get("id"),
+            timestamp=values.get("timestamp", "")
+        )
+
+    def __repr__(self) -> str:
+        return f"DialogMessage({self.agent_type!r}, {self.content[:30]!r}, id={self.id!r})"
+
 
 # State の型定義
 class State(TypedDict):
+    run_id: str
     input_text: str
     summary: str
     feedback: str
@@ -10,10 +112,19 @@ class State(TypedDict):
     previous_feedback: str
     title: str
     final_summary: str
-    transcript: List[str]
     revision_count: int 
     approved: bool
-    dialog_history: List[Dict[str, Any]]
+    issues: List[str]
+    dialog_history: List[DialogMessage]
+    current_node: str
+    error: str
+    metrics: List[Dict[str, Any]]  # ノードごとの実行記録（API呼び出しの記録を含む）
+    # 長文の場合のみ使用
+    chunks: List[str]  # 分割したチャンク
+    partial_summaries: Annotated[List[Dict[str, Any]], merge_partial_summaries]  # 部分要約（統合の段階ごと）
+    condensed_input: str  # 改訂・タイトル生成で原文の代わりに使う部分要約の連結
+    # レビューと並行して生成したタイトル（{summary, output, calls}。承認された場合のみ設定）
+    speculative_title: Optional[Dict[str, Any]]
 
 
 def create_initial_state(input_text: str) -> State:
@@ -27,6 +138,7 @@ def create_initial_state(input_text: str) -> State:
         State: 初期化された状態オブジェクト
     """
     return {
+        "run_id": uuid.uuid4().hex,
         "input_text": input_text,
         "summary": "",
         "feedback": "",
@@ -34,16 +146,99 @@ def create_initial_state(input_text: str) -> State:
         "previous_feedback": "",
         "title": "",
         "final_summary": "",
-        "transcript": [],
         "revision_count": 0,
         "approved": False,
-        "dialog_history": []
+        "issues": [],
+        "dialog_history": [],
+        "current_node": "",
+        "error": "",
+        "metrics": [],
+        "chunks": [],
+        "partial_summaries": [],
+        "condensed_input": "",
+        "speculative_title": None
     }
 
 
-def reset_state() -> None:
+def add_to_dialog_history(
+    state: Dict[str, Any], 
+    agent_type: str, 
+    content: str, 
+    progress: Optional[int] = None,
+    header: str = ""
+) -> Dict[str, Any]:
+    """
+    対話履歴にメッセージを追加
+
+    header を指定した場合は content の前に表示される（content には状態に保存した
+    要約・フィードバックの文字列をそのまま渡し、同じテキストを二重に持たないようにする）。
+    """
+    if "dialog_history" not in state:
+        state["dialog_history"] = []
+    
+    state["dialog_history"].append(DialogMessage(agent_type, content, header, progress))
+    
+    return state
+
+
+def update_progress(
+    state: Dict[str, Any], 
+    index: int, 
+    progress: int
+) -> Dict[str, Any]:
+    """
+    指定されたインデックスのメッセージの進捗を更新
+    """
+    if "dialog_history" in state and 0 <= index < len(state["dialog_history"]):
+        state["dialog_history"][index].progress = progress
+    return state
+
+
+def stream_to_dialog_history(
+    state: Dict[str, Any],
+    agent_type: str,
+    deltas: Iterable[str],
+    header: str = "",
+    progress: Optional[int] = None,
+    should_stop: Optional[Callable[[], bool]] = None
+) -> str:
     """
-    ワークフローの状態をリセット
+    生成テキストの差分を受け取りながら対話履歴のメッセージを逐次更新
+    
+    メッセージは最初に追加され、差分が届くたびに同じメッセージの内容が伸びていくため、
+    画面の再描画時には生成途中のテキストがそのまま表示される。
+    should_stop が True を返した場合は生成を打ち切る（差分のイテレーターを閉じる）。
+    
+    Args:
+        state: 対話履歴を持つ状態
+        agent_type: エージェント種別
+        deltas: 生成テキストの差分のイテレーター
+        header: メッセージ先頭に付ける見出し（例: 【要約 第1版】）
+        progress: メッセージの進捗値
+        should_stop: 生成を打ち切るかどうかを返す関数
+        
+    Returns:
+        str: 生成されたテキスト全体（見出しを除く）
     """
-    if 'workflow_state' in st.session_state:
-        del st.session_state.workflow_state
+    if "dialog_history" not in state:
+        state["dialog_history"] = []
+    
+    entry = DialogMessage(agent_type, header=header, progress=progress, streaming=True)
+    state["dialog_history"].append(entry)
+    
+    try:
+        for delta in deltas:
+            entry.body += delta
+            if should_stop is not None and should_stop():
+                break
+    finally:
+        # ジェネレーターを閉じてHTTPレスポンスを解放し、生成を打ち切る
+        close = getattr(deltas, "close", None)
+        if close is not None:
+            close()
+        entry.streaming = False
+    
+    # 返したテキストを状態に保存すると、対話履歴の本文と同じ文字列オブジェクトになる
+    text = entry.body.strip()
+    entry.body = text
+    return text
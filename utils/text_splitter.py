@@ -0,0 +1,55 @@
+import re
+from typing import List
+
+# 文（「。」まで）または段落（改行まで）を1単位として切り出す
+_UNIT_PATTERN = re.compile(r"[^。\n]*(?:。+|\n+|$)")
+
+
+def split_units(text: str) -> List[str]:
+    """テキストを文・段落の単位に分割（区切り文字は各単位の末尾に残す）"""
+    return [unit for unit in _UNIT_PATTERN.findall(text) if unit]
+
+
+def split_text(text: str, chunk_size: int, overlap: int = 0) -> List[str]:
+    """
+    日本語の文・段落の境界でテキストをチャンクに分割
+
+    文単位で chunk_size 文字以内に詰め、隣り合うチャンクは overlap 文字以内の
+    文を重複させて文脈を引き継ぐ。chunk_size を超える1文は文字数で切る。
+
+    Args:
+        text: 分割するテキスト
+        chunk_size: 1チャンクの最大文字数
+        overlap: 前のチャンクから引き継ぐ最大文字数
+
+    Returns:
+        List[str]: チャンクのリスト
+    """
+    units = []
+    for unit in split_units(text):
+        if len(unit) > chunk_size:
+            units.extend(unit[i:i + chunk_size] for i in range(0, len(unit), chunk_size))
+        else:
+            units.append(unit)
+
+    chunks = []
+    current: List[str] = []
+    length = 0
+    for unit in units:
+        if current and length + len(unit) > chunk_size:
+            chunks.append("".join(current).strip())
+            # 末尾から overlap 文字以内の文を次のチャンクの先頭に残す
+            carried: List[str] = []
+            carried_length = 0
+            for previous in reversed(current):
+                if carried_length + len(previous) > overlap or carried_length + len(previous) + len(unit) > chunk_size:
+                    break
+                carried.insert(0, previous)
+                carried_length += len(previous)
+            current, length = carried, carried_length
+        current.append(unit)
+        length += len(unit)
+
+    if current:
+        chunks.append("".join(current).strip())
+    return [chunk for chunk in chunks if chunk]